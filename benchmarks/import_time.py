@@ -0,0 +1,62 @@
+"""
+Import time benchmark for rheoflow.
+
+Every repeat imports rheoflow in a fresh interpreter, so the measured time is a cold start.
+The run fails if importing the numerical core loads matplotlib or scipy.integrate, or if the
+best time exceeds --max-seconds.
+
+    python benchmarks/import_time.py --repeat 5 --max-seconds 1.0
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+_probe = '''
+import sys, time, json
+t = time.perf_counter()
+import rheoflow
+t = time.perf_counter() - t
+print(json.dumps({'seconds':t,'modules':[m for m in ('matplotlib','scipy.integrate') if m in sys.modules]}))
+'''
+
+
+def measure(repeat=5):
+    """
+    Imports rheoflow repeat times, each in a new process, and returns the times in seconds and
+    the set of unwanted modules that were loaded.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = root + os.pathsep + env.get('PYTHONPATH','')
+    times = []
+    loaded = set()
+    for i in range(repeat):
+        out = subprocess.run([sys.executable,'-c',_probe],env=env,check=True,capture_output=True,text=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        times.append(result['seconds'])
+        loaded.update(result['modules'])
+    return times, loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat',type=int,default=5)
+    parser.add_argument('--max-seconds',type=float,default=None)
+    args = parser.parse_args(argv)
+    times, loaded = measure(args.repeat)
+    times.sort()
+    print('import rheoflow: best %.3f s, median %.3f s over %d runs' % (times[0],times[len(times)//2],len(times)))
+    failed = False
+    if loaded:
+        print('FAIL: import rheoflow loaded '+', '.join(sorted(loaded)))
+        failed = True
+    if args.max_seconds is not None and times[0] > args.max_seconds:
+        print('FAIL: best import time above %.3f s' % args.max_seconds)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
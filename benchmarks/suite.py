@@ -0,0 +1,375 @@
+"""
+Timing and accuracy benchmarks for the rheoflow solvers.
+
+Every benchmark times a representative workload and measures its largest relative error
+against a closed-form reference (Hagen-Poiseuille, power law, Herschel-Bulkley,
+Buckingham-Reiner, Nikuradse) or, for fluids without one, the flow rate integral evaluated by
+composite Gauss-Legendre quadrature on many more nodes than the solvers use.  The run fails when an
+error exceeds the tolerance of the benchmark, or with --compare when a benchmark is slower
+than in a saved run by more than --threshold.  Master curves are cleared before every
+repeat, so times include building them.
+
+    python benchmarks/suite.py --save base.json
+    python benchmarks/suite.py --compare base.json --threshold 1.5
+    python benchmarks/suite.py --filter pipe --repeat 5
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import re
+import sys
+import time
+import warnings
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from rheoflow import viscosity, pipe, slit, cache, friction_factor_property
+
+_benchmarks = {}
+
+
+def benchmark(rtol=None,name=None):
+    """
+    Registers a benchmark under name (default the function name).  The decorated function does
+    the setup and returns the workload, a function without arguments that returns the largest
+    relative error of its results (None when there is no reference); rtol is the accepted error.
+    """
+    def register(setup):
+        _benchmarks[name or setup.__name__] = (setup,rtol)
+        return setup
+    return register
+
+
+def _error(value,reference):
+    value = np.asarray(value,dtype=float)
+    reference = np.asarray(reference,dtype=float)
+    return float(np.max(np.abs(value/reference-1.)))
+
+
+_models = {
+    'newtonian':viscosity.newtonian(mu=.5),
+    'power_law':viscosity.power_law(k=2.,n=.4),
+    'carreau':viscosity.carreau(eta0=10.,etainf=.01,reltime=1.,a=2.,n=.3),
+    'herschel_bulkley':viscosity.herschel_bulkley(tauy=5.,k=1.,n=.5),
+    'three_component':viscosity.three_component(tauy=5.,gamma_crit=2.,eta_bg=.05),
+    'bi_power_law':viscosity.bi_power_law(k_low=1.,n_low=.8,k_high=.5,n_high=.4),
+}
+
+_radius = .02
+_length = 10.
+_pressure_drops = np.logspace(3,5,20)
+
+
+def _flow_function(model,tauw,m,panels=400,nodes=64):
+    """
+    Reference Phi_m(tauw) = integral from 0 to tauw of s**m * rate(s) ds / tauw**(m+1) for
+    each wall stress, by composite Gauss-Legendre quadrature on panels graded geometrically
+    towards 0 and on both sides of every breakpoint of the model (such as a yield stress).
+    """
+    x, w = np.polynomial.legendre.leggauss(nodes)
+    x, w = .5*(x+1.), .5*w
+    grading = np.geomspace(1.e-12,1.,panels)
+    phi = []
+    for t in np.atleast_1d(tauw):
+        edges = [[0.],t*grading]
+        for b in getattr(model,'_stress_breakpoints',tuple)():
+            edges += [b*(1.-.5*grading),b*(1.+grading)]
+        edges = np.unique(np.clip(np.concatenate(edges),0.,t))
+        s = edges[:-1,np.newaxis] + np.diff(edges)[:,np.newaxis]*x
+        phi.append(np.sum(np.diff(edges)*np.sum(w*s**m*model.shear_rate_from_stress(s),axis=1))/t**(m+1))
+    return np.array(phi)
+
+
+def _pipe_pressure_drops(model):
+    """
+    Pressure drops of the pipe benchmarks: 10 to 100 times the yield pressure drop for
+    herschel_bulkley, whose Papanastasiou regularization (m=1000) there changes Q by less than
+    1e-8 from the closed form, _pressure_drops otherwise.
+    """
+    if isinstance(model,viscosity.herschel_bulkley):
+        return np.logspace(1,2,20)*2.*model.tauy*_length/_radius
+    return _pressure_drops
+
+
+def _pipe_q_reference(model,dp):
+    """
+    Tube flow rate from the closed form where there is one, by quadrature otherwise.
+    """
+    tauw = dp*_radius/(2.*_length)
+    if isinstance(model,viscosity.newtonian):
+        return np.pi*_radius**4*dp/(8.*model.mu*_length)
+    if isinstance(model,viscosity.power_law):
+        n = model.n
+        return np.pi*_radius**3*n/(3.*n+1.)*(tauw/model.k)**(1./n)
+    if isinstance(model,viscosity.herschel_bulkley):
+        return pipe._hb_q((model.tauy,model.k,model.n),_radius,_length,dp)
+    return np.pi*_radius**3*_flow_function(model,tauw,2)
+
+
+def _calc_visc(name):
+    model = _models[name]
+    rate = np.logspace(-3,4,10**6)
+    def run():
+        model.calc_visc(rate)
+    return run
+
+
+def _pipe_dp_to_q(name):
+    model = _models[name]
+    pressure_drops = _pipe_pressure_drops(model)
+    reference = _pipe_q_reference(model,pressure_drops)
+    def run():
+        q = [pipe.laminar(viscosity=model,radius=_radius,length=_length,pressure_drop=dp).q
+             for dp in pressure_drops]
+        return _error(q,reference)
+    return run
+
+
+def _pipe_q_to_dp(name):
+    model = _models[name]
+    pressure_drops = _pipe_pressure_drops(model)
+    flows = _pipe_q_reference(model,pressure_drops)
+    def run():
+        dp = [pipe.laminar(viscosity=model,radius=_radius,length=_length,q=q).pressure_drop for q in flows]
+        return _error(dp,pressure_drops)
+    return run
+
+
+for _name in _models:
+    benchmark(name='calc_visc_'+_name)(functools.partial(_calc_visc,_name))
+    benchmark(rtol=1.e-6,name='pipe_dp_to_q_'+_name)(functools.partial(_pipe_dp_to_q,_name))
+    benchmark(rtol=1.e-6,name='pipe_q_to_dp_'+_name)(functools.partial(_pipe_q_to_dp,_name))
+
+
+@benchmark(rtol=1.e-10)
+def pipe_solve_laminar_batched():
+    model = _models['power_law']
+    dp = np.logspace(3,5,10**5)
+    reference = _pipe_q_reference(model,dp)
+    def run():
+        return _error(pipe.solve_laminar(model,_radius,_length,pressure_drop=dp)['q'],reference)
+    return run
+
+
+@benchmark(rtol=1.e-10)
+def pipe_hb_analytical_bingham():
+    # Buckingham-Reiner: Q = pi R^4 dp/(8 mu L) (1 - 4/3 phi + 1/3 phi^4), phi = tauy/tauw
+    model = viscosity.herschel_bulkley(tauy=5.,k=.5,n=1.,m_flag=0)
+    # Wall stresses from 1.01 to 100 times the yield stress
+    pressure_drops = np.logspace(np.log10(1.01*model.tauy),np.log10(100.*model.tauy),10**5)*2.*_length/_radius
+    phi = model.tauy/(pressure_drops*_radius/(2.*_length))
+    reference = np.pi*_radius**4*pressure_drops/(8.*model.k*_length)*(1.-4./3.*phi+phi**4/3.)
+    def run():
+        flow = pipe.laminar_HB_analytical(viscosity=model,radius=_radius,length=_length)
+        q = flow.q_from_dp(pressure_drops)
+        dp = flow.dp_from_q(q)
+        return max(_error(q,reference),_error(dp,pressure_drops))
+    return run
+
+
+_height = .01
+_width = .2
+
+
+@benchmark(rtol=1.e-6)
+def slit_newtonian():
+    # Q = W H^3 dp/(12 mu L) with H the full gap
+    model = _models['newtonian']
+    reference = _width*_height**3*_pressure_drops/(12.*model.mu*_length)
+    def run():
+        q = [slit.laminar(height=_height,width=_width,length=_length,viscosity=model,pressure_drop=dp).q
+             for dp in _pressure_drops]
+        dp = [slit.laminar(height=_height,width=_width,length=_length,viscosity=model,q=qi).pressure_drop
+              for qi in reference]
+        return max(_error(q,reference),_error(dp,_pressure_drops))
+    return run
+
+
+@benchmark(rtol=1.e-6)
+def slit_power_law():
+    # Q = 2 W h^2 n/(2n+1) (tauw/k)^(1/n) with h the half gap and tauw = dp h/L
+    model = _models['power_law']
+    h = _height/2.
+    n = model.n
+    reference = 2.*_width*h**2*n/(2.*n+1.)*(_pressure_drops*h/_length/model.k)**(1./n)
+    def run():
+        q = [slit.laminar(height=_height,width=_width,length=_length,viscosity=model,pressure_drop=dp).q
+             for dp in _pressure_drops]
+        return _error(q,reference)
+    return run
+
+
+@benchmark(rtol=1.e-6)
+def slit_carreau():
+    # Q = 2 W h^2 Phi_1(tauw) with Phi_1 by quadrature
+    model = _models['carreau']
+    h = _height/2.
+    reference = 2.*_width*h**2*_flow_function(model,_pressure_drops*h/_length,1)
+    def run():
+        q = [slit.laminar(height=_height,width=_width,length=_length,viscosity=model,pressure_drop=dp).q
+             for dp in _pressure_drops]
+        dp = [slit.laminar(height=_height,width=_width,length=_length,viscosity=model,q=qi).pressure_drop
+              for qi in reference]
+        return max(_error(q,reference),_error(dp,_pressure_drops))
+    return run
+
+
+_rho = 1000.
+_diameter = .1
+_pipe_length = 100.
+_water = viscosity.newtonian(mu=1.e-3)
+# Laminar, transitional and turbulent Reynolds numbers of water in the pipe
+_reynolds = np.array([100.,1000.,1900.,2500.,4000.,1.e4,1.e5,1.e6])
+
+
+def _friction_reference(re):
+    """
+    Newtonian Fanning friction factor: 16/Re when laminar, else Nikuradse's
+    1/sqrt(f) = 4 log10(Re sqrt(f)) - 0.4, the Dodge-Metzner correlation for n' = 1.
+    """
+    f = 16./re
+    turbulent = f < .008
+    x = np.full(turbulent.sum(),10.)
+    for i in range(100):
+        x = 4.*np.log10(re[turbulent]/x) - .4
+    f[turbulent] = 1./x**2
+    return f
+
+
+def _friction_u(solver):
+    u = _reynolds*_water.mu/(_rho*_diameter)
+    reference = _friction_reference(_reynolds)
+    def run():
+        flow = friction_factor_property.friction_factor('bench',_rho,_diameter,_pipe_length,_water.calc_visc,
+                                                        solver=solver)
+        f = []
+        for ui in u:
+            flow.u = ui
+            f.append(2.*flow.tauw/(_rho*ui**2))
+        return _error(f,reference)
+    return run
+
+
+def _friction_dp(solver):
+    reference = _friction_reference(_reynolds)
+    u = _reynolds*_water.mu/(_rho*_diameter)
+    dp = 2.*reference*_rho*u**2*_pipe_length/_diameter
+    def run():
+        flow = friction_factor_property.friction_factor('bench',_rho,_diameter,_pipe_length,_water.calc_visc,
+                                                        solver=solver)
+        velocity = []
+        for dpi in dp:
+            flow.pressure_drop = dpi
+            velocity.append(flow.u)
+        return _error(velocity,u)
+    return run
+
+
+@benchmark(rtol=1.e-8)
+def friction_factor_u_bracketed():
+    return _friction_u('bracketed')
+
+
+@benchmark(rtol=1.e-8)
+def friction_factor_u_fsolve():
+    return _friction_u('fsolve')
+
+
+@benchmark(rtol=1.e-8)
+def friction_factor_dp_bracketed():
+    return _friction_dp('bracketed')
+
+
+@benchmark(rtol=1.e-6)
+def friction_factor_dp_fsolve():
+    return _friction_dp('fsolve')
+
+
+@benchmark(rtol=1.e-10)
+def friction_factor_batched():
+    u = np.repeat(_reynolds*_water.mu/(_rho*_diameter),10**4)
+    reference = _friction_reference(np.repeat(_reynolds,10**4))
+    def run():
+        result = friction_factor_property.solve_velocity(_water,_rho,_diameter,_pipe_length,u)
+        back = friction_factor_property.solve_pressure_drop(_water,_rho,_diameter,_pipe_length,result['pressure_drop'])
+        return max(_error(result['f'],reference),_error(back['u'],u))
+    return run
+
+
+def run(names,repeat=3):
+    """
+    Runs the named benchmarks and returns {name: {'seconds', 'error', 'rtol', 'passed'}} with
+    the best time over repeat runs and the largest error of any run.
+    """
+    results = {}
+    for name in names:
+        setup, rtol = _benchmarks[name]
+        workload = setup()
+        times = []
+        errors = []
+        for i in range(repeat):
+            cache.clear()
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                t = time.perf_counter()
+                error = workload()
+                times.append(time.perf_counter()-t)
+            if error is not None:
+                errors.append(error)
+        error = max(errors) if errors else None
+        passed = rtol is None or (error is not None and error <= rtol)
+        results[name] = {'seconds':min(times),'error':error,'rtol':rtol,'passed':passed}
+    return results
+
+
+def compare(results,baseline,threshold):
+    """
+    Returns the names of benchmarks whose time grew by more than threshold over baseline.
+    """
+    return [name for name in results if name in baseline and
+            results[name]['seconds'] > threshold*baseline[name]['seconds']]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat',type=int,default=3)
+    parser.add_argument('--filter',default='',help='regular expression selecting benchmarks by name')
+    parser.add_argument('--save',default=None,help='write the results to this JSON file')
+    parser.add_argument('--compare',default=None,help='JSON file of an earlier run')
+    parser.add_argument('--threshold',type=float,default=1.5,help='accepted slowdown factor')
+    parser.add_argument('--list',action='store_true',help='list the benchmarks and exit')
+    args = parser.parse_args(argv)
+    names = [name for name in _benchmarks if re.search(args.filter,name)]
+    if args.list:
+        print('\n'.join(names))
+        return 0
+    results = run(names,args.repeat)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as stream:
+            baseline = json.load(stream)['results']
+    slower = compare(results,baseline,args.threshold)
+    for name,r in results.items():
+        line = '%-40s %10.4f s' % (name,r['seconds'])
+        if name in baseline:
+            line += '  x%5.2f' % (r['seconds']/baseline[name]['seconds'])
+        if r['error'] is not None:
+            line += '  error %.1e' % r['error']
+        if not r['passed']:
+            line += '  FAIL accuracy (rtol %.0e)' % r['rtol']
+        if name in slower:
+            line += '  FAIL slower'
+        print(line)
+    if args.save:
+        with open(args.save,'w') as stream:
+            json.dump({'python':platform.python_version(),'numpy':np.__version__,'machine':platform.machine(),
+                       'results':results},stream,indent=1)
+    return 1 if slower or not all(r['passed'] for r in results.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
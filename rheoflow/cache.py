@@ -0,0 +1,306 @@
+import collections
+import copy
+import numpy as np
+
+from . import profile, viscosity, instrument
+
+
+class lru_dict(collections.OrderedDict):
+    """
+    Dictionary that keeps at most maxsize entries, evicting the least recently used.
+    Reading an entry with get or [] marks it as recently used.
+    """
+    def __init__(self,maxsize=128):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def __getitem__(self,key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def get(self,key,default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def __setitem__(self,key,value):
+        super().__setitem__(key,value)
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+def _monotone_slopes(x,y,d):
+    """
+    Limits node derivatives d of a cubic Hermite interpolant through increasing (x,y) so
+    that it stays monotone (Fritsch-Carlson condition alpha**2+beta**2 <= 9).
+    """
+    delta = np.diff(y)/np.diff(x)
+    # Infinite or undefined slopes (next to a yield stress) get the largest monotone value
+    cap = 3.*np.minimum(np.append(delta,delta[-1]),np.insert(delta,0,delta[0]))
+    d = np.where(np.isfinite(d),np.maximum(d,0.),cap)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        alpha = d[:-1]/delta
+        beta = d[1:]/delta
+        scale = np.where(alpha**2+beta**2 > 9.,3./np.sqrt(alpha**2+beta**2),1.)
+    scale = np.where(np.isfinite(scale),scale,1.)
+    d = d.copy()
+    d[:-1] = np.minimum(d[:-1],scale*d[:-1])
+    d[1:] = np.minimum(d[1:],scale*d[1:])
+    return d
+
+
+def _hermite(x,y,d,xq):
+    """
+    Evaluates the cubic Hermite interpolant with node values y and slopes d at xq.
+    """
+    i = np.clip(np.searchsorted(x,xq)-1,0,x.size-2)
+    h = x[i+1] - x[i]
+    t = (xq - x[i])/h
+    return (1.+2.*t)*(1.-t)**2*y[i] + t*(1.-t)**2*h*d[i] + \
+        t**2*(3.-2.*t)*y[i+1] + t**2*(t-1.)*h*d[i+1]
+
+
+class master_curve:
+    """
+    Tabulated flow function Phi_m(tauw) of one fluid (see profile.flow_function), stored as
+    ln(Phi) against ln(tauw) with its exact slope rate(tauw)/Phi - (m+1) at every node.
+    Values between nodes come from a monotone (PCHIP-style) cubic Hermite interpolant, in
+    both directions.  The table starts empty and is extended lazily whenever a request
+    falls outside the stresses covered so far; intervals of the new range are halved until
+    the midpoint interpolation error against the exact flow function is below rtol.
+    Stresses sampled with Phi=0 (below a yield stress) are remembered, so requests at or
+    below them return 0 without interpolation.
+    """
+    def __init__(self,visc,m=2,rtol=1.e-8,nodes=32,min_width=1.e-6):
+        self._viscosity = visc
+        self.m = m
+        self.rtol = rtol
+        self.nodes = nodes
+        self.min_width = min_width
+        self._x = np.empty(0)
+        self._y = np.empty(0)
+        self._dydx = np.empty(0)
+        self._x_zero = -np.inf
+        self._slopes = None
+        self._inverse_slopes = None
+
+    def __len__(self):
+        return self._x.size
+
+    def _exact(self,x):
+        """
+        Exact ln(Phi) and its slope d(ln Phi)/d(ln tauw) at ln(tauw) values x.
+        """
+        tau = np.exp(x)
+        phi = profile.flow_function(self._viscosity,tau,self.m,self.nodes)
+        rate = viscosity.invert_stress(self._viscosity,tau)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            return np.log(phi), rate/phi-(self.m+1.)
+
+    def _insert(self,x):
+        """
+        Samples the exact flow function at ln(tauw) values x and adds them to the table.
+        """
+        x = np.setdiff1d(np.unique(x),self._x)
+        x = x[x > self._x_zero]
+        if x.size == 0:
+            return
+        start = instrument.start()
+        y, dydx = self._exact(x)
+        instrument.count('master_curve',evaluations=x.size,since=start)
+        zero = ~np.isfinite(y)
+        if zero.any():
+            self._x_zero = x[zero].max()
+        order = np.argsort(np.concatenate((self._x,x[~zero])))
+        self._x = np.concatenate((self._x,x[~zero]))[order]
+        self._y = np.concatenate((self._y,y[~zero]))[order]
+        self._dydx = np.concatenate((self._dydx,dydx[~zero]))[order]
+        keep = self._x > self._x_zero
+        self._x, self._y, self._dydx = self._x[keep], self._y[keep], self._dydx[keep]
+        self._slopes = None
+
+    def _build(self):
+        if self._slopes is None and self._x.size >= 2:
+            self._slopes = _monotone_slopes(self._x,self._y,self._dydx)
+            with np.errstate(divide='ignore'):
+                self._inverse_slopes = _monotone_slopes(self._y,self._x,1./self._slopes)
+
+    def _refine(self,x_lo,x_hi):
+        """
+        Halves the intervals between ln(tauw) x_lo and x_hi until the interpolation error at
+        every midpoint is below rtol, for Phi(tauw) and for the inverse tauw(Phi) alike.
+        """
+        for depth in range(40):
+            if self._x.size < 2:
+                return
+            self._build()
+            i = np.arange(self._x.size-1)
+            i = i[(self._x[1:] > x_lo) & (self._x[:-1] < x_hi) & (np.diff(self._x) > self.min_width)]
+            if i.size == 0:
+                return
+            mid = 0.5*(self._x[i]+self._x[i+1])
+            exact = self._exact(mid)[0]
+            error = np.abs(np.expm1(_hermite(self._x,self._y,self._slopes,mid)-exact))
+            with np.errstate(invalid='ignore'):
+                inverse = np.abs(np.expm1(_hermite(self._y,self._x,self._inverse_slopes,exact)-mid))
+            bad = ~(error <= self.rtol) | (np.isfinite(exact) & ~(inverse <= self.rtol))
+            if not bad.any():
+                return
+            self._insert(mid[bad])
+
+    def _cover(self,x=None,y=None):
+        """
+        Extends the table until it spans every ln(tauw) in x (stresses at or below a sampled
+        zero of Phi count as covered) and every ln(Phi) in y.
+        """
+        step = np.log(10.)
+        x = np.empty(0) if x is None else x
+        y = np.empty(0) if y is None else y
+        for rounds in range(200):
+            if self._x.size < 2:
+                if self._x_zero > -np.inf:
+                    grid = self._x_zero + np.linspace(0.,step,5)[1:]
+                else:
+                    grid = np.linspace(x.min()-.5*step,x.max()+.5*step,int(np.ptp(x)/step*4.)+5)
+                self._insert(grid)
+                self._refine(grid[0],grid[-1])
+                continue
+            new = []
+            if (x.size and x.max() > self._x[-1]) or (y.size and y.max() > self._y[-1]):
+                new.append(self._x[-1] + step*np.linspace(.25,1.,4))
+            uncovered = x[x > self._x_zero]
+            if (uncovered.size and uncovered.min() < self._x[0]) or (y.size and y.min() < self._y[0]):
+                if self._x_zero > -np.inf:
+                    # Close the gap towards the largest stress known to give Phi=0
+                    new.append(np.linspace(self._x_zero,self._x[0],6)[1:-1])
+                else:
+                    new.append(self._x[0] - step*np.linspace(.25,1.,4))
+            if not new:
+                break
+            new = np.concatenate(new)
+            self._insert(new)
+            self._refine(new.min()-step,new.max()+step)
+        self._build()
+
+    def phi(self,tauw):
+        """
+        Interpolated flow function Phi_m at wall stresses tauw (scalar or array).
+        """
+        tauw = np.asarray(tauw,dtype=float)
+        with np.errstate(divide='ignore'):
+            x = np.log(np.maximum(tauw,0.))
+        finite = np.isfinite(x)
+        if not finite.any():
+            return np.zeros(tauw.shape)[()]
+        self._cover(x=x[finite])
+        inside = finite & (x > self._x_zero)
+        result = np.zeros(tauw.shape)
+        result[inside] = np.exp(_hermite(self._x,self._y,self._slopes,x[inside]))
+        return result[()]
+
+    def tauw(self,phi):
+        """
+        Wall stresses at which Phi_m equals phi (scalar or array) by inverse interpolation,
+        which _refine keeps within rtol.  Only where that is not guaranteed, in intervals whose
+        refinement stopped at min_width or next to a stress with Phi=0, one Newton step on the
+        exact flow function follows.
+        """
+        phi = np.asarray(phi,dtype=float)
+        positive = phi > 0.
+        if not positive.any():
+            return np.zeros(phi.shape)[()]
+        y = np.log(phi[positive])
+        if self._x.size < 2 and self._x_zero == -np.inf:
+            # Start from the Newtonian estimate, apparent shear rate (m+2)*phi
+            rate_a = (self.m+2.)*phi[positive]
+            x_a = np.log(rate_a*getattr(self._viscosity,'calc_visc',self._viscosity)(rate_a))
+            self._cover(x=x_a,y=y)
+        else:
+            self._cover(y=y)
+        x = _hermite(self._y,self._x,self._inverse_slopes,y)
+        i = np.clip(np.searchsorted(self._x,x)-1,0,self._x.size-2)
+        rough = np.diff(self._x)[i] <= self.min_width
+        if self._x_zero > -np.inf:
+            rough |= i == 0
+        if rough.any():
+            exact, slope = self._exact(x[rough])
+            step = (exact-y[rough])/slope
+            x[rough] = np.where(np.isfinite(step),x[rough]-step,x[rough])
+        result = np.zeros(phi.shape)
+        result[positive] = np.exp(x)
+        return result[()]
+
+
+_defaults = {'rtol':1.e-8,'nodes':32}
+_curves = lru_dict(maxsize=64)
+
+
+def configure(rtol=None,maxsize=None,nodes=None):
+    """
+    Sets the default interpolation tolerance, the number of Gauss-Legendre nodes per panel
+    and the maximum number of master curves kept in memory.
+    """
+    if rtol is not None:
+        _defaults['rtol'] = rtol
+    if nodes is not None:
+        _defaults['nodes'] = nodes
+    if maxsize is not None:
+        _curves.maxsize = maxsize
+        while len(_curves) > maxsize:
+            _curves.popitem(last=False)
+
+
+def clear():
+    """
+    Discards every cached master curve.
+    """
+    _curves.clear()
+
+
+def fluid_key(visc):
+    """
+    Hashable key identifying a fluid by model type and current parameter values, so a
+    model changed in place gets a new table and equal models share one.  Models of
+    rheoflow.viscosity use their fingerprint().  Other viscosity functions are keyed by identity.
+    """
+    owner = getattr(visc,'__self__',None)
+    if getattr(visc,'__name__','') == 'calc_visc' and owner is not None:
+        visc = owner
+    if hasattr(visc,'fingerprint'):
+        return visc.fingerprint()
+    if hasattr(visc,'calc_visc') and hasattr(visc,'__dict__'):
+        return (type(visc).__name__,) + tuple(sorted((k,v) for k,v in vars(visc).items() if k != 'name'))
+    return visc
+
+
+def _snapshot(visc):
+    """
+    Copy of fluid visc that later changes to the caller's model cannot reach: the frozen copy
+    of rheoflow.viscosity models (also for their bound calc_visc), a shallow copy of other
+    model objects.  Plain viscosity functions are keyed by identity and kept as they are.
+    """
+    owner = getattr(visc,'__self__',None)
+    if getattr(visc,'__name__','') == 'calc_visc' and owner is not None:
+        visc = owner
+    if hasattr(visc,'frozen'):
+        return visc.frozen()
+    if hasattr(visc,'calc_visc') and hasattr(visc,'__dict__'):
+        return copy.copy(visc)
+    return visc
+
+
+def get_curve(visc,m=2,rtol=None):
+    """
+    Returns the shared master curve of flow function Phi_m for fluid visc, creating it if needed.
+    The curve evaluates a snapshot of the fluid taken at creation (see _snapshot), so it stays
+    valid for its key when the caller's model is changed in place afterwards.
+    """
+    rtol = _defaults['rtol'] if rtol is None else rtol
+    key = (fluid_key(visc),m,rtol,_defaults['nodes'])
+    curve = _curves.get(key)
+    if curve is None:
+        curve = master_curve(_snapshot(visc),m=m,rtol=rtol,nodes=_defaults['nodes'])
+        _curves[key] = curve
+    return curve
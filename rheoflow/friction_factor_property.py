@@ -1,8 +1,234 @@
+import warnings
 import numpy as np
-import scipy.integrate as spi
-import matplotlib.pyplot as plt
 import scipy.optimize as spo
-from scipy.optimize import fsolve
+
+from . import viscosity, roots, instrument
+
+
+def dodge_metzner(re,nprime,rtol=1.e-14,maxiter=50):
+    """
+    Fanning friction factor from the Dodge-Metzner correlation for arrays of Reynolds
+    number re and flow index nprime (broadcast together).
+    The laminar value 16/Re is used where it is at least 0.008, otherwise the implicit
+    turbulent equation
+        1/sqrt(f) = 4/n'**0.75*log10(Re*f**(1-n'/2)) - 0.4/n'**1.2
+    is solved for every point at once.  In X = 1/sqrt(f) it reads
+        g(X) = X + A*(2-n')*log10(X) - A*log10(Re) + B = 0,  A = 4/n'**0.75, B = 0.4/n'**1.2
+    which is increasing and concave, so Newton iterations started below the root from
+    the explicit estimate X = A*log10(Re) - B converge monotonically in a few steps.
+    """
+    re, nprime = np.broadcast_arrays(np.abs(np.asarray(re,dtype=float)),np.asarray(nprime,dtype=float))
+    f_laminar = 16./(re+1.0e-9)
+    f_fanning = np.array(f_laminar)
+    turbulent = f_laminar < 0.008
+    if turbulent.any():
+        log_re = np.log10(re[turbulent])
+        n = nprime[turbulent]
+        a = 4.0/n**0.75
+        b = 0.4/n**1.2
+        c = a*(2.-n)
+        x = np.maximum(a*log_re - b,1.)
+        # One fixed point step from above puts the start below the root
+        x = np.maximum(a*log_re - b - c*np.log10(x),1.e-3)
+        for i in range(maxiter):
+            g = x + c*np.log10(x) - a*log_re + b
+            step = g/(1. + c/(x*np.log(10.)))
+            x = np.maximum(x - step,0.1*x)
+            if np.all(np.abs(step) <= rtol*x):
+                break
+        f_fanning[turbulent] = 1./x**2
+    return f_fanning[()]
+
+
+def dodge_metzner_explicit(re,nprime):
+    """
+    Explicit approximation of dodge_metzner for high volume screening, with no iteration.
+    The turbulent equation g(X) = 0 has the exact solution
+        X = c/ln(10)*W(z),  c = A*(2-n'),  ln(z) = ln(ln(10)/c) + ln(10)*(A*log10(Re) - B)/c
+    in terms of the Lambert W function.  W is taken from Winitzki's closed form
+        W(z) ~ L*(1 - ln(1+L)/(2+L)),  L = ln(1+z)
+    improved by one Halley step on w + ln(w) = ln(z).  For 2000 <= Re <= 1e10 and
+    0.05 <= n' <= 1 the friction factor differs from the exact solution by less than
+    2e-6 relative (one more step would reach rounding level).  The laminar branch is exact.
+    """
+    re, nprime = np.broadcast_arrays(np.abs(np.asarray(re,dtype=float)),np.asarray(nprime,dtype=float))
+    f_laminar = 16./(re+1.0e-9)
+    f_fanning = np.array(f_laminar)
+    turbulent = f_laminar < 0.008
+    if turbulent.any():
+        n = nprime[turbulent]
+        a = 4.0/n**0.75
+        b = 0.4/n**1.2
+        c = a*(2.-n)
+        ln10 = np.log(10.)
+        log_z = np.log(ln10/c) + ln10*(a*np.log10(re[turbulent]) - b)/c
+        l = np.logaddexp(0.,log_z)
+        w = l*(1. - np.log1p(l)/(2.+l))
+        h = w + np.log(w) - log_z
+        dh = 1. + 1./w
+        w = w - 2.*h*dh/(2.*dh**2 + h/w**2)
+        f_fanning[turbulent] = (ln10/(c*w))**2
+    return f_fanning[()]
+
+
+def _nprime(visc,tauw,gammadotw=None):
+    """
+    Flow behaviour index n' = dlog(tauw)/dlog(gammadotw) of viscosity function (or model) visc at
+    wall stress tauw (scalar or array), clipped to [0.01,1].  The wall shear rate gammadotw is
+    solved for when not given.
+    """
+    if gammadotw is None:
+        gammadotw = np.abs(np.real(viscosity.invert_stress(visc,tauw)))
+    nprime = viscosity.flow_index(visc,gammadotw)
+    return np.clip(nprime,.01,1.)
+
+
+def _dnprime_dtau(visc,gammadotw):
+    """
+    Derivative dn'/dtauw of the flow behaviour index at wall shear rate gammadotw, from
+    n = 1 + rate*visc'/visc: dn/drate = (visc' + rate*visc'')/visc - rate*(visc'/visc)**2,
+    divided by dtauw/drate = visc + rate*visc'.  Zero where n' is clipped to [0.01,1].
+    """
+    rate = np.asarray(gammadotw,dtype=float)
+    eta = getattr(visc,'calc_visc',visc)(rate)
+    deta = viscosity.visc_derivative(visc,rate)
+    d2eta = viscosity.visc_second_derivative(visc,rate)
+    n = 1. + rate*deta/eta
+    with np.errstate(divide='ignore',invalid='ignore'):
+        dn_drate = (deta + rate*d2eta)/eta - rate*(deta/eta)**2
+        return np.where((n > .01) & (n < 1.),dn_drate/(eta + rate*deta),0.)[()]
+
+
+def _dodge_metzner_slope(re,f,nprime):
+    """
+    Logarithmic derivative dln(f)/dln(Re) of the Dodge-Metzner friction factor f at re:
+    -1 on the laminar branch, from implicit differentiation of g(X) = 0 on the turbulent one.
+    """
+    a = 4.0/nprime**0.75
+    x = 1./np.sqrt(f)
+    ln10 = np.log(10.)
+    turbulent = -2./x*(a/ln10)/(1. + a*(2.-nprime)/(x*ln10))
+    return np.where(16./(np.abs(re)+1.0e-9) < 0.008,turbulent,-1.)
+
+
+def _dodge_metzner_dnprime(re,f,nprime):
+    """
+    Derivative df/dn' of the Dodge-Metzner friction factor f at fixed re: zero on the laminar
+    branch, from implicit differentiation of g(X) = 0 on the turbulent one.
+    """
+    a = 4.0/nprime**0.75
+    b = 0.4/nprime**1.2
+    x = 1./np.sqrt(f)
+    ln10 = np.log(10.)
+    log_x = np.log10(x)
+    dg_dn = -0.75*a/nprime*((2.-nprime)*log_x - np.log10(np.abs(re)+1.0e-9)) - a*log_x - 1.2*b/nprime
+    dx_dn = -dg_dn/(1. + a*(2.-nprime)/(x*ln10))
+    return np.where(16./(np.abs(re)+1.0e-9) < 0.008,-2.*f/x*dx_dn,0.)
+
+
+def _dlnu_dlndp(re,f,n_local):
+    """
+    Logarithmic derivative dln(U)/dln(pressure drop) at constant n', from
+    dln(f Re^2) = dln(2*tauw*rho*d**2/viscosity**2) and dln(viscosity)/dln(tauw) = 1 - 1/n
+    with the local flow index n = n_local of the fluid at the wall.
+    """
+    dlneta = 1.-1./n_local
+    return (1.-2.*dlneta)/(2.+_dodge_metzner_slope(re,f,np.clip(n_local,.01,1.))) + dlneta
+
+
+def _pipe_result(pressure_drop,u,re,f,tauw,gammadotw,n_local):
+    """
+    Structured array of solve_pressure_drop and solve_velocity, with du_ddp from _dlnu_dlndp.
+    """
+    nprime = np.clip(n_local,.01,1.)
+    flowing = tauw > 0.
+    with np.errstate(divide='ignore',invalid='ignore'):
+        dlnu = _dlnu_dlndp(re,f,n_local)
+        du_ddp = np.where(flowing,np.abs(u/pressure_drop)*dlnu,0.)
+    result = np.empty(np.shape(u),dtype=[('pressure_drop',float),('u',float),('re',float),('f',float),
+                                       ('stress_wall',float),('shear_rate_wall',float),('nprime',float),
+                                       ('du_ddp',float)])
+    result['pressure_drop'] = pressure_drop
+    result['u'] = u
+    result['re'] = re
+    result['f'] = f
+    result['stress_wall'] = tauw
+    result['shear_rate_wall'] = gammadotw
+    result['nprime'] = nprime
+    result['du_ddp'] = du_ddp
+    return result
+
+
+@instrument.operation
+def solve_pressure_drop(visc,rho,d,l,pressure_drop,friction_model='dm'):
+    """
+    Solves pipe flow with the Dodge-Metzner correlation for many operating points in one call.
+    rho, d, l and pressure_drop may be scalars or arrays and are broadcast together; visc is a
+    single viscosity function or model.  The wall stress d*pressure_drop/(4*l) fixes the wall
+    shear rate, viscosity and n', which leaves one equation for Re,
+        f(Re,n')*Re**2 = 2*tauw*rho*d**2/viscosity**2,
+    solved for all points together by safeguarded Newton iterations.
+    Returns a structured array with fields pressure_drop, u, re, f, stress_wall, shear_rate_wall,
+    nprime and du_ddp, the derivative of U with respect to pressure drop at constant n'.
+    """
+    friction = {'dm':dodge_metzner,'dm_explicit':dodge_metzner_explicit}[friction_model]
+    calc_visc = getattr(visc,'calc_visc',visc)
+    pressure_drop, rho, d, l = np.broadcast_arrays(
+        *(np.asarray(x,dtype=float) for x in (pressure_drop,rho,d,l)))
+    tauw = d/4.*np.abs(pressure_drop)/l
+    flowing = tauw > 0.
+    gammadotw = viscosity.invert_stress(visc,tauw)
+    eta = calc_visc(gammadotw)
+    # Unclipped local index for the viscosity derivative, clipped n' for the correlation
+    n_local = viscosity.flow_index(visc,gammadotw)
+    nprime = np.clip(n_local,.01,1.)
+    k = np.where(flowing,2.*tauw*rho*d**2/eta**2,1.)
+    residual = lambda re: np.log(friction(re,nprime)*re**2/k)
+    dresidual = lambda re: (2.+_dodge_metzner_slope(re,friction(re,nprime),nprime))/re
+    # Bracket around the laminar solution 16*Re = k
+    lo, hi = roots.expand_bracket(residual,k/16.,k/16.)
+    re = np.where(flowing,roots.newton_bracketed(residual,dresidual,lo,hi),0.)
+    f = np.where(flowing,friction(re,nprime),np.inf)
+    u = re*eta/(rho*d)
+    return _pipe_result(pressure_drop,u,re,f,tauw,gammadotw,n_local)
+
+
+@instrument.operation
+def solve_velocity(visc,rho,d,l,u,friction_model='dm'):
+    """
+    Solves pipe flow with the Dodge-Metzner correlation for many mean velocities u in one call,
+    the inverse of solve_pressure_drop.  The unknown is the wall shear rate, which gives the
+    wall stress, Re and n' explicitly, so no stress inversion is needed; the equation
+        f(Re,n') = 2*tauw/(rho*U**2)
+    is solved in log form by safeguarded Newton iterations started from the apparent wall
+    shear rate 8U/D.  Returns the structured array of solve_pressure_drop; the pressure drop
+    takes the sign of u.
+    """
+    friction = {'dm':dodge_metzner,'dm_explicit':dodge_metzner_explicit}[friction_model]
+    calc_visc = getattr(visc,'calc_visc',visc)
+    u, rho, d, l = np.broadcast_arrays(*(np.asarray(x,dtype=float) for x in (u,rho,d,l)))
+    moving = u != 0.
+    u_abs = np.where(moving,np.abs(u),1.)
+    def terms(rate):
+        eta = calc_visc(rate)
+        n_local = viscosity.flow_index(visc,rate)
+        re = rho*d*u_abs/eta
+        return eta, n_local, re, friction(re,np.clip(n_local,.01,1.))
+    def residual(rate):
+        eta, n_local, re, f = terms(rate)
+        return np.log(2.*rate*eta/(rho*u_abs**2)/f)
+    def dresidual(rate):
+        # dln(tauw)/dln(rate) = n and dln(Re)/dln(rate) = 1 - n, at constant n'
+        eta, n_local, re, f = terms(rate)
+        return (n_local - _dodge_metzner_slope(re,f,np.clip(n_local,.01,1.))*(1.-n_local))/rate
+    rate_a = 8.*u_abs/d
+    lo, hi = roots.expand_bracket(residual,rate_a,rate_a)
+    rate = roots.newton_bracketed(residual,dresidual,lo,hi,x0=rate_a)
+    eta, n_local, re, f = terms(rate)
+    tauw = np.where(moving,rate*eta,0.)
+    pressure_drop = np.sign(u)*4.*l*tauw/d
+    return _pipe_result(pressure_drop,np.where(moving,u,0.),np.where(moving,re,0.),np.where(moving,f,np.inf),
+                        tauw,np.where(moving,rate,0.),np.where(moving,n_local,1.))
 
 
 class friction_factor:
@@ -10,22 +236,102 @@ class friction_factor:
     This class computes pipe flow information based on the non-Newtonian Dodge-Metzner paper.
 
     There is a Jupyter notebook demonstrating usage.
+
+    friction_model selects the friction factor correlation: 'dm' solves the implicit
+    Dodge-Metzner equation exactly, 'dm_explicit' uses the explicit approximation
+    dodge_metzner_explicit (relative error below 2e-6) for faster screening runs.
+
+    solver selects how the pipe equations are solved: 'fsolve' solves the coupled
+    system for (tauw, Re, dp, gammadotw), 'bracketed' reduces it to one equation in
+    log(tauw) (U given) or log(Re) (pressure drop given) solved by brentq.  When fsolve does
+    not converge the bracketed solve is used instead.
+    After every solve the dictionary solve_info reports method, converged, iterations,
+    function_calls and message (for fsolve, iterations counts Jacobian evaluations).  A solve
+    that fails altogether issues a RuntimeWarning and sets the results to NaN.
+
+    With lazy=True setters only record the new value and the pipe is solved when a result is
+    first read; the most recently set of u and pressure_drop is held fixed.  update() sets
+    several values and solves once in either mode, with the same rule.  Without lazy the d, l
+    and rho setters keep their original behaviour and solve for the pressure drop at the
+    current U.
+
+    With continuation=True each solve starts from the previous solution carried along its
+    log-log tangent (local slope dln(U)/dln(pressure drop)) to the new U or pressure drop.
+    fsolve starts from that prediction; the bracketed solver only narrows its bracket to a few
+    percent around it and still runs brentq to full tolerance, so it saves just a few
+    iterations per point.  Sweeps in small steps (sorted U or pressure drops) profit most.  If
+    the predicted start fails the usual cold start is used.  Changing d, l, rho or
+    friction_model forgets the previous solution.
     """
-    def __init__(self,name,rho,d,l,viscosity):
+    _friction_models = {'dm':'_f_dm','dm_explicit':'_f_dm_explicit'}
+    _solvers = ('fsolve','bracketed')
+    _update_keys = ('d','l','rho','u','pressure_drop')
+
+    def __init__(self,name,rho,d,l,viscosity,friction_model='dm',solver='fsolve',lazy=False,
+                 continuation=False):
         self.name=name
         self.__rho=rho
         self.__d=d
         self.__l=l
         self._viscosity=viscosity # This is the viscosity function 
-        self._friction = self._f_dm # Default friction factor for now
         self.__u = None
         self.__pressure_drop = None
         self.__f = None
         self.__re = None
-        self.gammadotw = None
-        self.tauw = None
+        self.__gammadotw = None
+        self.__tauw = None
+        self.__solve_info = None
+        self.__nprime_memo = None
+        self.__lazy = lazy
+        self.__dirty = False
+        self.__driver = None
+        self.__previous = None
+        self.continuation = continuation
+        self.solver = solver
+        self.friction_model = friction_model
     
+    def __solve(self):
+        """
+        Solves for the quantity not held fixed, pressure drop or U.
+        """
+        self.__dirty = False
+        if self.__driver == 'u':
+            self.__pipe_u()
+        elif self.__driver == 'pressure_drop':
+            self.__pipe_dp()
+
+    def __refresh(self):
+        if self.__dirty:
+            self.__solve()
+
+    def __changed(self):
+        if self.__lazy:
+            self.__dirty = True
+        else:
+            self.__solve()
+
+    def update(self,**kwargs):
+        """
+        Sets any of u, pressure_drop, d, l and rho by keyword and solves the pipe once.
+        """
+        if 'u' in kwargs and 'pressure_drop' in kwargs:
+            raise ValueError('Specify at most one of u or pressure_drop')
+        for key in kwargs:
+            if key not in self._update_keys:
+                raise TypeError('update() got an unexpected keyword argument '+repr(key))
+        lazy = self.__lazy
+        self.__lazy = True
+        try:
+            for key in self._update_keys:
+                if key in kwargs:
+                    setattr(self,key,kwargs[key])
+        finally:
+            self.__lazy = lazy
+        if not lazy:
+            self.__refresh()
+
     def __str__(self):
+        self.__refresh()
         return str('Name= '+self.name+'\n'+
             'Diameter = '+str(self.__d)+'\n'+
             'Length = '+str(self.__l)+'\n'+
@@ -38,36 +344,38 @@ class friction_factor:
             'Wall shear stress = '+str(self.tauw)+'\n'
             )
     
+    def _nprime(self,tauw):
+        """
+        Flow behaviour index n' = dlog(tauw)/dlog(gammadotw) at wall stress tauw (scalar or array),
+        clipped to [0.01,1].
+        """
+        return self.__wall(tauw)[1]
+
+    def __wall(self,tauw):
+        """
+        Wall shear rate and n' at wall stress tauw.
+        """
+        # The pressure drop driven equations see one wall stress, so remember the last one
+        key = np.asarray(tauw,dtype=float)
+        key = (key.shape,key.tobytes())
+        if self.__nprime_memo is None or self.__nprime_memo[0] != key:
+            gammadotw = np.abs(np.real(viscosity.invert_stress(self._viscosity,tauw)))
+            self.__nprime_memo = (key,gammadotw,_nprime(self._viscosity,tauw,gammadotw))
+        return self.__nprime_memo[1:]
+
     def _f_dm(self,re,tauw):
         """
         _f_fm returns the Fanning friction factor given Re (re) and wall stress (tauw).
-        It is based on Dodge-Metzner paper.
-        """
-        # Step 1 - compute wall shear rate, gammadot_f
-        gammadot_f = spo.brentq(lambda x: x*self._viscosity(x)-tauw,0.,1.e+9)
-        gammadot_f = np.abs(np.real(gammadot_f))
-        # Step 2 - compute n' = dlog(tauw)/dlog(gammadotw).  Simple central FD
-        dx = .01 # arbitrary for now
-        #nprime = (np.log10(self.viscosity(gammadot_f+dx)*(gammadot_f+dx))- \
-        #         np.log10(self.viscosity(gammadot_f-dx)*(gammadot_f-dx)))/        \
-        #        (np.log10(gammadot_f+dx)-np.log10(gammadot_f-dx))
-        nprime = (np.log10(self._viscosity(gammadot_f+dx)*(gammadot_f+dx))- \
-                 np.log10(self._viscosity(gammadot_f)*(gammadot_f)))/        \
-                (np.log10(gammadot_f+dx)-np.log10(gammadot_f))
-        if (nprime<0.):
-            nprime=.01
-        elif (nprime>1.):
-            nprime=1.
-
-        # Step 3 - comnpute laminar f and use f=0.008 as cutoff between laminar and turbulent.
-        f_laminar = 16./(np.abs(re)+1.0e-9)
-        if (f_laminar < 0.008):   # Solve turbulent case
-            f_dodgemetz = lambda x: np.sqrt(1.0/(x+1.e-9)) - \
-                    4.0/nprime**0.75*np.log10(np.abs(re*(x+1.e-9)**(1.-nprime/2.))) + 0.4/nprime**1.2
-            f_fanning = spo.brentq( f_dodgemetz, 0., 1.e+6)
-        else:
-            f_fanning = f_laminar
-        return f_fanning
+        It is based on Dodge-Metzner paper.  re and tauw may be arrays.
+        """
+        # Step 3 - laminar f with f=0.008 as cutoff between laminar and turbulent.
+        return dodge_metzner(re,self._nprime(tauw))
+
+    def _f_dm_explicit(self,re,tauw):
+        """
+        Fanning friction factor from the explicit approximation of the Dodge-Metzner correlation.
+        """
+        return dodge_metzner_explicit(re,self._nprime(tauw))
 
     def _equations_u(self,u,p):
         """
@@ -86,6 +394,29 @@ class friction_factor:
                tauw-self.__d/4.*dp/self.__l]
         return eqs
 
+    def _friction_derivatives(self,re,tauw):
+        """
+        Partial derivatives (df/dRe, df/dtauw) of the friction factor, both analytic.  The wall
+        stress enters only through n', see _dnprime_dtau.
+        """
+        gammadotw, nprime = self.__wall(tauw)
+        f = self._friction(re,tauw)
+        df_dre = f*_dodge_metzner_slope(re,f,nprime)/re
+        return df_dre, _dodge_metzner_dnprime(re,f,nprime)*_dnprime_dtau(self._viscosity,gammadotw)
+
+    def _jacobian_u(self,u,p):
+        """
+        Jacobian of _equations_u with respect to (tauw, re, dp, gammadotw).
+        """
+        [tauw,re,dp,gammadotw] = p
+        eta = self._viscosity(gammadotw)
+        deta = viscosity.visc_derivative(self._viscosity,gammadotw)
+        df_dre, df_dtau = self._friction_derivatives(re,tauw)
+        return np.array([[0.,1.,0.,self.__rho*self.__d*u*deta/eta**2],
+                         [1.,0.,0.,-(eta+gammadotw*deta)],
+                         [df_dtau,df_dre,-self.__d/(2.*self.__rho*u**2*self.__l),0.],
+                         [1.,0.,-self.__d/(4.*self.__l),0.]],dtype=float)
+
     def _equations_dp(self,dp,tauw,gammadotw,p):
         """
         Simultanious equations for pipe flow when delta P is input and U must be calculated.
@@ -100,10 +431,88 @@ class friction_factor:
             self._friction(re,tauw)*2.*self.__rho*u**2*self.__l-dp*self.__d]
         return eqs
 
-    def __pipe_u(self):
+    def _jacobian_dp(self,dp,tauw,gammadotw,p):
         """
+        Jacobian of _equations_dp with respect to (re, u); tauw is fixed so only the Reynolds
+        number derivative of the friction factor enters.
         """
-        
+        [re,u] = p
+        nprime = self._nprime(tauw)
+        f = self._friction(re,tauw)
+        df_dre = f*_dodge_metzner_slope(re,f,nprime)/re
+        return np.array([[float(self._viscosity(gammadotw)),-self.__rho*self.__d],
+                         [df_dre*2.*self.__rho*u**2*self.__l,f*4.*self.__rho*u*self.__l]],dtype=float)
+
+    def __predict(self,u=None,pressure_drop=None):
+        """
+        Prediction (tauw, re, pressure_drop, gammadotw, u) at the new U u or pressure drop from
+        the previous solution along its log-log tangent, or None without continuation, without
+        a previous solution or when the flow changes direction.
+        """
+        if not self.continuation or self.__previous is None:
+            return None
+        u0, dp0, tauw0, re0, gammadotw0, f0 = self.__previous
+        n_local = float(viscosity.flow_index(self._viscosity,gammadotw0))
+        with np.errstate(divide='ignore',invalid='ignore'):
+            dlnu = float(_dlnu_dlndp(re0,f0,n_local))
+            ratio = pressure_drop/dp0 if u is None else (u/u0)**(1./dlnu)
+            if not (np.isfinite(ratio) and ratio > 0. and n_local > 0.):
+                return None
+            u = u0*ratio**dlnu if u is None else u
+            # dln(gammadotw)/dln(tauw) = 1/n and dln(viscosity)/dln(tauw) = 1 - 1/n
+            return tauw0*ratio, re0*u/u0/ratio**(1.-1./n_local), dp0*ratio, gammadotw0*ratio**(1./n_local), u
+
+    def __remember(self):
+        """
+        Keeps the solution for the next start when it converged.
+        """
+        if self.__solve_info is not None and self.__solve_info['converged']:
+            self.__previous = (self.__u,self.__pressure_drop,self.__tauw,self.__re,self.__gammadotw,self.__f)
+        else:
+            self.__previous = None
+
+    def __fsolve(self,fun,fprime,guesses,**kwargs):
+        """
+        Solves fun(p) = 0 with fsolve from each starting point of guesses in turn until one
+        converges and records solve_info.  Returns the solution, or None (recording nothing)
+        when no start converges.  A start whose equations or Jacobian raise ValueError or
+        FloatingPointError (such as brentq meeting a NaN) counts as not converged.
+        """
+        iterations = 0
+        calls = 0
+        for guess in guesses:
+            start = instrument.start()
+            try:
+                ans, info, ier, mesg = spo.fsolve(fun,guess,fprime=fprime,full_output=True,**kwargs)
+            except (ValueError,FloatingPointError):
+                continue
+            instrument.count('fsolve',iterations=info.get('njev',0),evaluations=info['nfev'],since=start)
+            iterations += info.get('njev',0)
+            calls += info['nfev']
+            if ier == 1:
+                self.__set_info('fsolve',True,iterations,calls,mesg)
+                return ans
+        return None
+
+    def __fail(self):
+        """
+        Sets the results of a failed solve to NaN, keeping the U or pressure drop held fixed.
+        """
+        nan = float('nan')
+        if self.__driver == 'pressure_drop':
+            self.__u = nan
+        else:
+            self.__pressure_drop = nan
+        self.__re = self.__tauw = self.__gammadotw = self.__f = nan
+
+    def __guesses_u(self):
+        """
+        Starting points (tauw, re, dp, gammadotw) for the U driven equations: the continuation
+        prediction if there is one, then the estimate from the apparent wall shear rate.
+        """
+        predicted = self.__predict(u=self.__u)
+        if predicted is not None:
+            yield list(predicted[:4])
         # viscosity and friction are functions viscosity(rate), friction(re,tauw,viscosity)
         # Calc apparent wall shear rate for guesses
         gammadot_a = 8.*self.__u/self.__d
@@ -115,79 +524,222 @@ class friction_factor:
         # Use different guesses for laminar or turbulent cases to help convergence.
         # guess is list of initial guesses
         if (re_guess<2000.):
-            guess = [1.*tau_guess,1.*re_guess,1.*dp_guess,1.*gammadot_a]
+            yield [1.*tau_guess,1.*re_guess,1.*dp_guess,1.*gammadot_a]
         else:
-            guess = [.1*tau_guess,1.*re_guess,.1*dp_guess,.5*gammadot_a]
+            yield [.1*tau_guess,1.*re_guess,.1*dp_guess,.5*gammadot_a]
 
-        # Solve for delta P (dp), U, Re, and shear rate (gammadotw). p is list of variables.
-        # guess is list of initial guesses.
-        ans = spo.fsolve( lambda p: self._equations_u(self.__u,p),guess)
+    @instrument.operation
+    def __pipe_u(self):
+        """
+        """
+        ans = None
+        if self.__solver == 'fsolve':
+            # Solve for delta P (dp), U, Re, and shear rate (gammadotw). p is list of variables.
+            ans = self.__fsolve(lambda p: self._equations_u(self.__u,p), \
+                                lambda p: self._jacobian_u(self.__u,p),self.__guesses_u())
+        if ans is None:
+            # Bracketed solver, or fallback when fsolve did not converge
+            self.__pipe_u_bracketed()
+            return self.__remember()
 
-        self.dp=ans[2]
         self.__pressure_drop = ans[2]
         self.__re=ans[1]
-        self.tauw=ans[0]
-        self.gammadotw = ans[3]
-        self.__f = self._friction(self.__re,self.tauw)
+        self.__tauw=ans[0]
+        self.__gammadotw = ans[3]
+        self.__f = self._friction(self.__re,self.__tauw)
+        return self.__remember()
+
+    def _residual_u(self,log_tauw,u):
+        """
+        Residual of the pipe equations reduced to the wall stress for a given U,
+        f(Re(tauw),tauw) - 2 tauw/(rho U^2) with Re = rho D U/viscosity(gammadotw(tauw)).
+        """
+        tauw = np.exp(log_tauw)
+        gammadotw = viscosity.invert_stress(self._viscosity,tauw)
+        re = self.__rho*self.__d*u/self._viscosity(gammadotw)
+        return self._friction(re,tauw) - 2.*tauw/(self.__rho*u**2)
+
+    def _residual_dp(self,log_re,tauw,gammadotw):
+        """
+        Residual of the pipe equations reduced to Re for a given wall stress,
+        log(f(Re,tauw) Re^2) - log(2 tauw rho D^2/viscosity(gammadotw)^2), which follows from
+        f = 2 tauw/(rho U^2) with U = Re viscosity/(rho D).
+        """
+        re = np.exp(log_re)
+        return np.log(self._friction(re,tauw)*re**2) - \
+            np.log(2.*tauw*self.__rho*self.__d**2/self._viscosity(gammadotw)**2)
+
+    def __solve_log(self,fun,x0,args,predicted=None):
+        """
+        Brackets and solves fun(log(x),*args) = 0 for x starting from the estimate x0 and
+        records solve_info.  A continuation prediction is tried first with a bracket of a few
+        percent.  Returns the root, or None if no bracket is found.
+        """
+        residual = lambda x: fun(np.log(x),*args)
+        found = None
+        calls = 0
+        if predicted is not None:
+            found = roots.bracket(residual,predicted,factor=1.01,maxiter=3)
+            # A failed search evaluates 2 points plus 2 per expansion
+            calls = 0 if found is not None else 8
+        if found is None:
+            found = roots.bracket(residual,x0)
+        if found is None:
+            self.__set_info('brentq',False,0,calls,'no sign change found around '+str(x0))
+            return None
+        lo, hi, more = found
+        calls += more
+        start = instrument.start()
+        x, r = spo.brentq(fun,np.log(lo),np.log(hi),args=args,xtol=1.e-14,full_output=True,disp=False)
+        instrument.count('brentq',iterations=r.iterations,evaluations=r.function_calls,since=start)
+        self.__set_info('brentq',r.converged,r.iterations,calls+r.function_calls,r.flag)
+        return np.exp(x)
+
+    def __pipe_u_bracketed(self):
+        """
+        Solves the U driven problem as one equation in log(tauw), starting from the laminar
+        estimate tauw = stress at the apparent wall shear rate 8U/D.
+        """
+        gammadot_a = 8.*self.__u/self.__d
+        tau_guess = self._viscosity(gammadot_a)*gammadot_a
+        predicted = self.__predict(u=self.__u)
+        tauw = self.__solve_log(self._residual_u,tau_guess,(self.__u,),predicted and predicted[0])
+        if tauw is None or not self.__solve_info['converged']:
+            return self.__fail()
+        self.__gammadotw = viscosity.invert_stress(self._viscosity,tauw)
+        self.__tauw = tauw
+        self.__pressure_drop = 4.*self.__l/self.__d*tauw
+        self.__re = self.__rho*self.__d*self.__u/self._viscosity(self.__gammadotw)
+        self.__f = self._friction(self.__re,self.__tauw)
         return
 
+    def __set_info(self,method,converged,iterations,function_calls,message):
+        self.__solve_info = {'method':method,'converged':bool(converged),'iterations':iterations, \
+                           'function_calls':function_calls,'message':message}
+        if not converged:
+            warnings.warn(self.name+': '+method+' did not converge: '+str(message),RuntimeWarning,stacklevel=4)
+
+    @instrument.operation
     def __pipe_dp(self):
         """
         """
         # Compute wall stress tauw
         tauw_calc = self.__d/4.*self.__dp_target/self.__l
         # Compute wall shear rate gammadot
-        gammadot_calc = spo.brentq(lambda x: x-tauw_calc/self._viscosity(x),0.,1.e+9)
+        gammadot_calc = viscosity.invert_stress(self._viscosity,tauw_calc)
         # u guess - needs to be good for high re
         u_guess=self.__d/8.*gammadot_calc
         # re guess - needs to be good for high re
         re_guess = self.__rho*self.__d*u_guess/self._viscosity(gammadot_calc)
-        if (re_guess<2000.):
-            guess = [re_guess,u_guess]
-        elif (re_guess < 5000.):
-            guess = [re_guess*.1,u_guess*.01]
-        else:
-            guess = [re_guess*.1,u_guess*.01]
-        ans = spo.fsolve( lambda p: self._equations_dp(self.__dp_target,tauw_calc,gammadot_calc,p), \
-                        guess,maxfev=100000)
+        predicted = self.__predict(pressure_drop=self.__dp_target)
+        self.__pressure_drop = self.__dp_target
+        ans = None
+        if self.__solver == 'fsolve':
+            if (re_guess<2000.):
+                guess = [re_guess,u_guess]
+            elif (re_guess < 5000.):
+                guess = [re_guess*.1,u_guess*.01]
+            else:
+                guess = [re_guess*.1,u_guess*.01]
+            guesses = [guess] if predicted is None else [[predicted[1],predicted[4]],guess]
+            ans = self.__fsolve(lambda p: self._equations_dp(self.__dp_target,tauw_calc,gammadot_calc,p), \
+                            lambda p: self._jacobian_dp(self.__dp_target,tauw_calc,gammadot_calc,p), \
+                            guesses,maxfev=100000)
+        if ans is None:
+            # Bracketed solver, or fallback when fsolve did not converge
+            re = self.__solve_log(self._residual_dp,re_guess,(tauw_calc,gammadot_calc),predicted and predicted[1])
+            if re is None or not self.__solve_info['converged']:
+                self.__fail()
+                return self.__remember()
+            ans = [re,re*self._viscosity(gammadot_calc)/(self.__rho*self.__d)]
 
         #self.pressure_drop = self.__dp_target
         #self.__pressure_drop = self.dp_target
-        self.u = ans[1]
-        #self.__u = self.u
+        self.__u = ans[1]
         self.__re=ans[0]
-        self.tauw=tauw_calc
-        self.gammadotw = gammadot_calc
-        self.__f = self._friction(self.__re,self.tauw)
+        self.__tauw=tauw_calc
+        self.__gammadotw = gammadot_calc
+        self.__f = self._friction(self.__re,self.__tauw)
         self.__pressure_drop = self.__dp_target
         #print(self)
-        return
+        return self.__remember()
     
 
     @property
     def pressure_drop(self):
+        self.__refresh()
         return self.__pressure_drop
 
     @pressure_drop.setter
     def pressure_drop(self,pressure_drop):
         self.__dp_target = pressure_drop
-        self.__pipe_dp()
+        self.__driver = 'pressure_drop'
+        self.__changed()
+
+    @property
+    def dp(self):
+        return self.pressure_drop
 
     @property
     def u(self):
+        self.__refresh()
         return self.__u 
     
     @u.setter
     def u(self,u):
         self.__u = u
-        self.__pipe_u()
+        self.__driver = 'u'
+        self.__changed()
+
+    @property
+    def tauw(self):
+        self.__refresh()
+        return self.__tauw
+
+    @property
+    def gammadotw(self):
+        self.__refresh()
+        return self.__gammadotw
+
+    @property
+    def solve_info(self):
+        self.__refresh()
+        return self.__solve_info
+
+    @property
+    def friction_model(self):
+        return self.__friction_model
+
+    @friction_model.setter
+    def friction_model(self,friction_model):
+        if friction_model not in self._friction_models:
+            raise ValueError('friction_model must be one of '+', '.join(self._friction_models))
+        self.__friction_model = friction_model
+        self.__previous = None
+        self._friction = getattr(self,self._friction_models[friction_model])
+        if self.__lazy:
+            self.__dirty = self.__driver is not None
+        elif self.__u is not None:
+            self.__pipe_u()
+
+    @property
+    def solver(self):
+        return self.__solver
+
+    @solver.setter
+    def solver(self,solver):
+        if solver not in self._solvers:
+            raise ValueError('solver must be one of '+', '.join(self._solvers))
+        self.__solver = solver
 
     @property
     def f(self):
+        self.__refresh()
         return self.__f
 
     @property
     def re(self):
+        self.__refresh()
         return self.__re
 
     # Decide later whether diameter and length are mutable
@@ -199,7 +751,11 @@ class friction_factor:
     @d.setter
     def d(self,d):
         self.__d = d
-        self.__pipe_u()
+        self.__previous = None
+        if self.__lazy:
+            self.__dirty = True
+        else:
+            self.__pipe_u()
 
     @property
     def l(self):
@@ -208,16 +764,24 @@ class friction_factor:
     @l.setter
     def l(self,l):
         self.__l = l
-        self.__pipe_u()
+        self.__previous = None
+        if self.__lazy:
+            self.__dirty = True
+        else:
+            self.__pipe_u()
 
     @property
-    def rho(self,rho):
+    def rho(self):
         return self.__rho
 
     @rho.setter
     def rho(self,rho):
         self.__rho = rho
-        self.__pipe_u()
+        self.__previous = None
+        if self.__lazy:
+            self.__dirty = True
+        else:
+            self.__pipe_u()
 
 
 
@@ -0,0 +1,129 @@
+import collections
+import contextlib
+import functools
+import time
+
+# Recorders currently collecting, and the stack of operations being executed
+_recorders = []
+_operations = []
+
+
+class recorder:
+    """
+    Counters collected by record().  Every event is attributed to the innermost instrumented
+    operation running when it happened (or to '-' outside any operation) and has calls,
+    iterations, evaluations and seconds:
+        calc_visc    viscosity model calls; evaluations counts shear rates
+        brentq       scalar root solves; iterations as reported by brentq
+        fsolve       system solves; evaluations counts residual evaluations
+        newton       vectorized newton_bracketed solves; evaluations counts points
+        quadrature   Gauss-Legendre integrations; evaluations counts nodes
+        master_curve flow function table extensions; evaluations counts new nodes
+        total        the operation itself, seconds including everything it called
+    """
+    _fields = ('calls','iterations','evaluations','seconds')
+
+    def __init__(self):
+        self.counts = collections.defaultdict(lambda: dict.fromkeys(self._fields,0))
+
+    def add(self,operation,event,calls=1,iterations=0,evaluations=0,seconds=0.):
+        counter = self.counts[(operation,event)]
+        counter['calls'] += calls
+        counter['iterations'] += iterations
+        counter['evaluations'] += evaluations
+        counter['seconds'] += seconds
+
+    def report(self):
+        """
+        List of dicts with operation, event, calls, iterations, evaluations and seconds,
+        sorted by operation and event.
+        """
+        return [dict(operation=operation,event=event,**counter)
+                for (operation,event),counter in sorted(self.counts.items())]
+
+    def __str__(self):
+        lines = ['%-52s %-12s %8s %10s %12s %10s' % (('operation','event')+self._fields)]
+        for row in self.report():
+            lines.append('%-52s %-12s %8d %10d %12d %10.4f' % tuple(row[k] for k in ('operation','event')+self._fields))
+        return '\n'.join(lines)
+
+
+@contextlib.contextmanager
+def record():
+    """
+    Collects solver counters for the code run inside the with block.
+
+        with instrument.record() as counters:
+            pipe.laminar(viscosity=viscosity.carreau(),q=1.e-4)
+        print(counters)
+
+    Outside record() the instrumented functions only pay for one empty list check.
+    """
+    counters = recorder()
+    _recorders.append(counters)
+    try:
+        yield counters
+    finally:
+        _recorders.remove(counters)
+
+
+def start():
+    """
+    Start time for count(since=...), or None when nothing is recorded.
+    """
+    return time.perf_counter() if _recorders else None
+
+
+def count(event,calls=1,iterations=0,evaluations=0,seconds=0.,since=None):
+    """
+    Adds an event to every active recorder, attributed to the current operation.
+    """
+    if not _recorders:
+        return
+    if since is not None:
+        seconds += time.perf_counter() - since
+    operation = _operations[-1] if _operations else '-'
+    for counters in _recorders:
+        counters.add(operation,event,calls,iterations,evaluations,seconds)
+
+
+def counted(event,points=None):
+    """
+    Decorator counting the calls and time of a function as event.  When points is given,
+    the size of positional argument points is added to evaluations.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args,**kwargs):
+            if not _recorders:
+                return func(*args,**kwargs)
+            t = time.perf_counter()
+            try:
+                return func(*args,**kwargs)
+            finally:
+                size = getattr(args[points],'size',1) if points is not None and len(args) > points else 0
+                count(event,evaluations=size,since=t)
+        return wrapper
+    return decorate
+
+
+def operation(func):
+    """
+    Decorator marking a public operation (named module.qualified name, such as
+    pipe.laminar.q) that the events inside it are attributed to.
+    """
+    name = func.__module__.rpartition('.')[2]+'.'+func.__qualname__
+    @functools.wraps(func)
+    def wrapper(*args,**kwargs):
+        if not _recorders:
+            return func(*args,**kwargs)
+        _operations.append(name)
+        t = time.perf_counter()
+        try:
+            return func(*args,**kwargs)
+        finally:
+            _operations.pop()
+            seconds = time.perf_counter() - t
+            for counters in _recorders:
+                counters.add(name,'total',seconds=seconds)
+    return wrapper
@@ -0,0 +1,234 @@
+import warnings
+import numpy as np
+import scipy.sparse as sps
+import scipy.sparse.linalg as spsl
+
+from . import pipe, cache, friction_factor_property, instrument
+
+
+class network:
+    """
+    Network of pipe segments joined at nodes, with branches and loops.
+    Nodes have either a fixed pressure or a net external inflow (negative for an outlet);
+    at least one node needs a fixed pressure.  Segments are laminar tubes (rheoflow.pipe) or
+    Dodge-Metzner friction factor pipes (rheoflow.friction_factor_property), and flow from
+    start to end is counted positive.
+
+    solve() finds the free nodal pressures by Newton iterations on the flow balance at every
+    node.  The Jacobian A diag(dQ/ddp) A^T is sparse (A is the node-segment incidence matrix)
+    and each iteration evaluates Q(dp) and dQ/ddp for all segments of one fluid in a single
+    vectorized call, so networks of thousands of segments solve in a few iterations.
+
+        net = network()
+        net.add_node('in',pressure=2.e5)
+        net.add_node('out',pressure=0.)
+        net.add_pipe('p1','in','out',diameter=.05,length=100.,viscosity=viscosity.power_law(k=1.,n=.5))
+        net.solve()
+        net.flows['p1']
+    """
+    _kinds = ('laminar','friction_factor')
+
+    def __init__(self,name='Default'):
+        self.name=name
+        self.__nodes = {}
+        self.__fixed = []
+        self.__inflow = []
+        self.__pipes = {}
+        self.__segments = []
+        self.__pressure = None
+        self.__q = None
+        self.__solve_info = None
+
+    def __str__(self):
+        return str('Name ='+self.name+'\n'+
+                   'Nodes ='+str(len(self.__nodes))+'\n'+
+                   'Segments ='+str(len(self.__segments)))
+
+    def add_node(self,name,pressure=None,inflow=0.):
+        """
+        Adds node name with fixed pressure (Pa), or with net external inflow (m^3/s) if pressure
+        is None.
+        """
+        if name in self.__nodes:
+            raise ValueError('Node '+str(name)+' already exists')
+        self.__nodes[name] = len(self.__fixed)
+        self.__fixed.append(np.nan if pressure is None else float(pressure))
+        self.__inflow.append(float(inflow))
+        self.__changed()
+
+    def add_pipe(self,name,start,end,diameter,length,viscosity,kind='laminar',density=1000.,friction_model='dm'):
+        """
+        Adds segment name from node start to node end.  viscosity is a rheoflow.viscosity model;
+        kind is 'laminar' or 'friction_factor', friction_model applies to the latter.
+        """
+        if name in self.__pipes:
+            raise ValueError('Segment '+str(name)+' already exists')
+        if kind not in self._kinds:
+            raise ValueError('kind must be one of '+', '.join(self._kinds))
+        for node in (start,end):
+            if node not in self.__nodes:
+                raise KeyError('Unknown node '+str(node))
+        if start == end:
+            raise ValueError('Segment '+str(name)+' starts and ends at the same node')
+        self.__pipes[name] = len(self.__segments)
+        self.__segments.append({'start':self.__nodes[start],'end':self.__nodes[end],'diameter':float(diameter),
+                                'length':float(length),'viscosity':viscosity,'kind':kind,
+                                'density':float(density),'friction_model':friction_model})
+        self.__changed()
+
+    def __changed(self):
+        self.__pressure = None
+        self.__q = None
+        self.__solve_info = None
+
+    def __groups(self):
+        """
+        Segments grouped by kind, fluid, density and friction model, so each group is solved in
+        one vectorized call.  Returns a list of (segment, indices, diameter, length, density).
+        """
+        groups = {}
+        for i,s in enumerate(self.__segments):
+            key = (s['kind'],cache.fluid_key(s['viscosity']),s['density'],s['friction_model'])
+            groups.setdefault(key,(s,[]))[1].append(i)
+        result = []
+        for s,indices in groups.values():
+            indices = np.array(indices)
+            d = np.array([self.__segments[i]['diameter'] for i in indices])
+            l = np.array([self.__segments[i]['length'] for i in indices])
+            result.append((s,indices,d,l,s['density']))
+        return result
+
+    def segment_flow(self,dp,groups=None):
+        """
+        Flow rate Q (m^3/s) of every segment and its derivative dQ/ddp for pressure drops dp
+        (start minus end, one per segment, in the order the segments were added).
+        """
+        if groups is None:
+            groups = self.__groups()
+        dp = np.asarray(dp,dtype=float)
+        # Evaluate at |dp| with a small floor so the derivative stays finite at zero flow
+        dp_abs = np.maximum(np.abs(dp),1.e-9)
+        q = np.empty(len(dp))
+        dq = np.empty(len(dp))
+        for s,indices,d,l,rho in groups:
+            dpi = dp_abs[indices]
+            if s['kind'] == 'laminar':
+                r = d/2.
+                result = pipe.solve_laminar(s['viscosity'],r,l,pressure_drop=dpi,density=rho)
+                q[indices] = result['q']
+                dq[indices] = (np.pi*r**3*result['shear_rate_wall'] - 3.*result['q'])/dpi
+            else:
+                result = friction_factor_property.solve_pressure_drop(s['viscosity'],rho,d,l,dpi,s['friction_model'])
+                area = np.pi*d**2/4.
+                q[indices] = area*result['u']
+                dq[indices] = area*result['du_ddp']
+        return np.sign(dp)*q, dq
+
+    @instrument.operation
+    def solve(self,rtol=1.e-10,maxiter=50):
+        """
+        Solves for the free nodal pressures and the segment flows.  Iterates until the flow
+        imbalance at every free node is below rtol times the largest flow in the network.
+        Returns the pressures; solve_info reports method, converged, iterations,
+        function_calls and message, and a failed solve issues a RuntimeWarning.
+        """
+        fixed = np.array(self.__fixed)
+        inflow = np.array(self.__inflow)
+        if not np.isfinite(fixed).any():
+            raise ValueError('At least one node needs a fixed pressure')
+        n_seg = len(self.__segments)
+        start = np.array([s['start'] for s in self.__segments],dtype=int)
+        end = np.array([s['end'] for s in self.__segments],dtype=int)
+        free = ~np.isfinite(fixed)
+        # Incidence matrix: +1 where a segment ends (flows in), -1 where it starts
+        a = sps.csr_matrix((np.r_[-np.ones(n_seg),np.ones(n_seg)],(np.r_[start,end],np.r_[np.arange(n_seg),np.arange(n_seg)])),
+                           shape=(len(fixed),n_seg))
+        a_free = a[free]
+        groups = self.__groups()
+        p = np.where(free,0.,fixed)
+
+        def balance(p):
+            dp = p[start] - p[end]
+            q, dq = self.segment_flow(dp,groups)
+            return a_free@q + inflow[free], q, dq
+
+        def newton_step(dq,rhs):
+            g = sps.diags(np.maximum(dq,1.e-12*max(dq.max(),1.e-300)))
+            laplacian = (a_free@g@a_free.T).tocsc()
+            return spsl.spsolve(laplacian,rhs) if laplacian.shape[0] > 1 else rhs/laplacian.toarray()[0]
+
+        # Initial guess from a linear network with the conductances at a reference pressure drop
+        dp_ref = np.ptp(fixed[~free]) if (~free).sum() > 1 else 0.
+        dp_ref = dp_ref if dp_ref > 0. else 1.e3
+        q_ref = self.segment_flow(np.full(n_seg,dp_ref),groups)[0]
+        calls = 1
+        if free.any():
+            g_ref = np.maximum(q_ref/dp_ref,1.e-12*max((q_ref/dp_ref).max(),1.e-300))
+            laplacian = a@sps.diags(g_ref)@a.T
+            rhs = inflow[free] - laplacian[free][:,~free]@fixed[~free]
+            p[free] = newton_step(g_ref,rhs)
+        f, q, dq = balance(p)
+        calls += 1
+        converged = False
+        message = 'maximum number of iterations reached'
+        for iteration in range(maxiter+1):
+            scale = max(np.abs(q).max(initial=0.),np.abs(inflow).max(initial=0.),1.e-300)
+            if not free.any() or np.abs(f).max() <= rtol*scale:
+                converged = True
+                message = 'flow balance satisfied'
+                break
+            if iteration == maxiter:
+                break
+            # A diag(dQ/ddp) A^T delta = F for the Newton correction of the free pressures
+            delta = newton_step(dq,f)
+            norm = np.linalg.norm(f)
+            step = 1.
+            for i in range(30):
+                trial = p.copy()
+                trial[free] += step*delta
+                f_trial, q_trial, dq_trial = balance(trial)
+                calls += 1
+                if np.linalg.norm(f_trial) < (1.-1.e-4*step)*norm:
+                    break
+                step /= 2.
+            p, f, q, dq = trial, f_trial, q_trial, dq_trial
+        self.__pressure = p
+        self.__q = q
+        self.__solve_info = {'method':'newton','converged':converged,'iterations':iteration,
+                             'function_calls':calls,'message':message}
+        if not converged:
+            warnings.warn(self.name+': newton did not converge: '+message,RuntimeWarning,stacklevel=2)
+        return self.pressures
+
+    @property
+    def pressures(self):
+        """Nodal pressures (Pa) by node name."""
+        if self.__pressure is None:
+            self.solve()
+        return dict(zip(self.__nodes,self.__pressure))
+
+    @property
+    def flows(self):
+        """Segment flow rates (m^3/s, positive from start to end) by segment name."""
+        if self.__q is None:
+            self.solve()
+        return dict(zip(self.__pipes,self.__q))
+
+    @property
+    def pressure_drops(self):
+        """Segment pressure drops (Pa, start minus end) by segment name."""
+        p = self.pressures
+        nodes = list(self.__nodes)
+        return {name:p[nodes[s['start']]]-p[nodes[s['end']]] for name,s in zip(self.__pipes,self.__segments)}
+
+    @property
+    def solve_info(self):
+        return self.__solve_info
+
+    @property
+    def nodes(self):
+        return list(self.__nodes)
+
+    @property
+    def pipes(self):
+        return list(self.__pipes)
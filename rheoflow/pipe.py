@@ -1,37 +1,222 @@
 import numpy as np
-import scipy.optimize as spo
-import scipy.integrate as spi
-from scipy.integrate import odeint
-import matplotlib.pyplot as plt
 
-from . import viscosity
+from . import viscosity, profile, cache, roots, instrument
+from .viscosity import invert_stress, hb_parameters
+
+
+def _hb_q(hb,radius,length,dp):
+    """
+    Closed-form flow rate of a Herschel-Bulkley fluid hb = (tauy, k, n) in a tube for pressure
+    drops dp (scalar or array), Buckingham-Reiner for n=1.  With a = r_y/R = 2*tauy*length/(dp*R)
+    Q = pi*n/(3n+1)*(dp/(2*k*length))**(1/n)*R**(1/n+3)*(1-a)**((n+1)/n)*(1+2n/(2n+1)*a*(1+n/(n+1)*a)),
+    which is 0 for a >= 1.
+    """
+    tauy, k, n = hb
+    R=radius
+    dp_dx=np.maximum(np.asarray(dp,dtype=float),0.)/length
+    with np.errstate(divide='ignore',invalid='ignore'):
+        a=np.where(dp_dx>0.,np.minimum(2*tauy/(dp_dx*R),1.),1.)
+    return np.pi*n/(3*n+1)*(dp_dx/2/k)**(1/n)*R**(1/n+3)*(1-a)**((n+1)/n)*(1+2*n/(2*n+1)*a*(1+n/(n+1)*a))
+
+def _hb_dp(hb,radius,length,q,near=None,rtol=1.e-13,maxiter=100):
+    """
+    Pressure drops for flow rates q (scalar or array) of a Herschel-Bulkley fluid hb = (tauy, k, n)
+    in a tube, all solved together by Newton iterations on ln(Q(dp)/q) in the variable
+    u = ln(dp - dp_y) above the yield pressure drop dp_y = 2*tauy*length/R, with
+    dQ/ddp = (pi*R**3*rate_wall - 3*Q)/dp.
+    ln(Q) is close to linear and convex in u (Q has a zero of order (n+1)/n at dp_y), so
+    iterations started from an upper bound converge monotonically in a few steps.  q <= 0 gives 0.
+    near = (q0, dp0), a solution close to q such as the previous point of a sweep, starts the
+    iterations from the log-log tangent of Q(dp) at dp0 instead (continuation); the upper bound
+    is used when that prediction is not above dp_y.
+    """
+    start = instrument.start()
+    tauy, k, n = hb
+    q = np.asarray(q,dtype=float)
+    R=radius
+    dp_yield = 2.*tauy*length/R
+    q_want = np.where(q>0.,q,1.)
+    u = None
+    if near is not None:
+        q0, dp0 = near
+        rate0 = (max(dp0/length*R/2.-tauy,0.)/k)**(1/n)
+        with np.errstate(divide='ignore',invalid='ignore',over='ignore'):
+            # dln(Q)/dln(dp) = pi*R**3*rate_wall/Q - 3
+            u = np.log(dp0*(q_want/q0)**(1./(np.pi*R**3*rate0/q0-3.)) - dp_yield)
+        if not np.all(np.isfinite(u)):
+            u = None
+    if u is None:
+        # Upper bound: yield pressure drop plus power law pressure drop, doubled until Q(hi) >= q
+        hi = dp_yield + 2*k*length*(q_want*(3*n+1)/(np.pi*n*R**(1/n+3)))**n
+        hi = roots.expand_bracket(lambda dp: _hb_q(hb,R,length,dp) - q_want,dp_yield,hi,factor=2.,maxiter=200)[1]
+        u = np.log(hi-dp_yield)
+    for i in range(maxiter):
+        dp = dp_yield + np.exp(u)
+        q_dp = _hb_q(hb,R,length,dp)
+        rate_wall = (np.maximum(dp/length*R/2.-tauy,0.)/k)**(1/n)
+        step = np.log(q_dp/q_want)/(np.exp(u)*(np.pi*R**3*rate_wall/q_dp-3.)/dp)
+        u = u - np.where(np.isfinite(step),step,0.)
+        if np.all(np.abs(step)*np.exp(u) <= rtol*dp):
+            break
+    instrument.count('newton',iterations=i+1,evaluations=q.size,since=start)
+    return np.where(q>0.,dp_yield + np.exp(u),0.)
+
+def _hb_vz(hb,radius,length,rad,dp):
+    """
+    Closed-form velocity of a Herschel-Bulkley fluid hb = (tauy, k, n) at radial positions rad,
+    uniform inside the unyielded core r <= r_y = 2*tauy*length/dp and zero everywhere when the
+    core fills the tube.
+    """
+    tauy, k, n = hb
+    dp_dx=np.asarray(dp,dtype=float)/length
+    with np.errstate(divide='ignore'):
+        r_y=2*tauy/dp_dx
+    shell = np.maximum(radius-r_y,0.)
+    plug = np.minimum(np.maximum(np.asarray(rad,dtype=float)-r_y,0.),shell)
+    return (1/(2*k)*dp_dx)**(1/n)*(n/(n+1))*(shell**((n+1)/n)-plug**((n+1)/n))
+
+
+@instrument.operation
+def solve_laminar(visc,radius,length,q=None,pressure_drop=None,density=1000.):
+    """
+    Solves laminar tube flow for many operating points in one call.
+    Give exactly one of q or pressure_drop.  radius, length, density and q or pressure_drop
+    may be scalars or arrays and are broadcast together; visc is a single viscosity model (or a
+    function of shear rate, such as a bound calc_visc, as for laminar) shared by every point,
+    so all points are read from one master curve of the flow function Phi(tauw), which is kept
+    for later calls (see rheoflow.cache).  Herschel-Bulkley type fluids (see
+    viscosity.hb_parameters) use the closed-form solution instead.
+    Returns a structured array of the broadcast shape with fields pressure_drop, q,
+    stress_wall, shear_rate_wall, viscosity_wall and re_wall.
+    """
+    if (q is None) == (pressure_drop is None):
+        raise ValueError('Specify exactly one of q or pressure_drop')
+    if pressure_drop is not None:
+        pressure_drop, radius, length, density = np.broadcast_arrays(
+            *(np.asarray(x,dtype=float) for x in (pressure_drop,radius,length,density)))
+        tauw = pressure_drop*radius/(2.*length)
+        hb = hb_parameters(visc)
+        if hb is not None:
+            q = _hb_q(hb,radius,length,pressure_drop)
+        else:
+            q = np.pi*radius**3*cache.get_curve(visc,2).phi(tauw)
+    else:
+        q, radius, length, density = np.broadcast_arrays(
+            *(np.asarray(x,dtype=float) for x in (q,radius,length,density)))
+        hb = hb_parameters(visc)
+        if hb is not None:
+            pressure_drop = _hb_dp(hb,radius,length,q)
+            tauw = pressure_drop*radius/(2.*length)
+        else:
+            tauw = cache.get_curve(visc,2).tauw(q/(np.pi*radius**3))
+            pressure_drop = 2.*length*tauw/radius
+    rate = invert_stress(visc,tauw)
+    eta = getattr(visc,'calc_visc',visc)(rate)
+    result = np.empty(np.shape(q),dtype=[('pressure_drop',float),('q',float),('stress_wall',float),
+                                       ('shear_rate_wall',float),('viscosity_wall',float),('re_wall',float)])
+    result['pressure_drop'] = pressure_drop
+    result['q'] = q
+    result['stress_wall'] = tauw
+    result['shear_rate_wall'] = rate
+    result['viscosity_wall'] = eta
+    result['re_wall'] = density*2.*radius*q/(np.pi*radius**2)/eta
+    return result
+
 
 class laminar:
     """
     This class contains a variety of methods for computing quantities of interest for laminar flow in a tube.
     The argument viscosity requires a function (or class with method) calc_visc with parameters already set 
     and the shear rate as it's only argument.  Default values are provided.  A default visosity function is provided
+
+    With lazy=True setters only record the new value and the flow is solved when a result is
+    first read; the most recently set of q and pressure_drop is held fixed.  update() sets several
+    values and solves once in either mode, with the same rule.  Without lazy the radius and
+    length setters keep their original behaviour and recompute q from the pressure drop.
+
+    Newtonian, power law and herschel_bulkley (m_flag=0) fluids are solved with the closed-form
+    Herschel-Bulkley solution, all others with the numerical flow function engine;
+    solution_method reports 'analytical' or 'numerical' for the last solve.
+
+    Results of shear_rate are memoized per instance in an LRU cache of shear_rate_memo_size
+    entries, keyed on position, pressure drop, geometry and the fluid parameters (cache.fluid_key).
+
+    With continuation=True a flow rate driven solve of a Herschel-Bulkley type fluid starts from
+    the previous solution for the same fluid and geometry (see _hb_dp), which suits sweeps in
+    small steps.  It has no effect on the numerical flow function engine, which reads the wall
+    stress from the interpolated inverse of the cached master curve with no iterative solve to
+    warm start.
     """
+    shear_rate_memo_size = 256
+    _update_keys = ('radius','length','q','pressure_drop')
+
     def __init__(self,name='Default',density=1000.,radius=.01,length=1.,viscosity=viscosity.newtonian(name='default',mu=1.), \
-             scale=1.e+6,pressure_drop = None, q = None):
+             scale=1.e+6,pressure_drop = None, q = None, lazy=False, continuation=False):
         self.name=name
         self.__density = density
         self.__radius=radius
         self.__length=length
         self._viscosity = viscosity
-        self.__r = 0.
+        # scale no longer affects the solution and is kept for existing callers
         self.scale=scale
+        self.__lazy = lazy
+        self.__dirty = False
+        self.__driver = None
+        self.__q = None
+        self.__near = None
+        self.continuation = continuation
+        self.__solution_method = None
+        self.__shear_rate_memo = cache.lru_dict(maxsize=self.shear_rate_memo_size)
         if pressure_drop:
             self.pressure_drop = pressure_drop
         else:
             self.pressure_drop = None
         if q:
             self.q = q
-            self.__q = q
-        else:
-            self.__q = None
         
+    def __solve(self):
+        """
+        Solves for the quantity not held fixed, q or pressure_drop.
+        """
+        self.__dirty = False
+        if self.__driver == 'q':
+            self.__dp_calc()
+        elif self.__driver == 'pressure_drop':
+            self.__q = self.__q_calc(self.__pressure_drop)
+
+    def __refresh(self):
+        if self.__dirty:
+            self.__solve()
+
+    def __changed(self):
+        if self.__lazy:
+            self.__dirty = True
+        else:
+            self.__solve()
+
+    @instrument.operation
+    def update(self,**kwargs):
+        """
+        Sets any of q, pressure_drop, radius and length by keyword and solves the flow once.
+        """
+        if 'q' in kwargs and 'pressure_drop' in kwargs:
+            raise ValueError('Specify at most one of q or pressure_drop')
+        for key in kwargs:
+            if key not in self._update_keys:
+                raise TypeError('update() got an unexpected keyword argument '+repr(key))
+        lazy = self.__lazy
+        self.__lazy = True
+        try:
+            for key in self._update_keys:
+                if key in kwargs:
+                    setattr(self,key,kwargs[key])
+        finally:
+            self.__lazy = lazy
+        if not lazy:
+            self.__refresh()
+
     def __str__(self):
+        self.__refresh()
         return str('Name ='+self.name+'\n'+
             'Radius ='+str(self.__radius)+'\n'+
             'Length ='+str(self.__length)+'\n'+
@@ -39,29 +224,46 @@ class laminar:
             'Flow rate ='+str(self.__q)+'\n'+
             'Shear rate wall = '+str(self._shear_rate_wall()))
                    
-    def _shear_rate_equation(self,solve_rate,dp):
-        return solve_rate * self._viscosity.calc_visc(solve_rate) -  \
-            dp/self.__length*self.__r/2.
-
+    @instrument.operation
     def shear_rate(self,rad,dp):
         """
-        This method computes the shear rate at a radial position (rad) that is the only argument.
-        """
-        self.__r = rad
-        return spo.brentq(lambda x: self._shear_rate_equation(x,dp), 0.,1.e+6)
+        This method computes the shear rate at a radial position (rad) for pressure drop dp.
+        The local stress dp/length*rad/2 is inverted by the viscosity model, so rad may be an array.
+        """
+        try:
+            key = (np.shape(rad),np.asarray(rad,dtype=float).tobytes(),np.shape(dp),np.asarray(dp,dtype=float).tobytes(), \
+                self.__radius,self.__length,cache.fluid_key(self._viscosity))
+            rate = self.__shear_rate_memo.get(key)
+        except TypeError:
+            # Unhashable fluid parameters, no memo
+            key, rate = None, None
+        if rate is None:
+            rate = viscosity.invert_stress(self._viscosity,dp/self.__length*rad/2.)
+            if key is not None:
+                self.__shear_rate_memo[key] = rate
+        return np.copy(rate)[()]
     
+    @instrument.operation
     def vz(self,rad,dp):
         """
-        This method computes the axial velocity vz at a radial position, rad.
-        """
-        # (-) sign deals with vz<0 whehn pressuredrop>0
-        #return -spi.quad(self.shear_rate,self.__radius,rad)[0]
-        return -spi.quad(lambda x: self.shear_rate(x,dp),self.__radius,rad)[0]
+        This method computes the axial velocity vz at a radial position, rad (scalar or array).
+        The shear rate is integrated cumulatively from the wall on a Gauss-Legendre radial grid,
+        vz(r) = R/tauw*(I_0(tauw)-I_0(tau(r))), see profile.stress_moment.
+        Herschel-Bulkley type fluids (see viscosity.hb_parameters) use the closed form instead.
+        """
+        hb = hb_parameters(self._viscosity)
+        if hb is not None:
+            return _hb_vz(hb,self.__radius,self.__length,rad,dp)[()]
+        tauw = dp/self.__length*self.__radius/2.
+        tau = dp/self.__length*np.asarray(rad,dtype=float)/2.
+        i0 = profile.stress_moment(self._viscosity,np.append(tau.ravel(),tauw),0)
+        return (self.__radius/tauw*(i0[-1]-i0[:-1])).reshape(tau.shape)[()]
     
     def stress_wall(self):
         """
         Computes shear stress at wall, radial position radius.
         """
+        self.__refresh()
         if self.__pressure_drop:
             return self.__radius/2.*self.__pressure_drop/self.__length
         else:
@@ -71,6 +273,7 @@ class laminar:
         """
         Computes the true wall shear rate, or shear rate at radial position radius.
         """
+        self.__refresh()
         rad = self.__radius
         if self.__pressure_drop:
             dp = self.__pressure_drop
@@ -78,13 +281,21 @@ class laminar:
         else:
             return None
     
-    def shear_rate_plot(self):
+    def shear_rate_curve(self,npts=51):
+        """
+        Radial positions and shear rates (arrays of npts values) across the tube at the current
+        pressure drop, as drawn by shear_rate_plot.
+        """
+        self.__refresh()
+        x = np.linspace(0.,self.__radius,npts)
+        return x, self.shear_rate(x,self.__pressure_drop)
+
+    def shear_rate_plot(self,npts=51):
         """
         Creates plot of shear rate versus radial position.
         """
-        dp = self.__pressure_drop
-        x = np.linspace(0.,self.__radius,51)
-        y = [self.shear_rate(rad,dp) for rad in x]
+        import matplotlib.pyplot as plt
+        x, y = self.shear_rate_curve(npts)
         plt.plot(x,y)
         plt.xlabel('Radial position')
         plt.ylabel('Shear rate')
@@ -100,50 +311,82 @@ class laminar:
         """
         Computes Reynolds number at the wall.
         """
+        self.__refresh()
         return self.__density*self.__radius*2.*self.__q/(3.14159*self.__radius**2)/self.viscosity_wall()
         
-    def vz_plot(self):
+    @instrument.operation
+    def vz_curve(self,npts=51):
+        """
+        Radial positions and axial velocities (arrays of npts values) across the tube at the
+        current pressure drop, as drawn by vz_plot.
+        """
+        self.__refresh()
+        x = np.linspace(0.,self.__radius,npts)
+        return x, self.vz(x,self.__pressure_drop)
+
+    def vz_plot(self,npts=51):
         """
         Creates plot of axial velocity versus radial position.
         """
-        dp = self.__pressure_drop
-        x = np.linspace(0.,self.__radius,51)
-        y = [self.vz(rad,dp) for rad in x]
+        import matplotlib.pyplot as plt
+        x, y = self.vz_curve(npts)
         plt.plot(x,y)
         plt.xlabel('Radial position')
         plt.ylabel('Velocity')
     
-    def __q_integrand(self,rad,dp):
-        return 2.*3.141592653589*rad*self.vz(rad,dp)
-    
     def __q_calc(self,dp):
         """
-        Computes volumetric flow rate for preessure drop argument of dp_want.
-        The object attribute self.pressure_drop is set to dp_want.
-        """
-        #return spi.quad(self.__q_integrand(),0.,self.__radius)[0]
-        return spi.quad( lambda x: self.__q_integrand(x,dp),0.,self.__radius)[0]
-    
-    def __q_eqn(self,dp_v):
-        return self.__q_calc(dp_v) - self.__q
+        Computes volumetric flow rate for pressure drop dp (scalar or array) from the
+        Rabinowitsch-Mooney wall stress integral Q = pi*R**3/tauw**3 * I_2(tauw), read from
+        the master curve of the fluid shared through rheoflow.cache.
+        Herschel-Bulkley type fluids (see viscosity.hb_parameters) use the closed form instead.
+        """
+        hb = hb_parameters(self._viscosity)
+        if hb is not None:
+            self.__solution_method = 'analytical'
+            return _hb_q(hb,self.__radius,self.__length,dp)[()]
+        self.__solution_method = 'numerical'
+        tauw = np.asarray(dp,dtype=float)*self.__radius/(2.*self.__length)
+        return np.pi*self.__radius**3*cache.get_curve(self._viscosity,2).phi(tauw)
     
     def __dp_calc(self):
         """
         Computes the pressure drop for a volumetric flow rate of q_want.
-        The computation is iterative due to nature of many viscosity functiions.
+        The wall stress comes from inverse interpolation of the fluid master curve
+        followed by one Newton refinement step, or from _hb_dp for Herschel-Bulkley type fluids.
         The object attribute self.pressure_drop is set to result.
         """
-        self.__pressure_drop= spo.brentq(self.__q_eqn,self.scale_min,self.scale_max)
+        hb = hb_parameters(self._viscosity)
+        if hb is not None:
+            self.__solution_method = 'analytical'
+            # Continuation from the previous solution for the same fluid and geometry
+            key = (hb,self.__radius,self.__length)
+            near = self.__near[1] if self.continuation and self.__near and self.__near[0] == key else None
+            self.__pressure_drop = _hb_dp(hb,self.__radius,self.__length,self.__q,near)[()]
+            self.__near = (key,(self.__q,self.__pressure_drop))
+            return
+        self.__solution_method = 'numerical'
+        tauw = cache.get_curve(self._viscosity,2).tauw(self.__q/(np.pi*self.__radius**3))
+        self.__pressure_drop = 2.*self.__length*tauw/self.__radius
         return
     
-    def q_plot(self,pressure_drop_min,pressure_drop_max):
+    @instrument.operation
+    def q_curve(self,pressure_drop_min,pressure_drop_max,npts=51):
+        """
+        Pressure drops evenly spaced on a log axis between pressure_drop_min and pressure_drop_max
+        and their flow rates (arrays of npts values), as drawn by q_plot.
+        """
+        x = np.logspace(np.log10(pressure_drop_min),np.log10(pressure_drop_max),npts)
+        return x, self.__q_calc(x)
+
+    def q_plot(self,pressure_drop_min,pressure_drop_max,npts=51):
         """
         Creates log-log plot of pressure drop versus flow rate.
-        A log-spacing of pressure drops between args pressure_drop_min and pressure_drop_max
-        are created.
+        A log-spacing of npts pressure drops between args pressure_drop_min and pressure_drop_max
+        are created, see q_curve.
         """
-        x = np.logspace(np.log10(pressure_drop_min),np.log10(pressure_drop_max),51)
-        y = [self.__q_calc(dp) for dp in x]
+        import matplotlib.pyplot as plt
+        x, y = self.q_curve(pressure_drop_min,pressure_drop_max,npts)
         plt.loglog(y,x,'-')
         plt.xlabel('Flow rate')
         plt.ylabel('Pressure drop')
@@ -151,33 +394,39 @@ class laminar:
 
     @property
     def pressure_drop(self):
+        self.__refresh()
         return self.__pressure_drop
 
     @pressure_drop.setter
+    @instrument.operation
     def pressure_drop(self,pressure_drop):
         if pressure_drop:
             self.__pressure_drop = pressure_drop
-            self.__q = self.__q_calc(pressure_drop)
+            self.__driver = 'pressure_drop'
+            self.__changed()
         else:
             self.__pressure_drop = None
 
     @property
     def q(self):
+        self.__refresh()
         return self.__q
 
     @q.setter
+    @instrument.operation
     def q(self,q):
         if q:
             self.__q = q
-            # Estimate dp_a to set scale to reasonalble value
-            dp_a = 8.*self._viscosity.calc_visc(4.*self.__q/(3.14158*self.__radius**3))* \
-                self.__length*self.__q/(3.14159*self.__radius**4)
-            self.scale_max=2.*dp_a
-            self.scale_min=dp_a/100.
-            self.__dp_calc()
+            self.__driver = 'q'
+            self.__changed()
         else:
             self.__q = None
 
+    @property
+    def solution_method(self):
+        self.__refresh()
+        return self.__solution_method
+
     @property
     def density(self):
         return self.__density
@@ -197,7 +446,10 @@ class laminar:
     @radius.setter
     def radius(self,radius):
         self.__radius = radius
-        if self.__pressure_drop:
+        self.__shear_rate_memo.clear()
+        if self.__lazy:
+            self.__dirty = True
+        elif self.__pressure_drop:
             self.__q = self.__q_calc(self.__pressure_drop)
         else:
             self.__pressure_drop = None
@@ -209,7 +461,10 @@ class laminar:
     @length.setter
     def length(self,length):
         self.__length = length
-        if self.__pressure_drop:
+        self.__shear_rate_memo.clear()
+        if self.__lazy:
+            self.__dirty = True
+        elif self.__pressure_drop:
             self.__q = self.__q_calc(self.__pressure_drop)
         else:
             self.__pressure_drop = None
@@ -233,27 +488,75 @@ class laminar:
 class laminar_HB_analytical:
     """
     This class contains analytical solution for pipe flow of Herschel-Bulkley fluids
+    lazy, continuation and update() work as in laminar.
     """
+    _update_keys = ('radius','length','q','pressure_drop')
+
     def __init__(self,name='Default',density=1000.,radius=.01,length=1.,viscosity=viscosity.herschel_bulkley(name='default',tauy=1.,k=1.,n=1.), \
-             scale=1.e+6,pressure_drop = None, q = None):
+             scale=1.e+6,pressure_drop = None, q = None, lazy=False, continuation=False):
         self.name=name
         self.__density = density
         self.__radius=radius
         self.__length=length
         self._viscosity = viscosity
-        self.__r = 0.
+        # scale no longer affects the solution and is kept for existing callers
         self.scale=scale
+        self.__lazy = lazy
+        self.__dirty = False
+        self.__driver = None
+        self.__q = None
+        self.__near = None
+        self.continuation = continuation
         if pressure_drop:
             self.pressure_drop = pressure_drop
         else:
             self.pressure_drop = None
         if q:
             self.q = q
-            self.__q = q
-        else:
-            self.__q = None
         
+    def __solve(self):
+        """
+        Solves for the quantity not held fixed, q or pressure_drop.
+        """
+        self.__dirty = False
+        if self.__driver == 'q':
+            self.__dp_calc()
+        elif self.__driver == 'pressure_drop':
+            self.__q = self.__q_calc(self.__pressure_drop)
+
+    def __refresh(self):
+        if self.__dirty:
+            self.__solve()
+
+    def __changed(self):
+        if self.__lazy:
+            self.__dirty = True
+        else:
+            self.__solve()
+
+    @instrument.operation
+    def update(self,**kwargs):
+        """
+        Sets any of q, pressure_drop, radius and length by keyword and solves the flow once.
+        """
+        if 'q' in kwargs and 'pressure_drop' in kwargs:
+            raise ValueError('Specify at most one of q or pressure_drop')
+        for key in kwargs:
+            if key not in self._update_keys:
+                raise TypeError('update() got an unexpected keyword argument '+repr(key))
+        lazy = self.__lazy
+        self.__lazy = True
+        try:
+            for key in self._update_keys:
+                if key in kwargs:
+                    setattr(self,key,kwargs[key])
+        finally:
+            self.__lazy = lazy
+        if not lazy:
+            self.__refresh()
+
     def __str__(self):
+        self.__refresh()
         return str('Name ='+self.name+'\n'+
             'Radius ='+str(self.__radius)+'\n'+
             'Length ='+str(self.__length)+'\n'+
@@ -261,38 +564,37 @@ class laminar_HB_analytical:
             'Flow rate ='+str(self.__q)+'\n'+
             'Shear rate wall = '+str(self._shear_rate_wall()))
                    
+    def __hb(self):
+        """
+        (tauy, k, n) of the fluid; a regularized herschel_bulkley is treated as ideal.
+        """
+        return hb_parameters(self._viscosity) or (self._viscosity.tauy,self._viscosity.k,self._viscosity.n)
+
+    @instrument.operation
     def shear_rate(self,rad,dp):
-        dp_dx=dp/self.__length
-        r_y=2*self._viscosity.tauy/dp_dx # radius of unyielded core
-        n=self._viscosity.n
-        k=self._viscosity.k
-        Vc = (1/(2*k)*dp_dx)**(1/n)*(n/(n+1))*(self.__radius-r_y)**((n+1)/n)
-        if rad<=r_y:
-            gammadot=0
-        else:
-            gammadot=Vc*(n+1)/n/(self.__radius-r_y)*((rad-r_y)/(self.__radius-r_y))**(1/n)
-        return gammadot 
+        """
+        Shear rate ((tau(r)-tauy)/k)**(1/n) at radial positions rad for pressure drop dp,
+        zero inside the unyielded core r <= r_y = 2*tauy*length/dp.  rad and dp may be arrays.
+        """
+        tauy, k, n = self.__hb()
+        tau = np.asarray(dp,dtype=float)/self.__length*np.asarray(rad,dtype=float)/2.
+        return (np.maximum(tau-tauy,0.)/k)**(1/n)
     
+    @instrument.operation
     def vz(self,rad,dp):
         """
         This method computes the axial velocity vz at a radial position, rad.
+        rad and dp may be arrays; the velocity is uniform inside the unyielded core r <= r_y
+        and zero everywhere when the core fills the pipe.
         """
-        dp_dx=dp/self.__length
-        r_y=2*self._viscosity.tauy/dp_dx
-        n=self._viscosity.n
-        k=self._viscosity.k
-        Vc = (1/(2*k)*dp_dx)**(1/n)*(n/(n+1))*(self.__radius-r_y)**((n+1)/n)
-        if rad<=r_y:
-            V=Vc
-        else:
-            V=Vc*(1-((rad-r_y)/(self.__radius-r_y))**((n+1)/n))
-        return V
+        return _hb_vz(self.__hb(),self.__radius,self.__length,rad,dp)
     
     
     def stress_wall(self):
         """
         Computes shear stress at wall, radial position radius.
         """
+        self.__refresh()
         if self.__pressure_drop:
             return self.__radius/2.*self.__pressure_drop/self.__length
         else:
@@ -302,6 +604,7 @@ class laminar_HB_analytical:
         """
         Computes the true wall shear rate, or shear rate at radial position radius.
         """
+        self.__refresh()
         rad = self.__radius
         if self.__pressure_drop:
             dp = self.__pressure_drop
@@ -309,13 +612,21 @@ class laminar_HB_analytical:
         else:
             return None
     
-    def shear_rate_plot(self):
+    def shear_rate_curve(self,npts=51):
+        """
+        Radial positions and shear rates (arrays of npts values) across the tube at the current
+        pressure drop, as drawn by shear_rate_plot.
+        """
+        self.__refresh()
+        x = np.linspace(0.,self.__radius,npts)
+        return x, self.shear_rate(x,self.__pressure_drop)
+
+    def shear_rate_plot(self,npts=51):
         """
         Creates plot of shear rate versus radial position.
         """
-        dp = self.__pressure_drop
-        x = np.linspace(0.,self.__radius,51)
-        y = [self.shear_rate(rad,dp) for rad in x]
+        import matplotlib.pyplot as plt
+        x, y = self.shear_rate_curve(npts)
         plt.plot(x,y)
         plt.xlabel('Radial position')
         plt.ylabel('Shear rate')
@@ -330,48 +641,76 @@ class laminar_HB_analytical:
         """
         Computes Reynolds number at the wall.
         """
+        self.__refresh()
         return self.__density*self.__radius*2.*self.__q/(3.14159*self.__radius**2)/self.viscosity_wall()
         
-    def vz_plot(self):
+    @instrument.operation
+    def vz_curve(self,npts=51):
+        """
+        Radial positions and axial velocities (arrays of npts values) across the tube at the
+        current pressure drop, as drawn by vz_plot.
+        """
+        self.__refresh()
+        x = np.linspace(0.,self.__radius,npts)
+        return x, self.vz(x,self.__pressure_drop)
+
+    def vz_plot(self,npts=51):
         """
         Creates plot of axial velocity versus radial position.
         """
-        dp = self.__pressure_drop
-        x = np.linspace(0.,self.__radius,51)
-        y = [self.vz(rad,dp) for rad in x]
+        import matplotlib.pyplot as plt
+        x, y = self.vz_curve(npts)
         plt.plot(x,y)
         plt.xlabel('Radial position')
         plt.ylabel('Velocity')
     
+    @instrument.operation
+    def q_from_dp(self,dp):
+        """
+        Volumetric flow rate for pressure drops dp (scalar or array) from the closed form,
+        see _hb_q.
+        """
+        return _hb_q(self.__hb(),self.__radius,self.__length,dp)
+
+    @instrument.operation
+    def dp_from_q(self,q):
+        """
+        Pressure drops for volumetric flow rates q (scalar or array), all solved together by
+        Newton iterations on the closed form, see _hb_dp.
+        """
+        return _hb_dp(self.__hb(),self.__radius,self.__length,q)[()]
+
     def __q_calc(self,dp):
-        R=self.__radius
-        dp_dx=dp/self.__length
-        r_y=2*self._viscosity.tauy/dp_dx
-        n=self._viscosity.n
-        k=self._viscosity.k
-        return np.pi*n/(3*n+1)*(dp_dx/2/k)**(1/n)*R**(1/n+3)*(1-r_y/R)**((n+1)/n)*(1+2*n/(2*n+1)*r_y/R*(1+n/(n+1)*r_y/R))
-    
-    
-    def __q_eqn(self,dp_v):
-        return self.__q_calc(dp_v) - self.__q
+        return self.q_from_dp(dp)[()]
     
     def __dp_calc(self):
         """
         Computes the pressure drop for a volumetric flow rate of q_want.
-        The computation is iterative due to nature of many viscosity functiions.
         The object attribute self.pressure_drop is set to result.
         """
-        self.__pressure_drop= spo.brentq(self.__q_eqn,self.scale_min,self.scale_max)
+        hb = self.__hb()
+        key = (hb,self.__radius,self.__length)
+        near = self.__near[1] if self.continuation and self.__near and self.__near[0] == key else None
+        self.__pressure_drop = _hb_dp(hb,self.__radius,self.__length,self.__q,near)[()]
+        self.__near = (key,(self.__q,self.__pressure_drop))
         return
     
-    def q_plot(self,pressure_drop_min,pressure_drop_max):
+    def q_curve(self,pressure_drop_min,pressure_drop_max,npts=51):
+        """
+        Pressure drops evenly spaced on a log axis between pressure_drop_min and pressure_drop_max
+        and their flow rates (arrays of npts values), as drawn by q_plot.
+        """
+        x = np.logspace(np.log10(pressure_drop_min),np.log10(pressure_drop_max),npts)
+        return x, self.q_from_dp(x)
+
+    def q_plot(self,pressure_drop_min,pressure_drop_max,npts=51):
         """
         Creates log-log plot of pressure drop versus flow rate.
-        A log-spacing of pressure drops between args pressure_drop_min and pressure_drop_max
-        are created.
+        A log-spacing of npts pressure drops between args pressure_drop_min and pressure_drop_max
+        are created, see q_curve.
         """
-        x = np.logspace(np.log10(pressure_drop_min),np.log10(pressure_drop_max),51)
-        y = [self.__q_calc(dp) for dp in x]
+        import matplotlib.pyplot as plt
+        x, y = self.q_curve(pressure_drop_min,pressure_drop_max,npts)
         plt.loglog(y,x,'-')
         plt.xlabel('Flow rate')
         plt.ylabel('Pressure drop')
@@ -379,30 +718,31 @@ class laminar_HB_analytical:
 
     @property
     def pressure_drop(self):
+        self.__refresh()
         return self.__pressure_drop
 
     @pressure_drop.setter
+    @instrument.operation
     def pressure_drop(self,pressure_drop):
         if pressure_drop:
             self.__pressure_drop = pressure_drop
-            self.__q = self.__q_calc(pressure_drop)
+            self.__driver = 'pressure_drop'
+            self.__changed()
         else:
             self.__pressure_drop = None
 
     @property
     def q(self):
+        self.__refresh()
         return self.__q
 
     @q.setter
+    @instrument.operation
     def q(self,q):
         if q:
             self.__q = q
-            # Estimate dp_a to set scale to reasonalble value
-            dp_a = 8.*self._viscosity.calc_visc(4.*self.__q/(3.14158*self.__radius**3))* \
-                self.__length*self.__q/(3.14159*self.__radius**4)
-            self.scale_max=2.*dp_a
-            self.scale_min=dp_a/100.
-            self.__dp_calc()
+            self.__driver = 'q'
+            self.__changed()
         else:
             self.__q = None
 
@@ -425,7 +765,9 @@ class laminar_HB_analytical:
     @radius.setter
     def radius(self,radius):
         self.__radius = radius
-        if self.__pressure_drop:
+        if self.__lazy:
+            self.__dirty = True
+        elif self.__pressure_drop:
             self.__q = self.__q_calc(self.__pressure_drop)
         else:
             self.__pressure_drop = None
@@ -437,7 +779,9 @@ class laminar_HB_analytical:
     @length.setter
     def length(self,length):
         self.__length = length
-        if self.__pressure_drop:
+        if self.__lazy:
+            self.__dirty = True
+        elif self.__pressure_drop:
             self.__q = self.__q_calc(self.__pressure_drop)
         else:
             self.__pressure_drop = None
@@ -0,0 +1,83 @@
+import numpy as np
+
+from . import instrument
+
+
+def newton_bracketed(f,fprime,lo,hi,x0=None,rtol=1.e-12,xtol=1.e-300,maxiter=200,full_output=False):
+    """
+    Vectorized safeguarded Newton iteration for a function f that increases monotonically
+    between the elementwise brackets lo and hi, f(lo)<=0<=f(hi).
+    f and fprime take and return arrays of the common shape of lo and hi.
+    Newton steps that leave the current bracket are replaced by bisection, which is
+    geometric when lo>0 and a factor of 10 reduction of hi when lo is 0, so every
+    element converges even when the derivative is poorly behaved.
+    Returns the roots, or (roots, info) when full_output is True where info holds the
+    number of iterations and a boolean array flagging converged elements.
+    """
+    start = instrument.start()
+    lo, hi = np.broadcast_arrays(np.asarray(lo,dtype=float),np.asarray(hi,dtype=float))
+    lo = lo.copy()
+    hi = hi.copy()
+    if x0 is None:
+        x = np.where(lo>0.,np.sqrt(lo*hi),0.5*hi)
+    else:
+        x = np.clip(np.broadcast_to(np.asarray(x0,dtype=float),lo.shape),lo,hi)
+    active = np.ones(lo.shape,dtype=bool)
+    iterations = 0
+    for iterations in range(1,maxiter+1):
+        fx = f(x)
+        lo = np.where(fx<0.,x,lo)
+        hi = np.where(fx>0.,x,hi)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            x_new = x - fx/fprime(x)
+        bisect = ~((x_new>lo) & (x_new<hi))
+        x_mid = np.where(lo>0.,np.sqrt(lo*hi),0.1*hi)
+        x_new = np.where(bisect,x_mid,x_new)
+        done = (fx==0.) | (np.abs(x_new-x) <= xtol + rtol*np.abs(x_new)) | (hi-lo <= xtol + rtol*hi)
+        x = np.where(active & (fx!=0.),x_new,x)
+        active &= ~done
+        if not active.any():
+            break
+    instrument.count('newton',iterations=iterations,evaluations=x.size,since=start)
+    if full_output:
+        return x, {'iterations':iterations,'converged':~active}
+    return x
+
+
+def expand_bracket(f,lo,hi,factor=10.,maxiter=60):
+    """
+    Widens elementwise brackets [lo, hi] of a function f that increases with its argument
+    until f(lo) <= 0 <= f(hi), dividing lo and multiplying hi by factor where the sign is
+    wrong, so lo and hi must be positive (or lo zero with f(0) <= 0).  Tight starting brackets,
+    such as the asymptotic ones of the viscosity models, need no expansion at all.
+    f takes and returns arrays of the common shape of lo and hi.  Returns lo, hi; elements
+    without a sign change after maxiter expansions keep their widest bracket.
+    """
+    lo, hi = np.broadcast_arrays(np.asarray(lo,dtype=float),np.asarray(hi,dtype=float))
+    for i in range(maxiter):
+        low = f(lo) > 0.
+        high = f(hi) < 0.
+        if not (low.any() or high.any()):
+            break
+        lo = np.where(low,lo/factor,lo)
+        hi = np.where(high,hi*factor,hi)
+    return lo, hi
+
+
+def bracket(f,x0,factor=10.,maxiter=30):
+    """
+    Searches for a sign change of a scalar function f around x0 by expanding the interval
+    [x0/factor**k, x0*factor**k] geometrically, for positive x0.
+    Returns (lo, hi, calls) with f(lo) and f(hi) of opposite sign (or zero), or None when
+    no sign change is found after maxiter expansions.
+    """
+    lo, hi = x0/factor, x0*factor
+    f_lo, f_hi = f(lo), f(hi)
+    calls = 2
+    for i in range(maxiter):
+        if f_lo*f_hi <= 0.:
+            return lo, hi, calls
+        lo, hi = lo/factor, hi*factor
+        f_lo, f_hi = f(lo), f(hi)
+        calls += 2
+    return None
@@ -1,22 +1,107 @@
 import numpy as np
-import scipy.optimize as spo
-import scipy.integrate as spi
-from scipy.integrate import odeint
-import matplotlib.pyplot as plt
+
+from . import viscosity, profile, cache, roots, instrument
+from .viscosity import hb_parameters
 
 
     # re_wall, and stuff? ow to access, vz -> change vz to vz_calc
 
-    
+def _hb_q(hb,width,height,length,dp):
+    """
+    Closed-form flow rate of a Herschel-Bulkley fluid hb = (tauy, k, n) in a slit of half height
+    height for pressure drops dp (scalar or array).  With G = dp/length, S = G*height - tauy
+    Q = 2*width*k**(-1/n)/G**2*(n/(2n+1)*S**((2n+1)/n) + tauy*n/(n+1)*S**((n+1)/n)),
+    which is 0 for S <= 0.
+    """
+    tauy, k, n = hb
+    g = np.maximum(np.asarray(dp,dtype=float),0.)/length
+    shell = np.maximum(g*height-tauy,0.)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        q = 2.*width*k**(-1/n)/g**2*(n/(2*n+1)*shell**((2*n+1)/n)+tauy*n/(n+1)*shell**((n+1)/n))
+    return np.where(shell>0.,q,0.)
+
+def _hb_dp(hb,width,height,length,q,near=None,rtol=1.e-13,maxiter=100):
+    """
+    Pressure drops for flow rates q (scalar or array) of a Herschel-Bulkley fluid hb = (tauy, k, n)
+    in a slit of half height height, all solved together by Newton iterations on ln(Q(dp)/q) in
+    u = ln(dp - dp_y), dp_y = tauy*length/height, with dQ/ddp = (2*width*height**2*rate_wall - 2*Q)/dp.
+    As for pipe.laminar_HB_analytical.dp_from_q the iterations start from an upper bound and
+    converge monotonically.  q <= 0 gives 0.  near = (q0, dp0) starts from the log-log tangent of
+    Q(dp) at a nearby solution, as in pipe._hb_dp.
+    """
+    start = instrument.start()
+    tauy, k, n = hb
+    q = np.asarray(q,dtype=float)
+    dp_yield = tauy*length/height
+    q_want = np.where(q>0.,q,1.)
+    u = None
+    if near is not None:
+        q0, dp0 = near
+        rate0 = (max(dp0/length*height-tauy,0.)/k)**(1/n)
+        with np.errstate(divide='ignore',invalid='ignore',over='ignore'):
+            # dln(Q)/dln(dp) = 2*width*height**2*rate_wall/Q - 2
+            u = np.log(dp0*(q_want/q0)**(1./(2.*width*height**2*rate0/q0-2.)) - dp_yield)
+        if not np.all(np.isfinite(u)):
+            u = None
+    if u is None:
+        # Upper bound: yield pressure drop plus power law pressure drop, doubled until Q(hi) >= q
+        hi = dp_yield + length*k*(q_want*(2*n+1)/(2.*width*n*height**((2*n+1)/n)))**n
+        hi = roots.expand_bracket(lambda dp: _hb_q(hb,width,height,length,dp) - q_want,dp_yield,hi,factor=2.,maxiter=200)[1]
+        u = np.log(hi-dp_yield)
+    for i in range(maxiter):
+        dp = dp_yield + np.exp(u)
+        q_dp = _hb_q(hb,width,height,length,dp)
+        rate_wall = (np.maximum(dp/length*height-tauy,0.)/k)**(1/n)
+        step = np.log(q_dp/q_want)/(np.exp(u)*(2.*width*height**2*rate_wall/q_dp-2.)/dp)
+        u = u - np.where(np.isfinite(step),step,0.)
+        if np.all(np.abs(step)*np.exp(u) <= rtol*dp):
+            break
+    instrument.count('newton',iterations=i+1,evaluations=q.size,since=start)
+    return np.where(q>0.,dp_yield + np.exp(u),0.)
+
+def _hb_vz(hb,height,length,y,dp):
+    """
+    Closed-form velocity of a Herschel-Bulkley fluid hb = (tauy, k, n) at positions y from the
+    mid plane of a slit of half height height, uniform inside the plug |y| <= y_y = tauy*length/dp.
+    """
+    tauy, k, n = hb
+    g = np.asarray(dp,dtype=float)/length
+    with np.errstate(divide='ignore'):
+        y_y = tauy/g
+    shell = np.maximum(height-y_y,0.)
+    plug = np.minimum(np.maximum(np.abs(np.asarray(y,dtype=float))-y_y,0.),shell)
+    return (g/k)**(1/n)*(n/(n+1))*(shell**((n+1)/n)-plug**((n+1)/n))
+
 
 class laminar:
     """
     This class contains a variety of methods for computing quantities of interest for laminar flow in a slit.
     The argument viscosity requires a function (or class with method) calc_visc with parameters already set 
     and the shear rate as it's only argument.
+
+    With lazy=True setters only record the new value and the flow is solved when a result is
+    first read; the most recently set of q and pressure_drop is held fixed.  update() sets several
+    values and solves once in either mode, with the same rule.  Without lazy the geometry
+    setters keep their original behaviour and recompute q from the pressure drop.
+
+    Newtonian, power law and herschel_bulkley (m_flag=0) fluids are solved with the closed-form
+    Herschel-Bulkley solution, all others with the numerical flow function engine;
+    solution_method reports 'analytical' or 'numerical' for the last solve.
+
+    Results of shear_rate are memoized per instance in an LRU cache of shear_rate_memo_size
+    entries, keyed on position, pressure drop, geometry and the fluid parameters (cache.fluid_key).
+
+    With continuation=True a flow rate driven solve of a Herschel-Bulkley type fluid starts from
+    the previous solution for the same fluid and geometry (see _hb_dp), which suits sweeps in
+    small steps.  It has no effect on the numerical flow function engine, which reads the wall
+    stress from the interpolated inverse of the cached master curve with no iterative solve to
+    warm start.
     """
+    shear_rate_memo_size = 256
+    _update_keys = ('height','width','length','q','pressure_drop')
+
     def __init__(self,name='default',height=0.01,width=0.1,length=1.,density=1000., \
-        pressure_drop = None, q = None, viscosity=lambda x: 1.0):
+        pressure_drop = None, q = None, viscosity=lambda x: 1.0, lazy=False, continuation=False):
         self.name=name
         self.__density = density
         # document 1/2H
@@ -24,18 +109,71 @@ class laminar:
         self.__width = width
         self.__length = length
         self._viscosity = viscosity
-        self.__y = 0.
+        self.__lazy = lazy
+        self.__dirty = False
+        self.__driver = None
+        self.__q = None
+        self.__near = None
+        self.continuation = continuation
+        self.__solution_method = None
+        self.__shear_rate_memo = cache.lru_dict(maxsize=self.shear_rate_memo_size)
         if pressure_drop:
             self.pressure_drop = pressure_drop
         else:
             self.pressure_drop = None
         if q:
             self.q = q
+
+    def __solve(self):
+        """
+        Solves for the quantity not held fixed, q or pressure_drop.
+        """
+        self.__dirty = False
+        if self.__driver == 'q':
+            self.__dp_calc()
+        elif self.__driver == 'pressure_drop':
+            self.__q = self.__q_calc(self.__pressure_drop)
+
+    def __refresh(self):
+        if self.__dirty:
+            self.__solve()
+
+    def __changed(self):
+        if self.__lazy:
+            self.__dirty = True
         else:
-            self.q = None
+            self.__solve()
+
+    def __geometry_changed(self):
+        self.__shear_rate_memo.clear()
+        if self.__lazy:
+            self.__dirty = True
+        elif self.__pressure_drop:
+            self.__q = self.__q_calc(self.__pressure_drop)
 
+    @instrument.operation
+    def update(self,**kwargs):
+        """
+        Sets any of q, pressure_drop, height, width and length by keyword and solves the flow once.
+        """
+        if 'q' in kwargs and 'pressure_drop' in kwargs:
+            raise ValueError('Specify at most one of q or pressure_drop')
+        for key in kwargs:
+            if key not in self._update_keys:
+                raise TypeError('update() got an unexpected keyword argument '+repr(key))
+        lazy = self.__lazy
+        self.__lazy = True
+        try:
+            for key in self._update_keys:
+                if key in kwargs:
+                    setattr(self,key,kwargs[key])
+        finally:
+            self.__lazy = lazy
+        if not lazy:
+            self.__refresh()
         
     def __str__(self):
+        self.__refresh()
         h = 2.*self.__height
         return str('Name ='+self.name+'\n'+
             'Height ='+str(h)+'\n'+
@@ -45,21 +183,30 @@ class laminar:
             'Flow rate ='+str(self.__q)+'\n'+
             'Shear rate wall = '+str(self.shear_rate_wall()))
     
-    def _shear_rate_equation(self,solve_rate,dp):
-        return solve_rate * self._viscosity.calc_visc(solve_rate) -  \
-            dp/self.__length*self.__y
-
+    @instrument.operation
     def shear_rate(self,h,dp):
         """
         This method computes the shear rate at a y position for dp.
+        The local stress dp/length*h is inverted by the viscosity model, so h may be an array.
         """
-        self.__y = h
-        return spo.brentq(lambda x: self._shear_rate_equation(x,dp), 0.,1.e+9)
+        try:
+            key = (np.shape(h),np.asarray(h,dtype=float).tobytes(),np.shape(dp),np.asarray(dp,dtype=float).tobytes(), \
+                self.__height,self.__width,self.__length,cache.fluid_key(self._viscosity))
+            rate = self.__shear_rate_memo.get(key)
+        except TypeError:
+            # Unhashable fluid parameters, no memo
+            key, rate = None, None
+        if rate is None:
+            rate = viscosity.invert_stress(self._viscosity,dp/self.__length*h)
+            if key is not None:
+                self.__shear_rate_memo[key] = rate
+        return np.copy(rate)[()]
 
     def shear_rate_wall(self):
         """
         Computes the true wall shear rate, or shear rate at radial position radius.
         """
+        self.__refresh()
         height = self.__height
         if self.__pressure_drop:
             dp = self.__pressure_drop
@@ -68,67 +215,105 @@ class laminar:
             return None
         
     
+    @instrument.operation
     def vz(self,h,dp):
         """
-        This method computes the axial velocity vz at a radial position, rad.
+        This method computes the axial velocity vz at a y position, h (scalar or array).
+        The shear rate is integrated cumulatively from the wall on a Gauss-Legendre grid,
+        vz(h) = H/tauw*(I_0(tauw)-I_0(tau(h))) with H the half height, see profile.stress_moment.
+        Herschel-Bulkley type fluids (see viscosity.hb_parameters) use the closed form instead.
         """
-        # (-) sign deals with vz<0 whehn pressuredrop>0
-        #return -spi.quad(self.shear_rate,self.__radius,rad)[0]
-        return -spi.quad(lambda x: self.shear_rate(x,dp),self.__height,h)[0]
+        hb = hb_parameters(self._viscosity)
+        if hb is not None:
+            return _hb_vz(hb,self.__height,self.__length,h,dp)[()]
+        tauw = dp/self.__length*self.__height
+        tau = dp/self.__length*np.asarray(h,dtype=float)
+        i0 = profile.stress_moment(self._viscosity,np.append(tau.ravel(),tauw),0)
+        return (self.__height/tauw*(i0[-1]-i0[:-1])).reshape(tau.shape)[()]
 
     def stress_wall(self):
         """
         Computes shear stress at wall, radial position radius.
         """
+        self.__refresh()
         if self.__pressure_drop:
-            return self.__heigth/2.*self.__pressure_drop/self.__length
+            return self.__height*self.__pressure_drop/self.__length
         else:
             return None
 
-    def __q_integrand(self,h,dp):
-        return 2.*self.__width*self.vz(h,dp)
-
     def __q_calc(self,dp):
         """
-        Computes volumetric flow rate for preessure drop argument of dp_want.
-        The object attribute self.pressure_drop is set to dp_want.
+        Computes volumetric flow rate for pressure drop dp (scalar or array).
+        With half height h and wall stress tauw = dp/length*h, Q = 2*width*h**2*Phi_1(tauw)
+        where the flow function Phi_1 is read from the fluid master curve in rheoflow.cache.
+        Herschel-Bulkley type fluids (see viscosity.hb_parameters) use the closed form instead.
         """
-        #return spi.quad(self.__q_integrand(),0.,self.__radius)[0]
-        return spi.quad( lambda x: self.__q_integrand(x,dp),0.,self.__height)[0]
-    
-    def __q_eqn(self,dp_v):
-        return self.__q_calc(dp_v) - self.__q
+        hb = hb_parameters(self._viscosity)
+        if hb is not None:
+            self.__solution_method = 'analytical'
+            return _hb_q(hb,self.__width,self.__height,self.__length,dp)[()]
+        self.__solution_method = 'numerical'
+        tauw = np.asarray(dp,dtype=float)*self.__height/self.__length
+        return 2.*self.__width*self.__height**2*cache.get_curve(self._viscosity,1).phi(tauw)
     
     def __dp_calc(self):
         """
         Computes the pressure drop for a volumetric flow rate of q_want.
-        The computation is iterative due to nature of many viscosity functiions.
+        The wall stress comes from inverse interpolation of the fluid master curve
+        followed by one Newton refinement step, or from _hb_dp for Herschel-Bulkley type fluids.
         The object attribute self.pressure_drop is set to result.
         """
-        comp_pressure_drop = spo.brentq(self.__q_eqn,0.,1.e+6)
-        self.__pressure_drop = comp_pressure_drop
+        hb = hb_parameters(self._viscosity)
+        if hb is not None:
+            self.__solution_method = 'analytical'
+            # Continuation from the previous solution for the same fluid and geometry
+            key = (hb,self.__width,self.__height,self.__length)
+            near = self.__near[1] if self.continuation and self.__near and self.__near[0] == key else None
+            self.__pressure_drop = _hb_dp(hb,self.__width,self.__height,self.__length,self.__q,near)[()]
+            self.__near = (key,(self.__q,self.__pressure_drop))
+            return
+        self.__solution_method = 'numerical'
+        phi = self.__q/(2.*self.__width*self.__height**2)
+        self.__pressure_drop = cache.get_curve(self._viscosity,1).tauw(phi)*self.__length/self.__height
         return
 
-    def q_plot(self,pressure_drop_min,pressure_drop_max):
+    @instrument.operation
+    def q_curve(self,pressure_drop_min,pressure_drop_max,npts=51):
+        """
+        Pressure drops evenly spaced on a log axis between pressure_drop_min and pressure_drop_max
+        and their flow rates (arrays of npts values), as drawn by q_plot.
+        """
+        x = np.logspace(np.log10(pressure_drop_min),np.log10(pressure_drop_max),npts)
+        return x, self.__q_calc(x)
+
+    def q_plot(self,pressure_drop_min,pressure_drop_max,npts=51):
         """
         Creates log-log plot of pressure drop versus flow rate.
-        A log-spacing of pressure drops between args pressure_drop_min and pressure_drop_max
-        are created.
+        A log-spacing of npts pressure drops between args pressure_drop_min and pressure_drop_max
+        are created, see q_curve.
         """
-        x = np.logspace(np.log10(pressure_drop_min),np.log10(pressure_drop_max),51)
-        y = [self.__q_calc(dp) for dp in x]
+        import matplotlib.pyplot as plt
+        x, y = self.q_curve(pressure_drop_min,pressure_drop_max,npts)
         plt.loglog(y,x,'-')
         plt.xlabel('Flow rate')
         plt.ylabel('Pressure drop')
         plt.title(self.name)
 
-    def shear_rate_plot(self):
+    def shear_rate_curve(self,npts=51):
+        """
+        Positions from the mid plane to the wall and shear rates (arrays of npts values) at the
+        current pressure drop, as drawn by shear_rate_plot.
+        """
+        self.__refresh()
+        x = np.linspace(0.,self.__height,npts)
+        return x, self.shear_rate(x,self.__pressure_drop)
+
+    def shear_rate_plot(self,npts=51):
         """
         Creates plot of shear rate versus radial position.
         """
-        dp = self.__pressure_drop
-        x = np.linspace(0.,self.__height,51)
-        y = [self.shear_rate(h,dp) for h in x]
+        import matplotlib.pyplot as plt
+        x, y = self.shear_rate_curve(npts)
         plt.plot(x,y)
         plt.xlabel('Height')
         plt.ylabel('Shear rate')
@@ -143,43 +328,131 @@ class laminar:
         """
         Computes Reynolds number at the wall.
         """
+        self.__refresh()
         return self.__density*self.__height*2.*self.__q/(self.__width*2.*self.__height)/self.viscosity_wall()
         
-    def vz_plot(self):
+    @instrument.operation
+    def vz_curve(self,npts=51):
+        """
+        Positions from the mid plane to the wall and axial velocities (arrays of npts values) at
+        the current pressure drop, as drawn by vz_plot.
+        """
+        self.__refresh()
+        x = np.linspace(0.,self.__height,npts)
+        return x, self.vz(x,self.__pressure_drop)
+
+    def vz_plot(self,npts=51):
         """
         Creates plot of axial velocity versus radial position.
         """
-        dp = self.__pressure_drop
-        x = np.linspace(0.,self.__height,51)
-        y = [self.vz(height,dp) for height in x]
+        import matplotlib.pyplot as plt
+        x, y = self.vz_curve(npts)
         plt.plot(x,y)
         plt.xlabel('Y position position')
         plt.ylabel('Velocity')
 
     @property
     def pressure_drop(self):
+        self.__refresh()
         return self.__pressure_drop
 
     @pressure_drop.setter
+    @instrument.operation
     def pressure_drop(self,pressure_drop):
         if pressure_drop:
             self.__pressure_drop = pressure_drop
-            self.__q = self.__q_calc(pressure_drop)
+            self.__driver = 'pressure_drop'
+            self.__changed()
         else:
             self.__pressure_drop = None
 
     @property
     def q(self):
+        self.__refresh()
         return self.__q
 
     @q.setter
+    @instrument.operation
     def q(self,q):
         if q:
             self.__q = q
-            self.__dp_calc()
+            self.__driver = 'q'
+            self.__changed()
         else:
             self.__q = None
 
+    @property
+    def solution_method(self):
+        self.__refresh()
+        return self.__solution_method
 
-    
-                   
\ No newline at end of file
+    @property
+    def height(self):
+        return 2.*self.__height
+
+    @height.setter
+    def height(self,height):
+        self.__height = height/2.
+        self.__geometry_changed()
+
+    @property
+    def width(self):
+        return self.__width
+
+    @width.setter
+    def width(self,width):
+        self.__width = width
+        self.__geometry_changed()
+
+    @property
+    def length(self):
+        return self.__length
+
+    @length.setter
+    def length(self,length):
+        self.__length = length
+        self.__geometry_changed()
+
+
+#-------------------------------------------------------------------------------------
+#            Analytical solution for HB
+#-------------------------------------------------------------------------------------
+class laminar_HB_analytical(laminar):
+    """
+    This class contains analytical solution for slit flow of Herschel-Bulkley fluids, with a
+    plug of half width tauy*length/pressure_drop in the centre.  The viscosity must be newtonian,
+    power_law or herschel_bulkley with m_flag=0 (see viscosity.hb_parameters); laminar uses
+    the same closed forms automatically for these fluids.
+    """
+    def __init__(self,name='Default',height=0.01,width=0.1,length=1.,density=1000., \
+        pressure_drop = None, q = None, viscosity=viscosity.herschel_bulkley(name='default',tauy=1.,k=1.,n=1.,m_flag=0), \
+        lazy=False, continuation=False):
+        if hb_parameters(viscosity) is None:
+            raise ValueError('laminar_HB_analytical requires a newtonian, power_law or herschel_bulkley (m_flag=0) viscosity')
+        super().__init__(name=name,height=height,width=width,length=length,density=density, \
+            pressure_drop=pressure_drop,q=q,viscosity=viscosity,lazy=lazy, \
+            continuation=continuation)
+
+    @instrument.operation
+    def shear_rate(self,h,dp):
+        """
+        Shear rate ((tau(h)-tauy)/k)**(1/n) at y positions h for pressure drop dp, zero inside
+        the plug.  h and dp may be arrays.
+        """
+        tauy, k, n = hb_parameters(self._viscosity)
+        tau = np.asarray(dp,dtype=float)/self.length*np.abs(np.asarray(h,dtype=float))
+        return (np.maximum(tau-tauy,0.)/k)**(1/n)
+
+    @instrument.operation
+    def q_from_dp(self,dp):
+        """
+        Volumetric flow rate for pressure drops dp (scalar or array), see _hb_q.
+        """
+        return _hb_q(hb_parameters(self._viscosity),self.width,self.height/2.,self.length,dp)[()]
+
+    @instrument.operation
+    def dp_from_q(self,q):
+        """
+        Pressure drops for volumetric flow rates q (scalar or array), see _hb_dp.
+        """
+        return _hb_dp(hb_parameters(self._viscosity),self.width,self.height/2.,self.length,q)[()]
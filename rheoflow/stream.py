@@ -0,0 +1,129 @@
+import csv
+import itertools
+import numpy as np
+
+from . import pipe, friction_factor_property
+
+
+def chunked(records,chunksize=100000,text=('line',)):
+    """
+    Groups an iterable of records (mappings of column name to value) into chunks of at most
+    chunksize records, yielded as dicts of column arrays.  The columns named in text (IDs such
+    as the line column) are kept as string arrays, others are float arrays where they parse.
+    """
+    records = iter(records)
+    while True:
+        block = list(itertools.islice(records,chunksize))
+        if not block:
+            return
+        yield {name:_column([r[name] for r in block],name in text) for name in block[0]}
+
+
+def read_csv(path,chunksize=100000,delimiter=',',text=('line',)):
+    """
+    Reads a CSV file with a header row in chunks of at most chunksize rows, yielded as dicts of
+    column arrays.  The columns named in text (IDs such as the line column) are string arrays,
+    others are float arrays where they parse as numbers, string arrays otherwise.
+    """
+    with open(path,newline='') as stream:
+        reader = csv.reader(stream,delimiter=delimiter)
+        names = next(reader)
+        while True:
+            block = list(itertools.islice(reader,chunksize))
+            if not block:
+                return
+            yield {name:_column([row[i] for row in block],name in text) for i,name in enumerate(names)}
+
+
+def read_npy(path,chunksize=100000):
+    """
+    Reads a structured array saved with numpy.save in chunks of at most chunksize records,
+    yielded as dicts of column arrays.  The file is memory mapped, so only one chunk is held
+    in memory.
+    """
+    data = np.load(path,mmap_mode='r')
+    for i in range(0,len(data),chunksize):
+        block = data[i:i+chunksize]
+        yield {name:np.array(block[name]) for name in data.dtype.names}
+
+
+def _column(values,text=False):
+    """
+    Float array of values where they all parse as numbers, otherwise an array of the values.
+    With text the values are always kept as strings, so an ID like '101' stays '101'.
+    """
+    if text:
+        return np.array([str(v) for v in values])
+    try:
+        return np.array(values,dtype=float)
+    except (TypeError,ValueError):
+        return np.array(values)
+
+
+def pressure_drop(chunks,lines,fluid,fluid_columns=(),flow='q',line='line',friction_model='dm'):
+    """
+    Streams expected pressure drops for chunks of operating points.
+    chunks is an iterable of dicts of column arrays (read_csv, read_npy, chunked); each chunk
+    holds the volumetric flow rate in column flow, the line ID in column line and any fluid
+    parameters (read_csv and chunked keep the line column as strings, pass text to name other
+    ID columns).  lines maps every line ID to a dict with diameter, length, density and kind,
+    'laminar' (pipe.solve_laminar) or 'friction_factor' (friction_factor_property.solve_velocity
+    with friction_model).  fluid is a viscosity model shared by all records, or a function that
+    returns the model for the values of the columns named in fluid_columns (for example
+    lambda k,n: viscosity.power_law(k=k,n=n), or a dict lookup on a fluid ID column).
+
+    Records of a chunk are grouped by line and fluid and each group is solved in one vectorized
+    call.  For every input chunk a result chunk is yielded in the same record order, holding the
+    input columns plus pressure_drop, stress_wall, re and error (the exception message for
+    groups that failed, whose results are NaN, '' otherwise).  Only one chunk is in memory at a
+    time, whatever the length of the input.
+    """
+    fluid_columns = tuple(fluid_columns)
+    for chunk in chunks:
+        ids = np.asarray(chunk[line])
+        q = np.asarray(chunk[flow],dtype=float)
+        n = len(q)
+        result = dict(chunk)
+        for name in ('pressure_drop','stress_wall','re'):
+            result[name] = np.full(n,np.nan)
+        errors = np.full(n,'',dtype=object)
+        # Group by line ID and fluid parameter values
+        keys = [ids] + [np.asarray(chunk[c]) for c in fluid_columns]
+        table = np.empty(n,dtype=[('k%d' % i,k.dtype) for i,k in enumerate(keys)])
+        for i,k in enumerate(keys):
+            table['k%d' % i] = k
+        groups, inverse = np.unique(table,return_inverse=True)
+        order = np.argsort(inverse.ravel(),kind='stable')
+        bounds = np.searchsorted(inverse.ravel()[order],np.arange(len(groups)+1))
+        for g,group in enumerate(groups):
+            index = order[bounds[g]:bounds[g+1]]
+            try:
+                geometry = lines[group[0].item()]
+                model = fluid(*(x.item() for x in list(group)[1:])) if fluid_columns else fluid
+                _solve_group(result,index,q[index],geometry,model,friction_model)
+            except Exception as err:
+                errors[index] = type(err).__name__+': '+str(err)
+        result['error'] = errors.astype(str)
+        yield result
+
+
+def _solve_group(result,index,q,geometry,model,friction_model):
+    """
+    Solves the records index of one line and fluid and stores pressure_drop, stress_wall and
+    re in the result chunk.
+    """
+    d = geometry['diameter']
+    l = geometry['length']
+    rho = geometry.get('density',1000.)
+    kind = geometry.get('kind','friction_factor')
+    if kind == 'laminar':
+        solution = pipe.solve_laminar(model,d/2.,l,q=q,density=rho)
+        re = solution['re_wall']
+    elif kind == 'friction_factor':
+        solution = friction_factor_property.solve_velocity(model,rho,d,l,q/(np.pi*d**2/4.),friction_model)
+        re = solution['re']
+    else:
+        raise ValueError('Unknown line kind '+repr(kind))
+    result['pressure_drop'][index] = solution['pressure_drop']
+    result['stress_wall'][index] = solution['stress_wall']
+    result['re'][index] = re
@@ -0,0 +1,141 @@
+import concurrent.futures
+import inspect
+import itertools
+import os
+import numpy as np
+
+
+def grid(**axes):
+    """
+    Cartesian product of the parameter values given as keyword sequences.  Returns a dict of
+    1-D arrays of equal length with the last axis varying fastest, in the order of the keywords.
+    """
+    names = list(axes)
+    values = [list(axes[name]) for name in names]
+    points = list(itertools.product(*values))
+    return {name:_column([p[i] for p in points]) for i,name in enumerate(names)}
+
+
+def _column(values):
+    """
+    1-D array of values, numeric or string where possible and of dtype object otherwise.
+    """
+    if not values:
+        return np.empty(0)
+    try:
+        column = np.asarray(values)
+    except ValueError:
+        column = None
+    if column is None or column.ndim != 1 or column.dtype.kind not in 'biufcUS':
+        column = np.empty(len(values),dtype=object)
+        column[:] = values
+    return column
+
+
+def _same(a,b):
+    return len(a) == len(b) and all(x is y or (type(x) == type(y) and _equal(x,y)) for x,y in zip(a,b))
+
+
+def _equal(x,y):
+    try:
+        return bool(x == y)
+    except (TypeError,ValueError):
+        return False
+
+
+def _run_chunk(solver,fixed,names,rows,outputs,continuation=False):
+    """
+    Solves the points of one chunk in order.  Returns a list of output values per output
+    (NaN on failure) and the error messages ('' on success) of every point.
+    """
+    keys = getattr(solver,'_update_keys',())
+    parameters = inspect.signature(solver).parameters
+    values = [[np.nan]*len(rows) for output in outputs]
+    errors = []
+    instance = None
+    last = None
+    for i,row in enumerate(rows):
+        point = dict(zip(names,row))
+        args = dict(fixed)
+        args.update((k,v) for k,v in point.items() if k not in keys)
+        updates = {k:v for k,v in point.items() if k in keys}
+        try:
+            ctor = [args[k] for k in sorted(args)]
+            if instance is None or not _same(ctor,last):
+                instance = None
+                # Geometry may also be a required constructor argument (friction_factor's d)
+                init = dict(args,**{k:v for k,v in updates.items() if k in parameters})
+                if 'lazy' in parameters:
+                    init['lazy'] = True
+                if continuation and 'continuation' in parameters:
+                    init['continuation'] = True
+                instance = solver(**init)
+                last = ctor
+            if updates:
+                instance.update(**updates)
+            for j,output in enumerate(outputs):
+                value = getattr(instance,output)
+                value = value() if callable(value) else value
+                values[j][i] = np.nan if value is None else value
+            errors.append('')
+        except Exception as err:
+            # A failed point may leave the instance half updated, so start afresh
+            instance = None
+            errors.append(type(err).__name__+': '+str(err))
+    return values, errors
+
+
+def run(solver,points,outputs,fixed=None,max_workers=None,chunksize=None,continuation=False):
+    """
+    Solves solver(**fixed, **point) for every point and reads the attributes named in outputs.
+    points is a dict of equal-length sequences (see grid); fixed holds constructor arguments
+    shared by every point.
+
+        points = sweep.grid(viscosity=[viscosity.power_law(k=1.,n=.5),viscosity.carreau()],
+                            radius=[.01,.02],q=np.linspace(1.e-5,1.e-3,100))
+        result = sweep.run(pipe.laminar,points,outputs=('pressure_drop','stress_wall'))
+
+    Parameters listed in the class attribute _update_keys of the solver (flow rate, pressure
+    drop, geometry) are applied with update(), all others (fluid, density, ...) are constructor
+    arguments, and an instance is reused while the constructor arguments of consecutive points
+    stay the same.  Every point is solved from a cold start, so no starting point depends on
+    chunksize or max_workers.  With continuation=True instances are made with continuation=True
+    where the solver supports it and each point starts from the previous one of its chunk,
+    which suits sweeps along the last axis of grid in small steps; starting points (and so the
+    last digits of the results) then depend on how the points are chunked.  Viscosity models
+    and other parameters are sent to worker processes, so they must be picklable; the models
+    of rheoflow.viscosity are.
+
+    Chunks of chunksize points (by default about four per worker) are spread over a
+    ProcessPoolExecutor with max_workers processes (default os.cpu_count()); max_workers=1
+    solves in this process.  Returns a dict of arrays in the order of the points: the input
+    columns, one column per output and a column error that holds the exception message for
+    points that failed (their outputs are NaN) and '' for the others.
+    """
+    fixed = dict(fixed or {})
+    names = list(points)
+    columns = [_column(list(points[name])) for name in names]
+    n = len(columns[0]) if columns else 0
+    if any(len(c) != n for c in columns):
+        raise ValueError('All parameter sequences must have the same length')
+    if isinstance(outputs,str):
+        outputs = (outputs,)
+    outputs = tuple(outputs)
+    rows = list(zip(*columns)) if columns else []
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1,-(-n//(4*max_workers)))
+    chunks = [rows[i:i+chunksize] for i in range(0,n,chunksize)]
+    if max_workers == 1 or len(chunks) <= 1:
+        parts = [_run_chunk(solver,fixed,names,chunk,outputs,continuation) for chunk in chunks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as pool:
+            # map returns chunks in submission order whatever order they finish in
+            parts = list(pool.map(_run_chunk,*zip(*[(solver,fixed,names,chunk,outputs,continuation)
+                                                   for chunk in chunks])))
+    result = dict(zip(names,columns))
+    for j,output in enumerate(outputs):
+        result[output] = _column([v for p in parts for v in p[0][j]])
+    result['error'] = _column([e for p in parts for e in p[1]])
+    return result
@@ -1,44 +1,247 @@
 import numpy as np
 import scipy.optimize as spo
-import scipy.integrate as spi
-from scipy.integrate import odeint
-import matplotlib.pyplot as plt
+
+from . import roots, instrument
+
+
+def invert_stress(viscosity,tau):
+    """
+    Computes the shear rate at which rate*viscosity(rate) equals the shear stress tau.
+    viscosity may be a model from this module, any object with a calc_visc method or a
+    plain function of shear rate (including a bound calc_visc method).  Models of this
+    module use their shear_rate_from_stress method; anything else falls back to brentq.
+    """
+    if hasattr(viscosity,'shear_rate_from_stress'):
+        return viscosity.shear_rate_from_stress(tau)
+    owner = getattr(viscosity,'__self__',None)
+    if getattr(viscosity,'__name__','') == 'calc_visc' and hasattr(owner,'shear_rate_from_stress'):
+        return owner.shear_rate_from_stress(tau)
+    calc_visc = getattr(viscosity,'calc_visc',viscosity)
+    def solve(t):
+        if t <= 0.:
+            return 0.
+        if not np.isfinite(t):
+            return t
+        stress = lambda x: x*calc_visc(x)-t
+        lo, hi = roots.expand_bracket(stress,0.,max(t,1.))
+        start = instrument.start()
+        x, r = spo.brentq(stress,float(lo),float(hi),full_output=True)
+        instrument.count('brentq',iterations=r.iterations,evaluations=r.function_calls,since=start)
+        return x
+    return np.vectorize(solve,otypes=[float])(tau)[()]
+
+def visc_derivative(viscosity,rate):
+    """
+    Computes d(viscosity)/d(rate) at shear rate rate (scalar or array).
+    viscosity may be a model from this module, any object with a calc_visc method or a
+    plain function of shear rate (including a bound calc_visc method).  Models of this
+    module use their analytic dvisc_drate method; anything else falls back to a central
+    difference in log(rate).
+    """
+    if hasattr(viscosity,'dvisc_drate'):
+        return viscosity.dvisc_drate(rate)
+    owner = getattr(viscosity,'__self__',None)
+    if getattr(viscosity,'__name__','') == 'calc_visc' and hasattr(owner,'dvisc_drate'):
+        return owner.dvisc_drate(rate)
+    calc_visc = getattr(viscosity,'calc_visc',viscosity)
+    rate = np.asarray(rate,dtype=float)
+    h = 1.e-5
+    return ((calc_visc(rate*(1.+h)) - calc_visc(rate*(1.-h)))/(2.*h*rate))[()]
+
+def visc_second_derivative(viscosity,rate):
+    """
+    Computes d2(viscosity)/d(rate)2 at shear rate rate (scalar or array).
+    Models of this module use their analytic d2visc_drate2 method; anything else falls back
+    to a central difference of visc_derivative in log(rate).
+    """
+    if hasattr(viscosity,'d2visc_drate2'):
+        return viscosity.d2visc_drate2(rate)
+    owner = getattr(viscosity,'__self__',None)
+    if getattr(viscosity,'__name__','') == 'calc_visc' and hasattr(owner,'d2visc_drate2'):
+        return owner.d2visc_drate2(rate)
+    rate = np.asarray(rate,dtype=float)
+    # visc_derivative is itself a difference, so a smaller step would amplify its rounding error
+    h = 1.e-3
+    return ((visc_derivative(viscosity,rate*(1.+h)) - visc_derivative(viscosity,rate*(1.-h)))/(2.*h*rate))[()]
+
+def flow_index(viscosity,rate):
+    """
+    Computes the local flow index n = dlog(stress)/dlog(rate) = 1 + rate*visc'/visc at shear
+    rate rate (scalar or array), from visc_derivative.  Models of this module use their
+    flow_index method.
+    """
+    if hasattr(viscosity,'flow_index'):
+        return viscosity.flow_index(rate)
+    owner = getattr(viscosity,'__self__',None)
+    if getattr(viscosity,'__name__','') == 'calc_visc' and hasattr(owner,'flow_index'):
+        return owner.flow_index(rate)
+    calc_visc = getattr(viscosity,'calc_visc',viscosity)
+    rate = np.asarray(rate,dtype=float)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        return (1. + np.where(rate>0.,rate*visc_derivative(viscosity,rate)/calc_visc(rate),0.))[()]
+
+def hb_parameters(viscosity):
+    """
+    Returns (tauy, k, n) when viscosity (a model or its bound calc_visc) is exactly a
+    Herschel-Bulkley fluid tau = tauy + k*rate**n: newtonian, power_law and herschel_bulkley
+    with m_flag=0.  Returns None for every other fluid.
+    """
+    owner = getattr(viscosity,'__self__',None)
+    if getattr(viscosity,'__name__','') == 'calc_visc' and owner is not None:
+        viscosity = owner
+    if isinstance(viscosity,newtonian):
+        return (0.,viscosity.mu,1.)
+    if isinstance(viscosity,power_law):
+        return (0.,viscosity.k,viscosity.n)
+    if isinstance(viscosity,herschel_bulkley) and viscosity.m_flag == 0:
+        return (viscosity.tauy,viscosity.k,viscosity.n)
+    return None
 
 class property_plot:
     """
     This class must be inherited from a viscosity model class.
       It is not well written and cannot stand alone, which is a problem.
+    The calc_visc method of every model accepts a scalar or a NumPy array of any
+    shape and returns viscosities of matching shape.
     """
 
     def __init__(self):
         self.rate_min=.001
         self.rate_max=10000.
+
+    def fingerprint(self):
+        """
+        Hashable (model name, ((parameter, value), ...)) tuple identifying the fluid.  It is
+        equal for models of the same type with equal parameters, frozen or not, and ignores
+        the name and plot settings.
+        """
+        model = getattr(self,'_model',type(self))
+        return (model.__name__,tuple(sorted((k,v) for k,v in vars(self).items()
+                                            if k not in ('name','rate_min','rate_max'))))
+
+    def frozen(self):
+        """
+        Returns an immutable, hashable copy of the model (class frozen_<model>) that compares
+        equal to every frozen model with the same fingerprint.
+        """
+        cls = _frozen_classes[getattr(self,'_model',type(self))]
+        copy = cls.__new__(cls)
+        copy.__dict__.update(vars(self))
+        return copy
         
-    def visc_plot(self):
+    def _curve_rates(self,npts,rate_min,rate_max):
+        """
+        npts shear rates evenly spaced on a log axis between rate_min and rate_max, which
+        default to the rate_min and rate_max attributes of the model (.001 and 10000).
+        """
+        if rate_min is None:
+            rate_min = getattr(self,'rate_min',.001)
+        if rate_max is None:
+            rate_max = getattr(self,'rate_max',10000.)
+        return np.logspace(np.log10(rate_min),np.log10(rate_max),npts)
+
+    def visc_curve(self,npts=51,rate_min=None,rate_max=None):
+        """
+        Shear rates and viscosities (arrays of npts values) of the curve drawn by visc_plot,
+        evenly spaced on a log axis between rate_min and rate_max.
+        """
+        rate = self._curve_rates(npts,rate_min,rate_max)
+        return rate, self.calc_visc(rate)
+
+    def stress_curve(self,npts=51,rate_min=None,rate_max=None):
+        """
+        Shear rates and shear stresses (arrays of npts values) of the curve drawn by stress_plot,
+        evenly spaced on a log axis between rate_min and rate_max.
+        """
+        rate = self._curve_rates(npts,rate_min,rate_max)
+        return rate, self.calc_visc(rate)*rate
+
+    def visc_plot(self,npts=51,rate_min=None,rate_max=None):
         """
         Method to create log-log plot of viscosity versus shear rate.  
-        50 pts are evenly spaced on log axis betwen rate_min and rate_max.
+        npts pts are evenly spaced on log axis betwen rate_min and rate_max, see visc_curve.
         This class expects to be inherited by a viscosity function class.
         """
-        x = np.logspace(np.log10(.001),np.log10(10000.),51)
-        y = list( map( lambda rate: self.calc_visc(rate), x))
+        import matplotlib.pyplot as plt
+        x, y = self.visc_curve(npts,rate_min,rate_max)
         plt.loglog(x,y,'-')
         plt.xlabel('Shear rate')
         plt.ylabel('Viscosity')
         plt.title(self.name)
         
-    def stress_plot(self):
+    def stress_plot(self,npts=51,rate_min=None,rate_max=None):
         """
         Method to create log-log plot of shear stress versus shear rate.  
-        50 pts are evenly spaced on log axis betwen rate_min and rate_max.
+        npts pts are evenly spaced on log axis betwen rate_min and rate_max, see stress_curve.
         This class expects to be inherited by a viscosity function class.
         """
-        x = np.logspace(np.log10(.001),np.log10(10000.),51)
-        y = list( map( lambda rate: self.calc_visc(rate)*rate, x))
+        import matplotlib.pyplot as plt
+        x, y = self.stress_curve(npts,rate_min,rate_max)
         plt.loglog(x,y,'-')
         plt.xlabel('Shear rate')
         plt.ylabel('Stress')
         plt.title(self.name)    
+
+    def flow_index(self,rate):
+        """
+        Local flow index n = dlog(stress)/dlog(rate) = 1 + rate*dvisc_drate/calc_visc.
+        Zero shear rate gives 1.
+        """
+        rate = np.asarray(rate,dtype=float)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            return (1. + np.where(rate>0.,rate*self.dvisc_drate(rate)/self.calc_visc(rate),0.))[()]
+
+    def _dstress_drate(self,rate):
+        """
+        Derivative of the stress rate*calc_visc(rate) with respect to shear rate.
+        """
+        rate = np.asarray(rate,dtype=float)
+        # rate*dvisc_drate tends to zero at zero rate even where dvisc_drate is unbounded
+        with np.errstate(divide='ignore',invalid='ignore'):
+            return self.calc_visc(rate) + np.where(rate>0.,rate*self.dvisc_drate(rate),0.)[()]
+
+    def _stress_breakpoints(self):
+        """
+        Stresses at which the shear rate is not a smooth function of stress (for example a
+        yield stress).  Numerical integrations over stress split their panels there.
+        """
+        return ()
+
+    def _rate_bracket(self,tau):
+        """
+        Shear rates (lo, hi) expected to bracket the solution of rate*calc_visc(rate) = tau for
+        stresses tau >= 0, from the asymptotes of the model.  shear_rate_from_stress checks and
+        widens them, so they need not be exact.  This default knows nothing about the model.
+        """
+        return 0.*tau, np.maximum(tau,1.)
+
+    def shear_rate_from_stress(self,tau):
+        """
+        Computes the shear rate at which the stress rate*calc_visc(rate) equals tau.
+        Accepts scalars or arrays; stresses at or below zero give a zero shear rate.
+        This default is a vectorized safeguarded Newton solve that uses the analytic
+        stress derivative of the model from dvisc_drate, inside the bracket _rate_bracket
+        widened where needed (scalars go through brentq on the same bracket, with the same
+        relative tolerance, so tiny rates are as accurate as large ones).  Models with
+        an exact inverse override it.
+        """
+        tau = np.maximum(np.asarray(tau,dtype=float),0.)
+        if tau.ndim == 0 and not np.isfinite(tau):
+            # As on the array path a NaN stress gives a NaN shear rate and an infinite one infinity
+            return float(tau)
+        stress = lambda rate: rate*self.calc_visc(rate) - tau
+        lo, hi = roots.expand_bracket(stress,*self._rate_bracket(tau))
+        if tau.ndim == 0:
+            # A single stress is cheaper through brentq than through array bookkeeping
+            if tau <= 0.:
+                return 0.
+            if lo == hi:
+                return float(lo)
+            start = instrument.start()
+            x, r = spo.brentq(stress,float(lo),float(hi),xtol=1.e-300,rtol=1.e-12,full_output=True)
+            instrument.count('brentq',iterations=r.iterations,evaluations=r.function_calls,since=start)
+            return x
+        return roots.newton_bracketed(stress,self._dstress_drate,lo,hi)
     
 
 class newtonian(property_plot):
@@ -50,8 +253,22 @@ class newtonian(property_plot):
         return str(self.name+'\n'+
             'mu ='+str(self.mu)+'\n')
         
+    @instrument.counted('calc_visc',points=1)
     def calc_visc(self,rate):
-        return self.mu
+        rate = np.asarray(rate,dtype=float)
+        return self.mu + 0.*rate
+
+    def dvisc_drate(self,rate):
+        rate = np.asarray(rate,dtype=float)
+        return 0.*rate
+
+    def d2visc_drate2(self,rate):
+        rate = np.asarray(rate,dtype=float)
+        return 0.*rate
+
+    def shear_rate_from_stress(self,tau):
+        tau = np.maximum(np.asarray(tau,dtype=float),0.)
+        return tau/self.mu
 
 class power_law(property_plot):
     def __init__(self,name='Default',k=1.,n=.5):
@@ -64,8 +281,22 @@ class power_law(property_plot):
             'k ='+str(self.k)+'\n'+
             'n='+str(self.n)+'\n')
         
+    @instrument.counted('calc_visc',points=1)
     def calc_visc(self,rate):
+        rate = np.asarray(rate,dtype=float)
         return self.k*(rate+1.e-9)**(self.n-1.)
+
+    def dvisc_drate(self,rate):
+        rate = np.asarray(rate,dtype=float)
+        return self.k*(self.n-1.)*(rate+1.e-9)**(self.n-2.)
+
+    def d2visc_drate2(self,rate):
+        rate = np.asarray(rate,dtype=float)
+        return self.k*(self.n-1.)*(self.n-2.)*(rate+1.e-9)**(self.n-3.)
+
+    def shear_rate_from_stress(self,tau):
+        tau = np.maximum(np.asarray(tau,dtype=float),0.)
+        return (tau/self.k)**(1./self.n)
     
 class carreau(property_plot):
     def __init__(self,name='Default',eta0=10.,etainf=.1,reltime=1.,a=2.,n=.5):
@@ -84,8 +315,37 @@ class carreau(property_plot):
             'a ='+str(self.a)+'\n'+
             'n='+str(self.n)+'\n')
             
+    @instrument.counted('calc_visc',points=1)
     def calc_visc(self,rate):
+        rate = np.asarray(rate,dtype=float)
         return self.etainf + (self.eta0-self.etainf)/(1.0+(self.reltime*rate)**self.a)**((1.-self.n)/self.a)
+
+    def _rate_bracket(self,tau):
+        # For n <= 1 the viscosity falls from eta0 to etainf, and with etainf = 0 it stays above
+        # eta0*2**((n-1)/a)*max(1,reltime*rate)**(n-1)
+        if self.n > 1. or min(self.eta0,self.etainf) < 0.:
+            return super()._rate_bracket(tau)
+        lo = tau/max(self.eta0,self.etainf)
+        if self.etainf > 0.:
+            return lo, tau/min(self.eta0,self.etainf)
+        eta = self.eta0*2.**((self.n-1.)/self.a)
+        tau_1 = eta/self.reltime
+        return lo, np.where(tau<=tau_1,tau/eta,(tau/(eta*self.reltime**(self.n-1.)))**(1./self.n))
+
+    def dvisc_drate(self,rate):
+        rate = np.asarray(rate,dtype=float)
+        x = (self.reltime*rate)**self.a
+        with np.errstate(divide='ignore'):
+            return -(self.eta0-self.etainf)*(1.-self.n)*self.reltime**self.a*rate**(self.a-1.)/ \
+                (1.+x)**((1.-self.n)/self.a+1.)
+
+    def d2visc_drate2(self,rate):
+        rate = np.asarray(rate,dtype=float)
+        x = (self.reltime*rate)**self.a
+        p = (1.-self.n)/self.a
+        with np.errstate(divide='ignore',invalid='ignore'):
+            return -(self.eta0-self.etainf)*(1.-self.n)*self.reltime**self.a*rate**(self.a-2.)* \
+                ((self.a-1.)*(1.+x) - (p+1.)*self.a*x)/(1.+x)**(p+2.)
     
 class herschel_bulkley(property_plot):
     """
@@ -107,11 +367,44 @@ class herschel_bulkley(property_plot):
             'n='+str(self.n)+'\n'+
             'm=',str(self.m)+'\n'  )
         
+    @instrument.counted('calc_visc',points=1)
     def calc_visc(self,rate):
+        rate = np.asarray(rate,dtype=float)
         if self.m_flag==0.:
             return self.tauy/(rate+1.e-9) + self.k*(rate+1.e-9)**(self.n-1.)
         if self.m_flag==1:
             return (1.-np.exp(-self.m*rate))*self.tauy/(rate+1.e-9) + self.k*(rate+1.e-9)**(self.n-1.)
+
+    def dvisc_drate(self,rate):
+        eps = 1.e-9
+        rate = np.asarray(rate,dtype=float)
+        e = np.exp(-self.m*rate) if self.m_flag==1 else 0.*rate
+        return self.m*e*self.tauy/(rate+eps) - (1.-e)*self.tauy/(rate+eps)**2 + \
+            self.k*(self.n-1.)*(rate+eps)**(self.n-2.)
+
+    def d2visc_drate2(self,rate):
+        eps = 1.e-9
+        rate = np.asarray(rate,dtype=float)
+        e = np.exp(-self.m*rate) if self.m_flag==1 else 0.*rate
+        return -self.m**2*e*self.tauy/(rate+eps) - 2.*self.m*e*self.tauy/(rate+eps)**2 + \
+            2.*(1.-e)*self.tauy/(rate+eps)**3 + self.k*(self.n-1.)*(self.n-2.)*(rate+eps)**(self.n-3.)
+
+    def _stress_breakpoints(self):
+        return (self.tauy,)
+
+    def _rate_bracket(self,tau):
+        # tauy*(1-exp(-m*rate)) + k*rate**n <= stress <= tauy + k*rate**n
+        lo = (np.maximum(tau-self.tauy,0.)/self.k)**(1./self.n)
+        hi = (tau/self.k)**(1./self.n)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            hi = np.where(tau<self.tauy,np.minimum(hi,-np.log1p(-tau/self.tauy)/self.m),hi)
+        return lo, hi
+
+    def shear_rate_from_stress(self,tau):
+        if self.m_flag==0:
+            tau = np.maximum(np.asarray(tau,dtype=float),0.)
+            return (np.maximum(tau-self.tauy,0.)/self.k)**(1./self.n)
+        return super().shear_rate_from_stress(tau)
     
 class three_component(property_plot):
     """
@@ -133,7 +426,9 @@ class three_component(property_plot):
             'eta_bg='+str(self.eta_bg)+'\n'+
             'm=',str(self.m)+'\n')
         
+    @instrument.counted('calc_visc',points=1)
     def calc_visc(self,rate):
+        rate = np.asarray(rate,dtype=float)
         if self.m_flag==0:
             return self.tauy/(rate+1.e-9) + self.tauy/(rate+1.e-9)*(rate/self.gamma_crit)**0.5 + (self.eta_bg)
         if self.m_flag==1:
@@ -141,6 +436,50 @@ class three_component(property_plot):
                 self.tauy/(rate+1.e-9)*(rate/self.gamma_crit)**0.5 + \
                 (self.eta_bg)
 
+    def dvisc_drate(self,rate):
+        eps = 1.e-9
+        rate = np.asarray(rate,dtype=float)
+        e = np.exp(-self.m*rate) if self.m_flag==1 else 0.*rate
+        with np.errstate(divide='ignore'):
+            return self.m*e*self.tauy/(rate+eps) - (1.-e)*self.tauy/(rate+eps)**2 + \
+                self.tauy/self.gamma_crit**0.5*(0.5/(rate**0.5*(rate+eps)) - rate**0.5/(rate+eps)**2)
+
+    def d2visc_drate2(self,rate):
+        eps = 1.e-9
+        rate = np.asarray(rate,dtype=float)
+        e = np.exp(-self.m*rate) if self.m_flag==1 else 0.*rate
+        with np.errstate(divide='ignore'):
+            return -self.m**2*e*self.tauy/(rate+eps) - 2.*self.m*e*self.tauy/(rate+eps)**2 + \
+                2.*(1.-e)*self.tauy/(rate+eps)**3 + self.tauy/self.gamma_crit**0.5* \
+                (-0.25/(rate**1.5*(rate+eps)) - 1./(rate**0.5*(rate+eps)**2) + 2.*rate**0.5/(rate+eps)**3)
+
+    def _stress_breakpoints(self):
+        return (self.tauy,)
+
+    def _rate_bracket(self,tau):
+        # The stress lies between tauy*(1-exp(-m*rate)) and tauy plus
+        # tauy*sqrt(rate/gamma_crit) + eta_bg*rate, a quadratic in sqrt(rate)
+        b = self.tauy/self.gamma_crit**0.5
+        def root(c):
+            with np.errstate(invalid='ignore'):
+                return np.where(c>0.,2.*c/(b + np.sqrt(b**2 + 4.*self.eta_bg*c)),0.)**2
+        lo = root(np.maximum(tau-self.tauy,0.))
+        hi = root(tau)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            hi = np.where(tau<self.tauy,np.minimum(hi,-np.log1p(-tau/self.tauy)/self.m),hi)
+        return lo, hi
+
+    def shear_rate_from_stress(self,tau):
+        if self.m_flag==0:
+            # Quadratic in sqrt(rate): eta_bg*s**2 + tauy/sqrt(gamma_crit)*s + tauy - tau = 0
+            tau = np.maximum(np.asarray(tau,dtype=float),0.)
+            b = self.tauy/self.gamma_crit**0.5
+            c = np.maximum(tau-self.tauy,0.)
+            with np.errstate(invalid='ignore'):
+                s = np.where(c>0.,2.*c/(b + np.sqrt(b**2 + 4.*self.eta_bg*c)),0.)
+            return s[()]**2
+        return super().shear_rate_from_stress(tau)
+
 class bi_power_law(property_plot):
     def __init__(self,name='Default',k_low=1.,n_low=.9,k_high=1.,n_high=.5):
         self.name = name
@@ -148,7 +487,6 @@ class bi_power_law(property_plot):
         self.k_high = k_high
         self.n_low = n_low
         self.n_high = n_high
-        self.rate_switch = 10.**(np.log10(self.k_high/self.k_low)/(self.n_low-self.n_high))
     
     def __str__(self):
         return str(self.name+'\n'+
@@ -157,11 +495,90 @@ class bi_power_law(property_plot):
                    'n_low ='+str(self.n_low)+'\n'+
                    'n_high ='+str(self.n_high)+'\n'+'\n')
     
+    @property
+    def rate_switch(self):
+        """
+        Shear rate where the low and high rate power laws intersect.
+        Derived from the parameters so it cannot go stale if they are changed.
+        """
+        return 10.**(np.log10(self.k_high/self.k_low)/(self.n_low-self.n_high))
+
+    @instrument.counted('calc_visc',points=1)
     def calc_visc(self,rate):
         eps = 1.e-9
-        self.rate_switch = 10.**(np.log10(self.k_high/self.k_low)/(self.n_low-self.n_high))
-        if (rate >= self.rate_switch):
-            return self.k_high*(rate+eps)**(self.n_high-1.)
-        else:
-            return self.k_low*(rate+eps)**(self.n_low-1.)
+        rate = np.asarray(rate,dtype=float)
+        high = rate >= self.rate_switch
+        return np.where(high, self.k_high*(rate+eps)**(self.n_high-1.),
+                        self.k_low*(rate+eps)**(self.n_low-1.))[()]
+
+    def dvisc_drate(self,rate):
+        eps = 1.e-9
+        rate = np.asarray(rate,dtype=float)
+        high = rate >= self.rate_switch
+        return np.where(high, self.k_high*(self.n_high-1.)*(rate+eps)**(self.n_high-2.),
+                        self.k_low*(self.n_low-1.)*(rate+eps)**(self.n_low-2.))[()]
+
+    def d2visc_drate2(self,rate):
+        eps = 1.e-9
+        rate = np.asarray(rate,dtype=float)
+        high = rate >= self.rate_switch
+        return np.where(high, self.k_high*(self.n_high-1.)*(self.n_high-2.)*(rate+eps)**(self.n_high-3.),
+                        self.k_low*(self.n_low-1.)*(self.n_low-2.)*(rate+eps)**(self.n_low-3.))[()]
+
+    def _stress_breakpoints(self):
+        return (self.k_high*self.rate_switch**self.n_high,)
+
+    def shear_rate_from_stress(self,tau):
+        tau = np.maximum(np.asarray(tau,dtype=float),0.)
+        tau_switch = self.k_high*self.rate_switch**self.n_high
+        return np.where(tau >= tau_switch, (tau/self.k_high)**(1./self.n_high),
+                        (tau/self.k_low)**(1./self.n_low))[()]
+
+
+class _frozen:
+    """
+    Mixin for the immutable model variants: attributes cannot be set after construction,
+    and equality and hashing follow fingerprint().  Only frozen models compare by value; a
+    frozen model never equals a mutable one, which keeps identity equality and hashing, so
+    compare fingerprint() values to match the two.
+    """
+    def __init__(self,*args,**kwargs):
+        self.__dict__.update(vars(self._model(*args,**kwargs)))
+
+    def __setattr__(self,name,value):
+        raise AttributeError(type(self).__name__+' is immutable, use a '+self._model.__name__+' model instead')
+
+    def __delattr__(self,name):
+        raise AttributeError(type(self).__name__+' is immutable, use a '+self._model.__name__+' model instead')
+
+    def __eq__(self,other):
+        if not isinstance(other,_frozen):
+            return NotImplemented
+        return self.fingerprint() == other.fingerprint()
+
+    def __hash__(self):
+        return hash(self.fingerprint())
+
+    def frozen(self):
+        return self
+
+class frozen_newtonian(_frozen,newtonian):
+    _model = newtonian
+
+class frozen_power_law(_frozen,power_law):
+    _model = power_law
+
+class frozen_carreau(_frozen,carreau):
+    _model = carreau
+
+class frozen_herschel_bulkley(_frozen,herschel_bulkley):
+    _model = herschel_bulkley
+
+class frozen_three_component(_frozen,three_component):
+    _model = three_component
+
+class frozen_bi_power_law(_frozen,bi_power_law):
+    _model = bi_power_law
 
+_frozen_classes = {cls._model:cls for cls in (frozen_newtonian,frozen_power_law,frozen_carreau,
+                                              frozen_herschel_bulkley,frozen_three_component,frozen_bi_power_law)}
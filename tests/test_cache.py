@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from rheoflow import pipe, viscosity, cache, profile
+
+
+def test_curve_unaffected_by_model_changed_in_place():
+    cache.clear()
+    fluid = viscosity.carreau(eta0=10.)
+    q = pipe.laminar(viscosity=fluid,pressure_drop=1.e7).q
+    fluid.eta0 = 100.
+    assert pipe.laminar(viscosity=fluid,pressure_drop=1.e7).q < q
+    assert np.isclose(pipe.laminar(viscosity=viscosity.carreau(eta0=10.),pressure_drop=1.e7).q,q,rtol=1.e-12)
+
+
+@pytest.mark.parametrize('fluid',[viscosity.carreau(eta0=10.,etainf=.01,reltime=1.,a=2.,n=.3),
+                                  viscosity.three_component(tauy=5.,gamma_crit=2.,eta_bg=.05),
+                                  viscosity.bi_power_law(k_low=1.,n_low=.8,k_high=.5,n_high=.4)])
+@pytest.mark.parametrize('m',[1,2])
+def test_master_curve_matches_flow_function(fluid,m):
+    curve = cache.master_curve(fluid,m=m)
+    tauw = np.logspace(-2,4,37)*1.0137
+    phi = curve.phi(tauw)
+    exact = profile.flow_function(fluid,tauw,m)
+    assert np.allclose(phi,exact,rtol=2.e-8,atol=0.)
+    positive = exact > 0.
+    assert np.allclose(curve.tauw(exact[positive]),tauw[positive],rtol=2.e-8,atol=0.)
+
+
+def test_master_curve_power_law_closed_form():
+    # Phi_2 = n/(3n+1) (tauw/k)**(1/n) and Phi_1 = n/(2n+1) (tauw/k)**(1/n)
+    k, n = 2., .4
+    tauw = np.array([.1,3.,70.,2000.])
+    for m,c in ((2,n/(3.*n+1.)),(1,n/(2.*n+1.))):
+        curve = cache.master_curve(viscosity.power_law(k=k,n=n),m=m)
+        assert np.allclose(curve.phi(tauw),c*(tauw/k)**(1./n),rtol=2.e-8,atol=0.)
+        assert np.allclose(curve.tauw(c*(tauw/k)**(1./n)),tauw,rtol=2.e-8,atol=0.)
+
+
+def test_master_curve_below_yield_is_zero():
+    curve = cache.master_curve(viscosity.herschel_bulkley(tauy=5.,k=.5,n=.6,m_flag=0))
+    assert np.all(curve.phi(np.array([0.,1.,4.9])) == 0.)
+    assert np.all(curve.phi(np.array([5.5,50.])) > 0.)
+    assert curve.tauw(0.) == 0.
+
+
+def test_get_curve_shares_and_evicts():
+    cache.clear()
+    cache.configure(maxsize=2)
+    try:
+        a = cache.get_curve(viscosity.carreau(eta0=10.))
+        assert cache.get_curve(viscosity.carreau(eta0=10.).calc_visc) is a
+        cache.get_curve(viscosity.carreau(eta0=20.))
+        cache.get_curve(viscosity.carreau(eta0=30.))
+        assert cache.get_curve(viscosity.carreau(eta0=10.)) is not a
+    finally:
+        cache.configure(maxsize=64)
+        cache.clear()
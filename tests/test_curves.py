@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from rheoflow import pipe, slit, viscosity
+
+_mu = .5
+
+
+def test_visc_and_stress_curves():
+    k, n = 2., .4
+    fluid = viscosity.power_law(k=k,n=n)
+    rate, visc = fluid.visc_curve()
+    assert rate.size == 51
+    assert np.isclose(rate[0],.001,rtol=1.e-14) and np.isclose(rate[-1],1.e4,rtol=1.e-14)
+    assert np.allclose(np.diff(np.log(rate)),np.log(10.)*7./50.,rtol=1.e-12)
+    # calc_visc shifts the rate by 1e-9
+    assert np.allclose(visc,k*(rate+1.e-9)**(n-1.),rtol=1.e-14)
+    rate, stress = fluid.stress_curve(5,1.,100.)
+    assert np.allclose(rate,[1.,10.**.5,10.,10.**1.5,100.],rtol=1.e-14)
+    assert np.allclose(stress,k*rate*(rate+1.e-9)**(n-1.),rtol=1.e-14)
+
+
+@pytest.mark.parametrize('cls',[pipe.laminar,pipe.laminar_HB_analytical])
+def test_pipe_curves_newtonian(cls):
+    # Hagen-Poiseuille: Q = pi R^4 dp/(8 mu L), vz = dp/(4 mu L) (R^2-r^2), rate = dp r/(2 mu L)
+    fluid = viscosity.newtonian(mu=_mu) if cls is pipe.laminar else viscosity.herschel_bulkley(tauy=0.,k=_mu,n=1.,m_flag=0)
+    radius, length, dp = .02, 2., 5.e3
+    flow = cls(viscosity=fluid,radius=radius,length=length,pressure_drop=dp)
+    x, q = flow.q_curve(1.e2,1.e5,7)
+    assert np.allclose(x,np.logspace(2,5,7),rtol=1.e-14)
+    assert np.allclose(q,np.pi*radius**4*x/(8.*_mu*length),rtol=1.e-12)
+    r, vz = flow.vz_curve(11)
+    assert np.allclose(r,np.linspace(0.,radius,11),rtol=1.e-14)
+    assert np.allclose(vz,dp/(4.*_mu*length)*(radius**2-r**2),rtol=1.e-12,atol=1.e-15)
+    r, rate = flow.shear_rate_curve(11)
+    assert np.allclose(rate,dp*r/(2.*_mu*length),rtol=1.e-12,atol=0.)
+
+
+def test_pipe_q_curve_numerical():
+    flow = pipe.laminar(viscosity=viscosity.carreau(),radius=.02,length=2.)
+    x, q = flow.q_curve(1.e2,1.e5,4)
+    for dp,value in zip(x,q):
+        flow.pressure_drop = dp
+        assert np.isclose(flow.q,value,rtol=1.e-12)
+
+
+def test_slit_curves_newtonian():
+    # Half height h: Q = 2 W h^3 dp/(3 mu L), vz = dp/(2 mu L) (h^2-y^2), rate = dp y/(mu L)
+    h, width, length, dp = .01, .2, 2., 5.e3
+    flow = slit.laminar(viscosity=viscosity.newtonian(mu=_mu),height=2.*h,width=width,length=length,pressure_drop=dp)
+    x, q = flow.q_curve(1.e2,1.e5,7)
+    assert np.allclose(q,2.*width*h**3*x/(3.*_mu*length),rtol=1.e-12)
+    y, vz = flow.vz_curve(11)
+    assert np.allclose(y,np.linspace(0.,h,11),rtol=1.e-14)
+    assert np.allclose(vz,dp/(2.*_mu*length)*(h**2-y**2),rtol=1.e-12,atol=1.e-15)
+    y, rate = flow.shear_rate_curve(11)
+    assert np.allclose(rate,dp*y/(_mu*length),rtol=1.e-12,atol=0.)
+
+
+def test_plots_draw_the_curves():
+    matplotlib = pytest.importorskip('matplotlib')
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    fluid = viscosity.carreau()
+    plt.figure()
+    fluid.visc_plot(11)
+    assert np.array_equal(plt.gca().lines[-1].get_xydata(),np.column_stack(fluid.visc_curve(11)))
+    flow = pipe.laminar(viscosity=fluid,pressure_drop=1.e4)
+    plt.figure()
+    flow.q_plot(1.e2,1.e5,5)
+    x, q = flow.q_curve(1.e2,1.e5,5)
+    assert np.array_equal(plt.gca().lines[-1].get_xydata(),np.column_stack((q,x)))
+    plt.close('all')
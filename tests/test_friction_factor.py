@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+
+from rheoflow import viscosity, friction_factor_property
+
+
+@pytest.mark.parametrize('solver',['fsolve','bracketed'])
+def test_velocity_sweep_matches_vectorized_solve(solver):
+    fluid = viscosity.power_law(k=.05,n=.6)
+    u = np.logspace(-2,1,60)
+    reference = friction_factor_property.solve_velocity(fluid,1000.,.05,10.,u)
+    ff = friction_factor_property.friction_factor('test',1000.,.05,10.,fluid.calc_visc,solver=solver)
+    for x,dp in zip(u,reference['pressure_drop']):
+        ff.u = x
+        assert ff.solve_info['converged']
+        assert np.isclose(ff.pressure_drop,dp,rtol=1.e-8)
+    for x,dp in zip(u,reference['pressure_drop']):
+        ff.pressure_drop = dp
+        assert np.isclose(ff.u,x,rtol=1.e-8)
+
+
+def test_fsolve_reports_iterations():
+    ff = friction_factor_property.friction_factor('test',1000.,.05,10.,viscosity.carreau().calc_visc)
+    ff.u = 1.
+    assert ff.solve_info['method'] == 'fsolve'
+    assert ff.solve_info['iterations'] > 0
+
+
+@pytest.mark.parametrize('visc',[viscosity.carreau(eta0=10.,etainf=.01,reltime=1.,a=2.,n=.3),
+                                 viscosity.three_component(tauy=5.,gamma_crit=2.,eta_bg=.05),
+                                 viscosity.herschel_bulkley(tauy=5.,k=1.,n=.5)])
+def test_dnprime_dtau_matches_difference(visc):
+    tauw = np.logspace(-1,3,9)
+    h = 1.e-5
+    difference = (friction_factor_property._nprime(visc,tauw*(1.+h)) -
+                  friction_factor_property._nprime(visc,tauw*(1.-h)))/(2.*h*tauw)
+    rate = viscosity.invert_stress(visc,tauw)
+    assert np.allclose(friction_factor_property._dnprime_dtau(visc.calc_visc,rate),difference,rtol=1.e-6,atol=0.)
+
+
+@pytest.mark.parametrize('u',[10.,30.])
+def test_yield_stress_fluid_matches_bracketed(u):
+    # fsolve probes NaN wall stresses here, which must not abort the solve
+    fluid = viscosity.herschel_bulkley(tauy=1.,k=.05,n=.6)
+    bracketed = friction_factor_property.friction_factor('x',1000.,.05,10.,fluid.calc_visc,solver='bracketed')
+    bracketed.u = u
+    ff = friction_factor_property.friction_factor('x',1000.,.05,10.,fluid.calc_visc)
+    ff.u = u
+    assert ff.solve_info['converged']
+    assert np.isclose(ff.pressure_drop,bracketed.pressure_drop,rtol=1.e-8)
+    if u == 10.:
+        assert np.isclose(ff.pressure_drop,68703.78,rtol=1.e-6)
+
+
+def test_raising_fsolve_falls_back_to_bracketed():
+    fluid = viscosity.power_law(k=.05,n=.6)
+    def strict(rate):
+        rate = np.asarray(rate,dtype=float)
+        if np.any(~(rate >= 0.)):
+            raise ValueError('negative or NaN shear rate')
+        return fluid.calc_visc(rate)
+    ff = friction_factor_property.friction_factor('x',1000.,.05,10.,strict)
+    bracketed = friction_factor_property.friction_factor('x',1000.,.05,10.,strict,solver='bracketed')
+    # At U = 50 fsolve steps to a negative shear rate and strict raises
+    for u in (1.,50.):
+        ff.u = u
+        bracketed.u = u
+        assert ff.solve_info['method'] == 'brentq' and ff.solve_info['converged']
+        assert np.isclose(ff.pressure_drop,bracketed.pressure_drop,rtol=1.e-10)
+
+
+def test_dodge_metzner_laminar_and_turbulent():
+    re = np.array([[100.,1999.],[1.e4,1.e6]])
+    nprime = np.array([[.4,1.],[.3,.8]])
+    f = friction_factor_property.dodge_metzner(re,nprime)
+    assert f.shape == (2,2)
+    assert np.allclose(f[0],16./(re[0]+1.e-9),rtol=1.e-14)
+    # The turbulent points satisfy 1/sqrt(f) = 4/n'**0.75*log10(Re*f**(1-n'/2)) - 0.4/n'**1.2
+    n = nprime[1]
+    assert np.allclose(1./np.sqrt(f[1]),4./n**.75*np.log10(re[1]*f[1]**(1.-n/2.))-.4/n**1.2,rtol=1.e-13)
+    for i in range(2):
+        for j in range(2):
+            assert friction_factor_property.dodge_metzner(re[i,j],nprime[i,j]) == f[i,j]
+
+
+def test_dodge_metzner_newtonian_is_nikuradse():
+    # For n'=1 the correlation is the smooth pipe law 1/sqrt(f) = 4 log10(Re sqrt(f)) - 0.4
+    re = np.logspace(np.log10(2.1e3),8,12)
+    f = friction_factor_property.dodge_metzner(re,1.)
+    assert np.allclose(1./np.sqrt(f),4.*np.log10(re*np.sqrt(f))-.4,rtol=1.e-13)
+    assert np.isclose(friction_factor_property.dodge_metzner(1.e5,1.),.004499,rtol=1.e-3)
+
+
+def test_dodge_metzner_explicit_error_bound():
+    re, nprime = np.meshgrid(np.logspace(np.log10(2000.),10,60),np.linspace(.05,1.,40))
+    exact = friction_factor_property.dodge_metzner(re,nprime)
+    approximate = friction_factor_property.dodge_metzner_explicit(re,nprime)
+    assert np.max(np.abs(approximate/exact-1.)) < 2.e-6
+    laminar = np.array([10.,500.,1999.])
+    assert np.all(friction_factor_property.dodge_metzner_explicit(laminar,.5) == 16./(laminar+1.e-9))
+
+
+def test_explicit_friction_model_pressure_drop():
+    fluid = viscosity.power_law(k=.05,n=.6)
+    u = np.logspace(-1,1,9)
+    exact = friction_factor_property.solve_velocity(fluid,1000.,.05,10.,u)
+    approximate = friction_factor_property.solve_velocity(fluid,1000.,.05,10.,u,friction_model='dm_explicit')
+    assert np.allclose(approximate['pressure_drop'],exact['pressure_drop'],rtol=2.e-6,atol=0.)
+    ff = friction_factor_property.friction_factor('test',1000.,.05,10.,fluid.calc_visc,friction_model='dm_explicit')
+    ff.u = u[-1]
+    assert np.isclose(ff.pressure_drop,approximate['pressure_drop'][-1],rtol=1.e-8)
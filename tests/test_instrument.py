@@ -0,0 +1,64 @@
+import numpy as np
+
+from rheoflow import instrument, pipe, viscosity, cache
+
+
+def test_calc_visc_counts_points():
+    fluid = viscosity.carreau()
+    fluid.calc_visc(1.)
+    with instrument.record() as counters:
+        fluid.calc_visc(np.ones((2,5)))
+        fluid.calc_visc(np.ones(10))
+        fluid.calc_visc(1.)
+    counter = counters.counts[('-','calc_visc')]
+    assert counter['calls'] == 3
+    assert counter['evaluations'] == 21
+    assert counter['seconds'] > 0.
+    assert list(counters.counts) == [('-','calc_visc')]
+
+
+def test_events_attributed_to_innermost_operation():
+    cache.clear()
+    with instrument.record() as counters:
+        pipe.laminar(viscosity=viscosity.carreau(),q=1.e-4)
+    operations = {operation for operation,event in counters.counts}
+    assert 'pipe.laminar.q' in operations
+    assert counters.counts[('pipe.laminar.q','total')]['calls'] == 1
+    assert counters.counts[('pipe.laminar.q','master_curve')]['evaluations'] > 0
+    assert counters.counts[('pipe.laminar.q','quadrature')]['evaluations'] > 0
+    assert counters.counts[('pipe.laminar.q','calc_visc')]['evaluations'] > 0
+    assert ('-','total') not in counters.counts
+
+
+def test_solver_iterations():
+    q = np.logspace(-6,-3,7)
+    flow = pipe.laminar_HB_analytical(viscosity=viscosity.herschel_bulkley(tauy=5.,k=.5,n=.6,m_flag=0))
+    with instrument.record() as counters:
+        flow.dp_from_q(q)
+        # A plain viscosity function is inverted by brentq, one solve per point
+        pipe.laminar(viscosity=lambda rate: 1.+0.*rate).shear_rate(np.array([.001,.002,.003]),100.)
+    newton = counters.counts[('pipe.laminar_HB_analytical.dp_from_q','newton')]
+    assert newton['calls'] == 1
+    assert newton['evaluations'] == q.size
+    assert 0 < newton['iterations'] < 20
+    brentq = counters.counts[('pipe.laminar.shear_rate','brentq')]
+    assert brentq['calls'] == 3
+    assert brentq['iterations'] > 0
+    assert brentq['evaluations'] >= brentq['iterations']
+
+
+def test_nested_recorders_and_report():
+    fluid = viscosity.power_law()
+    with instrument.record() as outer:
+        fluid.calc_visc(np.ones(4))
+        with instrument.record() as inner:
+            fluid.calc_visc(np.ones(3))
+    assert outer.counts[('-','calc_visc')]['evaluations'] == 7
+    assert inner.counts[('-','calc_visc')]['evaluations'] == 3
+    rows = outer.report()
+    assert rows == sorted(rows,key=lambda row: (row['operation'],row['event']))
+    assert rows[0]['calls'] == 2
+    assert str(outer).splitlines()[0].split() == ['operation','event','calls','iterations','evaluations','seconds']
+    # Nothing is collected outside record()
+    fluid.calc_visc(np.ones(5))
+    assert outer.counts[('-','calc_visc')]['evaluations'] == 7
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from rheoflow import pipe, slit, viscosity
+
+_k, _n = 2., .4
+
+
+def _flow(kind,fluid):
+    if kind == 'pipe':
+        return pipe.laminar(viscosity=fluid,radius=.02,length=2.,pressure_drop=5.e3), 'radius'
+    return slit.laminar(viscosity=fluid,height=.02,width=.2,length=2.,pressure_drop=5.e3), 'height'
+
+
+def _stress(kind,position,dp):
+    # Local shear stress, dp/L*r/2 in a tube and dp/L*y in a slit
+    return dp/2.*position/(2. if kind == 'pipe' else 1.)
+
+
+@pytest.fixture
+def inversions(monkeypatch):
+    calls = []
+    invert_stress = viscosity.invert_stress
+    def counted(visc,tau):
+        calls.append(np.size(tau))
+        return invert_stress(visc,tau)
+    monkeypatch.setattr(viscosity,'invert_stress',counted)
+    return calls
+
+
+@pytest.mark.parametrize('kind',['pipe','slit'])
+def test_shear_rate_memo(kind,inversions):
+    fluid = viscosity.power_law(k=_k,n=_n)
+    flow, geometry = _flow(kind,fluid)
+    position = np.linspace(0.,.01,6)
+    rate = flow.shear_rate(position,5.e3)
+    assert np.allclose(rate,(_stress(kind,position,5.e3)/_k)**(1./_n),rtol=1.e-12,atol=0.)
+    count = len(inversions)
+    again = flow.shear_rate(position,5.e3)
+    assert len(inversions) == count
+    assert np.array_equal(again,rate)
+    # Callers get copies
+    again[:] = -1.
+    assert np.array_equal(flow.shear_rate(position,5.e3),rate)
+    # A fluid changed in place misses the memo
+    fluid.k = 2.*_k
+    assert np.allclose(flow.shear_rate(position,5.e3),(_stress(kind,position,5.e3)/(2.*_k))**(1./_n),rtol=1.e-12,atol=0.)
+    assert len(inversions) == count+1
+    # So does a geometry change
+    setattr(flow,geometry,getattr(flow,geometry))
+    flow.shear_rate(position,5.e3)
+    assert len(inversions) == count+2
+
+
+@pytest.mark.parametrize('kind',['pipe','slit'])
+def test_shear_rate_memo_is_bounded(kind,inversions):
+    flow, geometry = _flow(kind,viscosity.carreau())
+    size = type(flow).shear_rate_memo_size
+    dp = 1.e3*(1.+np.arange(size+1))
+    for x in dp:
+        flow.shear_rate(.01,x)
+    count = len(inversions)
+    flow.shear_rate(.01,dp[-1])
+    assert len(inversions) == count
+    # The least recently used entry was evicted
+    flow.shear_rate(.01,dp[0])
+    assert len(inversions) == count+1
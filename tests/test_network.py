@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from rheoflow import network, viscosity, friction_factor_property
+
+_mu = .5
+_water = viscosity.newtonian(mu=_mu)
+
+
+def _resistance(diameter,length):
+    # Hagen-Poiseuille: dp = 128 mu L Q/(pi D^4)
+    return 128.*_mu*length/(np.pi*diameter**4)
+
+
+def test_series():
+    net = network.network()
+    net.add_node('in',pressure=2.e5)
+    net.add_node('mid')
+    net.add_node('out',pressure=0.)
+    net.add_pipe('a','in','mid',diameter=.05,length=100.,viscosity=_water)
+    net.add_pipe('b','mid','out',diameter=.03,length=40.,viscosity=_water)
+    net.solve()
+    r_a, r_b = _resistance(.05,100.), _resistance(.03,40.)
+    q = 2.e5/(r_a+r_b)
+    assert net.solve_info['converged']
+    assert np.isclose(net.flows['a'],q,rtol=1.e-8)
+    assert np.isclose(net.flows['b'],q,rtol=1.e-8)
+    assert np.isclose(net.pressures['mid'],q*r_b,rtol=1.e-8)
+
+
+def test_parallel_with_inflow():
+    # A fixed inflow splits between two pipes in inverse proportion to their resistances
+    q = 1.e-3
+    net = network.network()
+    net.add_node('in',inflow=q)
+    net.add_node('out',pressure=1.e5)
+    net.add_pipe('a','in','out',diameter=.05,length=100.,viscosity=_water)
+    net.add_pipe('b','in','out',diameter=.04,length=50.,viscosity=_water)
+    net.solve()
+    r_a, r_b = _resistance(.05,100.), _resistance(.04,50.)
+    dp = q*r_a*r_b/(r_a+r_b)
+    assert np.isclose(net.pressures['in'],1.e5+dp,rtol=1.e-8)
+    assert np.isclose(net.flows['a'],dp/r_a,rtol=1.e-8)
+    assert np.isclose(net.flows['b'],dp/r_b,rtol=1.e-8)
+
+
+def test_loop():
+    # Wheatstone bridge: in -> 1, in -> 2, 1 -> 2, 1 -> out, 2 -> out.  Node balances
+    # (p_in-p1)/r_a = (p1-p2)/r_c + p1/r_d and (p_in-p2)/r_b + (p1-p2)/r_c = p2/r_e
+    p_in = 1.e5
+    d = {'a':.05,'b':.04,'c':.03,'d':.04,'e':.05}
+    ends = {'a':('in','1'),'b':('in','2'),'c':('1','2'),'d':('1','out'),'e':('2','out')}
+    net = network.network()
+    net.add_node('in',pressure=p_in)
+    net.add_node('1')
+    net.add_node('2')
+    net.add_node('out',pressure=0.)
+    for name,(start,end) in ends.items():
+        net.add_pipe(name,start,end,diameter=d[name],length=50.,viscosity=_water)
+    net.solve()
+    g = {name:1./_resistance(d[name],50.) for name in d}
+    matrix = np.array([[g['a']+g['c']+g['d'],-g['c']],[-g['c'],g['b']+g['c']+g['e']]])
+    p1, p2 = np.linalg.solve(matrix,[g['a']*p_in,g['b']*p_in])
+    assert np.isclose(net.pressures['1'],p1,rtol=1.e-8)
+    assert np.isclose(net.pressures['2'],p2,rtol=1.e-8)
+    assert np.isclose(net.flows['c'],(p1-p2)*g['c'],rtol=1.e-6)
+    # Mass is conserved at the outlet
+    assert np.isclose(net.flows['d']+net.flows['e'],net.flows['a']+net.flows['b'],rtol=1.e-10)
+
+
+def test_power_law_series():
+    # dp = 2 k L/R (Q (3n+1)/(pi n R^3))^n for each segment
+    k, n = 2., .4
+    fluid = viscosity.power_law(k=k,n=n)
+    q = 1.e-4
+    net = network.network()
+    net.add_node('in',inflow=q)
+    net.add_node('mid')
+    net.add_node('out',pressure=0.)
+    net.add_pipe('a','in','mid',diameter=.05,length=100.,viscosity=fluid)
+    net.add_pipe('b','mid','out',diameter=.03,length=40.,viscosity=fluid)
+    net.solve()
+    dp = lambda r,l: 2.*k*l/r*(q*(3.*n+1.)/(np.pi*n*r**3))**n
+    assert np.isclose(net.pressure_drops['b'],dp(.015,40.),rtol=1.e-8)
+    assert np.isclose(net.pressures['in'],dp(.025,100.)+dp(.015,40.),rtol=1.e-8)
+
+
+def test_friction_factor_segment_matches_solve_velocity():
+    fluid = viscosity.newtonian(mu=1.e-3)
+    net = network.network()
+    net.add_node('in',pressure=5.e4)
+    net.add_node('out',pressure=0.)
+    net.add_pipe('a','in','out',diameter=.05,length=100.,viscosity=fluid,kind='friction_factor')
+    u = net.flows['a']/(np.pi*.05**2/4.)
+    reference = friction_factor_property.solve_velocity(fluid,1000.,.05,100.,u)
+    assert np.isclose(reference['pressure_drop'],5.e4,rtol=1.e-8)
+
+
+def test_fixed_pressure_required():
+    net = network.network()
+    net.add_node('a',inflow=1.)
+    net.add_node('b',inflow=-1.)
+    net.add_pipe('p','a','b',diameter=.05,length=1.,viscosity=_water)
+    with pytest.raises(ValueError):
+        net.solve()
+
+
+@pytest.mark.parametrize('fluid',[viscosity.newtonian(mu=1.e-3),viscosity.power_law(k=.05,n=.6),
+                                  viscosity.carreau(eta0=.05,reltime=.1)])
+def test_du_ddp_matches_difference(fluid):
+    # Laminar to turbulent; n' is constant or enters only weakly for these fluids
+    dp = np.logspace(1,6,11)
+    h = 1.e-6
+    result = friction_factor_property.solve_pressure_drop(fluid,1000.,.05,10.,dp)
+    difference = (friction_factor_property.solve_pressure_drop(fluid,1000.,.05,10.,dp*(1.+h))['u'] -
+                  friction_factor_property.solve_pressure_drop(fluid,1000.,.05,10.,dp*(1.-h))['u'])/(2.*h*dp)
+    assert np.allclose(result['du_ddp'],difference,rtol=1.e-6,atol=0.)
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+import scipy.integrate as integrate
+
+from rheoflow import pipe, viscosity
+
+
+@pytest.mark.parametrize('cls',[pipe.laminar,pipe.laminar_HB_analytical])
+def test_scale_is_accepted_and_ignored(cls):
+    fluid = viscosity.herschel_bulkley(tauy=0.,k=1.,n=1.,m_flag=0)
+    # The 6th positional argument is still scale, pressure_drop the 7th
+    flow = cls('test',1000.,.01,1.,fluid,1.e3,100.)
+    assert flow.scale == 1.e3
+    assert flow.pressure_drop == 100.
+    assert flow.q == cls(viscosity=fluid,scale=1.,pressure_drop=100.).q
+
+
+@pytest.mark.parametrize('fluid',[viscosity.carreau(),viscosity.power_law(k=2.,n=.4)])
+def test_solve_laminar_accepts_functions(fluid):
+    dp = np.logspace(3,5,5)
+    reference = pipe.solve_laminar(fluid,.02,10.,pressure_drop=dp)
+    for visc in (fluid.calc_visc,lambda rate: fluid.calc_visc(rate)):
+        result = pipe.solve_laminar(visc,.02,10.,pressure_drop=dp)
+        assert np.allclose(result['q'],reference['q'],rtol=1.e-7)
+        assert np.allclose(result['viscosity_wall'],reference['viscosity_wall'],rtol=1.e-7)
+
+
+def test_solve_laminar_power_law_closed_form():
+    # Q = pi R^3 n/(3n+1) (tauw/k)^(1/n), broadcast over arrays of pressure drop and radius
+    k, n = 2., .4
+    radius = np.array([[.01],[.02]])
+    dp = np.logspace(3,5,7)
+    tauw = dp*radius/(2.*10.)
+    reference = np.pi*radius**3*n/(3.*n+1.)*(tauw/k)**(1./n)
+    result = pipe.solve_laminar(viscosity.power_law(k=k,n=n),radius,10.,pressure_drop=dp)
+    assert result.shape == (2,7)
+    assert np.allclose(result['q'],reference,rtol=1.e-10)
+    back = pipe.solve_laminar(viscosity.power_law(k=k,n=n),radius,10.,q=reference)
+    assert np.allclose(back['pressure_drop'],np.broadcast_to(dp,(2,7)),rtol=1.e-10)
+
+
+def test_hb_analytical_buckingham_reiner():
+    # Q = pi R^4 dp/(8 mu L) (1 - 4/3 phi + 1/3 phi^4), phi = tauy/tauw, and no flow for phi >= 1
+    tauy, mu, radius, length = 5., .5, .02, 2.
+    flow = pipe.laminar_HB_analytical(viscosity=viscosity.herschel_bulkley(tauy=tauy,k=mu,n=1.,m_flag=0),
+                                      radius=radius,length=length,pressure_drop=5.e3)
+    dp = np.array([[500.,1000.],[2000.,5.e4]])
+    phi = tauy/(dp*radius/(2.*length))
+    reference = np.where(phi<1.,np.pi*radius**4*dp/(8.*mu*length)*(1.-4./3.*phi+phi**4/3.),0.)
+    assert np.allclose(flow.q_from_dp(dp),reference,rtol=1.e-12,atol=0.)
+    assert flow.q == flow.q_from_dp(5.e3)
+    q = reference[reference>0.]
+    assert np.allclose(flow.dp_from_q(q),dp[reference>0.],rtol=1.e-12)
+    assert np.all(flow.dp_from_q(np.array([0.,-1.])) == 0.)
+
+
+@pytest.mark.parametrize('n',[1.,.5])
+def test_hb_analytical_velocity(n):
+    # Bingham: vz = dp/(4 mu L) (R^2-r^2) - tauy/mu (R-r) outside the plug; in general the
+    # profile integrates to the closed-form flow rate
+    tauy, k, radius, length, dp = 5., .5, .02, 2., 5.e3
+    flow = pipe.laminar_HB_analytical(viscosity=viscosity.herschel_bulkley(tauy=tauy,k=k,n=n,m_flag=0),
+                                      radius=radius,length=length,pressure_drop=dp)
+    r_y = 2.*tauy*length/dp
+    rad = np.linspace(0.,radius,201)
+    vz = flow.vz(rad,dp)
+    assert np.all(vz[rad<=r_y] == vz[0])
+    assert np.allclose([flow.vz(r,dp) for r in rad[::20]],vz[::20],rtol=1.e-14,atol=0.)
+    if n == 1.:
+        s = np.maximum(rad,r_y)
+        assert np.allclose(vz,dp/(4.*k*length)*(radius**2-s**2)-tauy/k*(radius-s),rtol=1.e-12,atol=1.e-15)
+    q = integrate.quad(lambda r: 2.*np.pi*r*flow.vz(r,dp),0.,radius,points=[r_y],epsabs=0.,epsrel=1.e-12)[0]
+    assert np.isclose(q,flow.q,rtol=1.e-10)
+
+
+@pytest.mark.parametrize('fluid',[viscosity.newtonian(mu=.5),viscosity.power_law(k=2.,n=.4),
+                                  viscosity.herschel_bulkley(tauy=5.,k=.5,n=.6,m_flag=0)])
+def test_laminar_routes_hb_fluids_to_closed_form(fluid):
+    hb = viscosity.hb_parameters(fluid)
+    flow = pipe.laminar(viscosity=fluid,radius=.02,length=2.,pressure_drop=5.e3)
+    assert flow.solution_method == 'analytical'
+    assert flow.q == pipe._hb_q(hb,.02,2.,5.e3)
+    rad = np.linspace(0.,.02,5)
+    assert np.allclose(flow.vz(rad,5.e3),pipe._hb_vz(hb,.02,2.,rad,5.e3),rtol=1.e-14,atol=0.)
+    flow.q = flow.q/2.
+    assert flow.solution_method == 'analytical'
+    assert np.isclose(pipe._hb_q(hb,.02,2.,flow.pressure_drop),flow.q,rtol=1.e-12)
+
+
+def test_hb_q_newtonian_and_power_law():
+    # Hagen-Poiseuille Q = pi R^4 dp/(8 mu L) and Q = pi n/(3n+1) (dp/(2kL))^(1/n) R^(1/n+3)
+    dp = np.logspace(2,6,9)
+    assert np.allclose(pipe._hb_q((0.,.5,1.),.02,2.,dp),np.pi*.02**4*dp/(8.*.5*2.),rtol=1.e-12,atol=0.)
+    assert np.allclose(pipe._hb_q((0.,2.,.4),.02,2.,dp),
+                       np.pi*.4/2.2*(dp/(2.*2.*2.))**2.5*.02**5.5,rtol=1.e-12,atol=0.)
+
+
+@pytest.mark.parametrize('hb',[(0.,.5,1.),(0.,2.,.4),(5.,.5,1.),(5.,.5,.6)])
+def test_hb_dp_inverts_hb_q(hb):
+    dp = np.logspace(3.05,6,8)
+    q = pipe._hb_q(hb,.02,2.,dp)
+    assert np.allclose(pipe._hb_dp(hb,.02,2.,q),dp,rtol=1.e-12,atol=0.)
+    assert np.allclose(pipe._hb_dp(hb,.02,2.,q[1:],near=(q[0],dp[0])),dp[1:],rtol=1.e-12,atol=0.)
+    assert np.all(pipe._hb_dp(hb,.02,2.,np.array([0.,-1.])) == 0.)
+
+
+def test_laminar_numerical_for_other_fluids():
+    # A regularized Herschel-Bulkley fluid is solved numerically and lies close to the ideal one
+    ideal = pipe.laminar(viscosity=viscosity.herschel_bulkley(tauy=5.,k=.5,n=.6,m_flag=0),radius=.02,length=2.,
+                         pressure_drop=5.e3)
+    regular = pipe.laminar(viscosity=viscosity.herschel_bulkley(tauy=5.,k=.5,n=.6,m=1.e5),radius=.02,length=2.,
+                           pressure_drop=5.e3)
+    assert regular.solution_method == 'numerical'
+    assert np.isclose(regular.q,ideal.q,rtol=1.e-3)
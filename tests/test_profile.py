@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from rheoflow import pipe, profile, viscosity
+
+_k, _n = 2., .4
+
+
+def _power_law(rate):
+    # A plain function of shear rate, so pipe.laminar takes the numerical path; shifted like
+    # viscosity.power_law so it is finite at rest
+    return _k*(rate+1.e-9)**(_n-1.)
+
+
+@pytest.mark.parametrize('m',[0,1,2])
+def test_stress_moment_power_law(m):
+    # rate(s) = (s/k)**(1/n), so I_m(tau) = tau**(m+1+1/n)/((m+1+1/n)*k**(1/n))
+    tau = np.array([[.5,3.],[10.,0.]])
+    p = m+1.+1./_n
+    assert np.allclose(profile.stress_moment(viscosity.power_law(k=_k,n=_n),tau,m),
+                       tau**p/(p*_k**(1./_n)),rtol=1.e-10,atol=0.)
+
+
+@pytest.mark.parametrize('m',[0,2])
+def test_stress_moment_bingham(m):
+    # rate(s) = (s-tauy)/mu above the yield stress and 0 below it
+    tauy, mu = 5., .5
+    tau = np.array([2.,5.,5.01,7.,40.])
+    s = np.maximum(tau,tauy)
+    expected = ((s**(m+2)-tauy**(m+2))/(m+2)-tauy*(s**(m+1)-tauy**(m+1))/(m+1))/mu
+    assert np.allclose(profile.stress_moment(viscosity.herschel_bulkley(tauy=tauy,k=mu,n=1.,m_flag=0),tau,m),
+                       expected,rtol=1.e-10,atol=1.e-14)
+
+
+def test_flow_function_newtonian():
+    # Hagen-Poiseuille gives Phi_2 = tauw/(4 mu) and the slit formula Phi_1 = tauw/(3 mu)
+    mu = .5
+    tauw = np.array([0.,1.,30.])
+    fluid = viscosity.newtonian(mu=mu)
+    assert np.allclose(profile.flow_function(fluid,tauw,2),tauw/(4.*mu),rtol=1.e-12,atol=0.)
+    assert np.allclose(profile.flow_function(fluid,tauw,1),tauw/(3.*mu),rtol=1.e-12,atol=0.)
+
+
+def test_pipe_laminar_numerical_power_law():
+    # Q = pi n/(3n+1) (dp/(2kL))**(1/n) R**(1/n+3) and vz = n/(n+1) (dp/(2kL))**(1/n) (R**(1+1/n)-r**(1+1/n))
+    radius, length, dp = .02, 2., 5.e3
+    flow = pipe.laminar(viscosity=_power_law,radius=radius,length=length,pressure_drop=dp)
+    g = (dp/(2.*_k*length))**(1./_n)
+    assert np.isclose(flow.q,np.pi*_n/(3.*_n+1.)*g*radius**(1./_n+3.),rtol=1.e-7)
+    rad = np.linspace(0.,radius,7)
+    assert np.allclose(flow.vz(rad,dp),_n/(_n+1.)*g*(radius**(1.+1./_n)-rad**(1.+1./_n)),rtol=1.e-8,atol=1.e-14)
+    assert np.isclose(flow.vz(radius/2.,dp),_n/(_n+1.)*g*radius**(1.+1./_n)*(1.-.5**(1.+1./_n)),rtol=1.e-8)
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from rheoflow import slit, viscosity
+
+# Half height h, width W and length L of the slit
+_h, _w, _l = .01, .2, 2.
+
+
+def test_hb_q_newtonian():
+    # Q = W H^3 dp/(12 mu L) with full height H = 2h
+    mu = .5
+    dp = np.array([[0.,10.],[1.e3,1.e5]])
+    assert np.allclose(slit._hb_q((0.,mu,1.),_w,_h,_l,dp),_w*(2.*_h)**3*dp/(12.*mu*_l),rtol=1.e-12,atol=0.)
+
+
+def test_hb_q_power_law():
+    # Q = 2 W h^2 n/(2n+1) (tauw/k)^(1/n), tauw = dp h/L
+    k, n = 2., .4
+    dp = np.logspace(2,6,9)
+    tauw = dp*_h/_l
+    assert np.allclose(slit._hb_q((0.,k,n),_w,_h,_l,dp),2.*_w*_h**2*n/(2.*n+1.)*(tauw/k)**(1./n),rtol=1.e-12,atol=0.)
+
+
+def test_hb_q_bingham():
+    # Q = 2 W h^2 tauw/(3 mu) (1 - 3/2 phi + 1/2 phi^3), phi = tauy/tauw, and no flow for phi >= 1
+    tauy, mu = 5., .5
+    dp = np.array([100.,1000.,1001.,2000.,1.e5])
+    tauw = dp*_h/_l
+    phi = tauy/tauw
+    reference = np.where(phi<1.,2.*_w*_h**2*tauw/(3.*mu)*(1.-1.5*phi+.5*phi**3),0.)
+    assert np.allclose(slit._hb_q((tauy,mu,1.),_w,_h,_l,dp),reference,rtol=1.e-10,atol=0.)
+
+
+@pytest.mark.parametrize('hb',[(0.,.5,1.),(0.,2.,.4),(5.,.5,1.),(5.,.5,.6)])
+def test_hb_dp_inverts_hb_q(hb):
+    dp = np.logspace(3.05,6,8)
+    q = slit._hb_q(hb,_w,_h,_l,dp)
+    assert np.allclose(slit._hb_dp(hb,_w,_h,_l,q),dp,rtol=1.e-12,atol=0.)
+    assert np.allclose(slit._hb_dp(hb,_w,_h,_l,q[1:],near=(q[0],dp[0])),dp[1:],rtol=1.e-12,atol=0.)
+    assert np.all(slit._hb_dp(hb,_w,_h,_l,np.array([0.,-1.])) == 0.)
+
+
+def test_hb_vz_bingham():
+    # vz = G/(2 mu) (h^2-y^2) - tauy/mu (h-|y|) outside the plug |y| <= tauy/G, G = dp/L
+    tauy, mu, dp = 5., .5, 5.e3
+    g = dp/_l
+    y = np.linspace(-_h,_h,41)
+    s = np.maximum(np.abs(y),tauy/g)
+    reference = g/(2.*mu)*(_h**2-s**2)-tauy/mu*(_h-s)
+    assert np.allclose(slit._hb_vz((tauy,mu,1.),_h,_l,y,dp),reference,rtol=1.e-12,atol=1.e-15)
+    assert np.all(slit._hb_vz((tauy,mu,1.),_h,_l,y,tauy*_l/_h) == 0.)
+
+
+@pytest.mark.parametrize('fluid',[viscosity.newtonian(mu=.5),viscosity.power_law(k=2.,n=.4),
+                                  viscosity.herschel_bulkley(tauy=5.,k=.5,n=.6,m_flag=0)])
+def test_laminar_uses_closed_form(fluid):
+    hb = viscosity.hb_parameters(fluid)
+    flow = slit.laminar(viscosity=fluid,height=2.*_h,width=_w,length=_l,pressure_drop=5.e3)
+    assert flow.q == slit._hb_q(hb,_w,_h,_l,5.e3)
+    assert flow.solution_method == 'analytical'
+    y = np.linspace(0.,_h,5)
+    assert np.allclose(flow.vz(y,5.e3),slit._hb_vz(hb,_h,_l,y,5.e3),rtol=1.e-14,atol=0.)
+    flow.q = flow.q/2.
+    assert np.isclose(slit._hb_q(hb,_w,_h,_l,flow.pressure_drop),flow.q,rtol=1.e-12)
+
+
+def test_closed_form_matches_numerical():
+    # The same power law fluid as a plain function takes the numerical flow function engine
+    fluid = viscosity.power_law(k=2.,n=.4)
+    analytical = slit.laminar(viscosity=fluid,height=2.*_h,width=_w,length=_l,pressure_drop=5.e3)
+    numerical = slit.laminar(viscosity=lambda rate: 2.*(rate+1.e-9)**(.4-1.),height=2.*_h,width=_w,length=_l,
+                             pressure_drop=5.e3)
+    assert numerical.solution_method == 'numerical'
+    assert np.isclose(numerical.q,analytical.q,rtol=1.e-7)
+    y = np.linspace(0.,_h,5)
+    assert np.allclose(numerical.vz(y,5.e3),analytical.vz(y,5.e3),rtol=1.e-8,atol=1.e-14)
+
+
+def test_laminar_hb_analytical():
+    fluid = viscosity.herschel_bulkley(tauy=5.,k=.5,n=1.,m_flag=0)
+    flow = slit.laminar_HB_analytical(viscosity=fluid,height=2.*_h,width=_w,length=_l,pressure_drop=5.e3)
+    dp = np.array([2.e3,5.e3,5.e4])
+    assert np.allclose(flow.q_from_dp(dp),slit._hb_q((5.,.5,1.),_w,_h,_l,dp),rtol=1.e-14,atol=0.)
+    assert np.allclose(flow.dp_from_q(flow.q_from_dp(dp)),dp,rtol=1.e-12)
+    assert np.all(flow.shear_rate(np.array([0.,.002]),5.e3) == 0.)
+    assert np.isclose(flow.shear_rate(_h,5.e3),(5.e3*_h/_l-5.)/.5,rtol=1.e-14)
+    with pytest.raises(ValueError):
+        slit.laminar_HB_analytical(viscosity=viscosity.carreau())
@@ -0,0 +1,21 @@
+import numpy as np
+
+from rheoflow import stream, viscosity
+
+
+def test_numeric_line_ids_stay_strings(tmp_path):
+    path = tmp_path / 'points.csv'
+    path.write_text('line,q\n101,1.e-4\n102,2.e-4\n101,3.e-4\n')
+    lines = {'101':{'diameter':.05,'length':10.,'kind':'laminar'},
+             '102':{'diameter':.08,'length':20.,'kind':'laminar'}}
+    chunk, = stream.pressure_drop(stream.read_csv(path),lines,viscosity.newtonian(mu=1.))
+    assert list(chunk['line']) == ['101','102','101']
+    assert list(chunk['error']) == ['','','']
+    assert np.isclose(chunk['pressure_drop'][0],8.*1.e-4*10./(np.pi*.025**4))
+
+
+def test_chunked_text_columns():
+    records = [{'line':'7','fluid':'3','q':'1.5'}]
+    chunk, = stream.chunked(records,text=('line','fluid'))
+    assert chunk['line'].dtype.kind == 'U' and chunk['fluid'].dtype.kind == 'U'
+    assert chunk['q'].dtype == float
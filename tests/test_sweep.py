@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from rheoflow import sweep, pipe, viscosity
+
+
+class _echo:
+    """
+    Picklable stand-in solver: reports its inputs and fails for negative x.
+    """
+    _update_keys = ('x',)
+
+    def __init__(self,scale=1.,x=0.):
+        self.scale = scale
+        self.x = x
+
+    def update(self,x):
+        if x < 0.:
+            raise ValueError('negative x')
+        self.x = x
+
+    @property
+    def y(self):
+        return self.scale*self.x
+
+
+def test_grid_last_axis_fastest():
+    points = sweep.grid(a=[1,2],b=['u','v','w'])
+    assert list(points['a']) == [1,1,1,2,2,2]
+    assert list(points['b']) == ['u','v','w','u','v','w']
+
+
+@pytest.mark.parametrize('max_workers,chunksize',[(1,None),(1,2),(2,None),(3,1)])
+def test_run_keeps_point_order(max_workers,chunksize):
+    points = sweep.grid(scale=[1.,10.],x=[3.,-1.,2.,5.])
+    result = sweep.run(_echo,points,'y',max_workers=max_workers,chunksize=chunksize)
+    assert list(result['scale']) == list(points['scale'])
+    expected = np.where(points['x'] < 0.,np.nan,points['scale']*points['x'])
+    assert np.array_equal(result['y'],expected,equal_nan=True)
+    assert [e != '' for e in result['error']] == list(points['x'] < 0.)
+    assert result['error'][1] == 'ValueError: negative x'
+
+
+def test_run_independent_of_workers():
+    fluid = viscosity.herschel_bulkley(tauy=5.,k=.5,n=.6,m_flag=0)
+    points = sweep.grid(radius=[.01,.02],q=np.linspace(1.e-5,1.e-3,12))
+    one = sweep.run(pipe.laminar,points,('pressure_drop',),fixed={'viscosity':fluid},max_workers=1)
+    many = sweep.run(pipe.laminar,points,('pressure_drop',),fixed={'viscosity':fluid},max_workers=3,chunksize=5)
+    assert np.array_equal(one['pressure_drop'],many['pressure_drop'])
+    # Checked against the closed form of the solver it drives
+    for r,q,dp in zip(points['radius'],points['q'],one['pressure_drop']):
+        assert np.isclose(pipe._hb_q((5.,.5,.6),r,1.,dp),q,rtol=1.e-10)
+
+
+def test_run_rejects_ragged_points():
+    with pytest.raises(ValueError):
+        sweep.run(_echo,{'scale':[1.,2.],'x':[1.]},'y',max_workers=1)
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from rheoflow import pipe, slit, viscosity, friction_factor_property
+
+
+def _pair(make,changes):
+    """
+    Applies changes to one lazy instance through its setters and to an eager one through update().
+    """
+    lazy = make(True)
+    for key,value in changes.items():
+        setattr(lazy,key,value)
+    batched = make(False)
+    batched.update(**changes)
+    return lazy, batched
+
+
+@pytest.mark.parametrize('driver',[{'q':1.e-4},{'pressure_drop':5.e3}])
+@pytest.mark.parametrize('fluid',[viscosity.carreau(),viscosity.herschel_bulkley(tauy=5.,k=.5,n=.6,m_flag=0)])
+def test_pipe_lazy_setters_match_update(driver,fluid):
+    lazy, batched = _pair(lambda lazy: pipe.laminar(viscosity=fluid,lazy=lazy,**driver),{'radius':.02,'length':2.})
+    assert np.isclose(lazy.q,batched.q,rtol=1.e-12)
+    assert np.isclose(lazy.pressure_drop,batched.pressure_drop,rtol=1.e-12)
+    key, value = next(iter(driver.items()))
+    assert getattr(lazy,key) == value
+
+
+@pytest.mark.parametrize('driver',[{'q':1.e-4},{'pressure_drop':5.e3}])
+def test_pipe_hb_lazy_setters_match_update(driver):
+    fluid = viscosity.herschel_bulkley(tauy=5.,k=.5,n=.6,m_flag=0)
+    lazy, batched = _pair(lambda lazy: pipe.laminar_HB_analytical(viscosity=fluid,lazy=lazy,**driver),
+                          {'radius':.02,'length':2.})
+    assert np.isclose(lazy.q,batched.q,rtol=1.e-12)
+    assert np.isclose(lazy.pressure_drop,batched.pressure_drop,rtol=1.e-12)
+
+
+@pytest.mark.parametrize('driver',[{'q':1.e-4},{'pressure_drop':5.e3}])
+def test_slit_lazy_setters_match_update(driver):
+    lazy, batched = _pair(lambda lazy: slit.laminar(viscosity=viscosity.carreau(),lazy=lazy,**driver),
+                          {'height':.02,'width':.2,'length':2.})
+    assert np.isclose(lazy.q,batched.q,rtol=1.e-12)
+    assert np.isclose(lazy.pressure_drop,batched.pressure_drop,rtol=1.e-12)
+
+
+@pytest.mark.parametrize('driver',['u','pressure_drop'])
+def test_friction_factor_lazy_setters_match_update(driver):
+    def make(lazy):
+        ff = friction_factor_property.friction_factor('test',1000.,.05,10.,viscosity.carreau(eta0=.05,reltime=.1).calc_visc,
+                                                      lazy=lazy)
+        setattr(ff,driver,2. if driver == 'u' else 5.e3)
+        return ff
+    lazy, batched = _pair(make,{'d':.06,'l':12.,'rho':1100.})
+    assert np.isclose(lazy.u,batched.u,rtol=1.e-8)
+    assert np.isclose(lazy.pressure_drop,batched.pressure_drop,rtol=1.e-8)
+    assert (lazy.u if driver == 'u' else lazy.pressure_drop) == (2. if driver == 'u' else 5.e3)
+
+
+@pytest.mark.parametrize('cls',[pipe.laminar,pipe.laminar_HB_analytical])
+def test_pipe_eager_setters_hold_pressure_drop(cls):
+    # Hagen-Poiseuille: Q = pi R^4 dp/(8 mu L), recomputed from the pressure drop as before lazy mode
+    flow = cls(viscosity=viscosity.newtonian(mu=1.) if cls is pipe.laminar else
+               viscosity.herschel_bulkley(tauy=0.,k=1.,n=1.,m_flag=0))
+    flow.pressure_drop = 5.e4
+    flow.q = 1.e-6
+    dp = flow.pressure_drop
+    flow.radius = .02
+    assert flow.pressure_drop == dp
+    assert np.isclose(flow.q,np.pi*.02**4*dp/(8.*flow.length),rtol=1.e-10)
+
+
+def test_slit_eager_setters_hold_pressure_drop():
+    # Q = W H^3 dp/(12 mu L)
+    flow = slit.laminar(viscosity=viscosity.newtonian(mu=1.),pressure_drop=5.e3)
+    flow.height = .02
+    assert flow.pressure_drop == 5.e3
+    assert np.isclose(flow.q,flow.width*.02**3*5.e3/(12.*flow.length),rtol=1.e-10)
+
+
+def test_friction_factor_eager_setters_hold_u():
+    ff = friction_factor_property.friction_factor('test',1000.,.05,10.,viscosity.carreau(eta0=.05,reltime=.1).calc_visc)
+    ff.pressure_drop = 2000.
+    u = ff.u
+    ff.d = .06
+    assert ff.u == u
+    reference = friction_factor_property.friction_factor('test',1000.,.06,10.,viscosity.carreau(eta0=.05,reltime=.1).calc_visc)
+    reference.u = u
+    assert np.isclose(ff.pressure_drop,reference.pressure_drop,rtol=1.e-10)
@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+
+from rheoflow import viscosity, roots
+
+
+def test_frozen_equality_matches_hash():
+    a = viscosity.carreau()
+    b = a.frozen()
+    assert b == viscosity.carreau().frozen()
+    assert hash(b) == hash(viscosity.carreau().frozen())
+    assert a != b and b != a
+    assert len({a,b}) == 2
+    assert len({b,viscosity.carreau().frozen()}) == 1
+    assert a.fingerprint() == b.fingerprint()
+
+
+@pytest.mark.parametrize('model',[viscosity.carreau(etainf=0.),viscosity.herschel_bulkley(tauy=1.,k=.5,n=.6),
+                                  viscosity.three_component()])
+@pytest.mark.parametrize('rate',[1.e-11,1.e-3,1.e3])
+def test_scalar_inverse_is_relative(model,rate):
+    tau = rate*model.calc_visc(rate)
+    assert np.isclose(model.shear_rate_from_stress(float(tau)),rate,rtol=1.e-9,atol=0.)
+    assert np.isclose(model.shear_rate_from_stress(np.array([tau]))[0],rate,rtol=1.e-9,atol=0.)
+
+
+def test_scalar_inverse_passes_nan_through():
+    model = viscosity.herschel_bulkley(tauy=1.,k=.05,n=.6)
+    assert np.isnan(model.shear_rate_from_stress(np.nan))
+    assert np.isnan(viscosity.invert_stress(lambda rate: model.calc_visc(rate),np.nan))
+    assert np.isnan(model.shear_rate_from_stress(np.array([np.nan]))[0])
+
+
+_models = [viscosity.newtonian(mu=.5),viscosity.power_law(k=2.,n=.4),
+           viscosity.carreau(eta0=10.,etainf=.01,reltime=1.,a=2.,n=.3),
+           viscosity.herschel_bulkley(tauy=5.,k=1.,n=.5),viscosity.herschel_bulkley(tauy=5.,k=1.,n=.5,m_flag=0),
+           viscosity.three_component(tauy=5.,gamma_crit=2.,eta_bg=.05),viscosity.three_component(m_flag=0),
+           viscosity.bi_power_law(k_low=1.,n_low=.8,k_high=.5,n_high=.4)]
+
+
+@pytest.mark.parametrize('model',_models)
+def test_calc_visc_arrays_match_scalars(model):
+    rate = np.logspace(-3,4,12).reshape(3,4)
+    eta = model.calc_visc(rate)
+    assert eta.shape == rate.shape
+    assert np.allclose(eta,[[model.calc_visc(float(r)) for r in row] for row in rate],rtol=1.e-14)
+
+
+def test_calc_visc_closed_forms():
+    rate = np.logspace(-3,4,8)
+    assert np.allclose(viscosity.newtonian(mu=.5).calc_visc(rate),.5)
+    # The models shift the shear rate by 1e-9 to stay finite at rest
+    r = rate+1.e-9
+    assert np.allclose(viscosity.power_law(k=2.,n=.4).calc_visc(rate),2.*r**-.6,rtol=1.e-14)
+    carreau = viscosity.carreau(eta0=10.,etainf=.01,reltime=1.,a=2.,n=.3)
+    assert np.allclose(carreau.calc_visc(rate),.01+9.99*(1.+rate**2)**-.35,rtol=1.e-14)
+    assert np.isclose(carreau.calc_visc(0.),10.)
+    # Bingham with m_flag=0: tauy/rate + k
+    assert np.allclose(viscosity.herschel_bulkley(tauy=5.,k=1.,n=1.,m_flag=0).calc_visc(rate),5./r+1.,rtol=1.e-14)
+    bi = viscosity.bi_power_law(k_low=1.,n_low=.8,k_high=.5,n_high=.4)
+    switch = bi.rate_switch
+    assert np.isclose(1.*switch**-.2,.5*switch**-.6)
+    assert np.allclose(bi.calc_visc(rate),np.where(rate>=switch,.5*r**-.6,r**-.2),rtol=1.e-14)
+
+
+@pytest.mark.parametrize('model',_models)
+def test_inverse_round_trip(model):
+    # The exact inverses ignore the 1e-9 rate shift of calc_visc, which matters only at tiny rates
+    rate = np.logspace(-1,6,15)
+    tau = rate*model.calc_visc(rate)
+    assert np.allclose(model.shear_rate_from_stress(tau),rate,rtol=1.e-6,atol=0.)
+    assert np.isclose(model.shear_rate_from_stress(float(tau[7])),rate[7],rtol=1.e-6,atol=0.)
+    assert np.all(model.shear_rate_from_stress(np.array([0.,-1.])) == 0.)
+    assert model.shear_rate_from_stress(-1.) == 0.
+
+
+def test_inverse_closed_forms():
+    tau = np.logspace(-2,3,11)
+    assert np.allclose(viscosity.newtonian(mu=.5).shear_rate_from_stress(tau),2.*tau,rtol=1.e-15)
+    assert np.allclose(viscosity.power_law(k=2.,n=.4).shear_rate_from_stress(tau),(tau/2.)**2.5,rtol=1.e-14)
+    # Herschel-Bulkley: no flow below the yield stress
+    hb = viscosity.herschel_bulkley(tauy=5.,k=1.,n=.5,m_flag=0).shear_rate_from_stress(tau)
+    assert np.allclose(hb,np.maximum(tau-5.,0.)**2,rtol=1.e-14)
+    # Three component with m_flag=0: tau = tauy + tauy*sqrt(rate/gamma_crit) + eta_bg*rate
+    model = viscosity.three_component(tauy=5.,gamma_crit=2.,eta_bg=.05,m_flag=0)
+    rate = model.shear_rate_from_stress(tau)
+    assert np.allclose(np.where(tau>5.,5.+5.*np.sqrt(rate/2.)+.05*rate,tau),tau,rtol=1.e-12)
+    assert np.all(rate[tau<=5.] == 0.)
+
+
+def test_newton_bracketed_cube_roots():
+    a = np.logspace(-9,9,19)
+    x = roots.newton_bracketed(lambda x: x**3-a,lambda x: 3.*x**2,np.zeros_like(a),np.maximum(a,1.))
+    assert np.allclose(x,np.cbrt(a),rtol=1.e-12,atol=0.)
+
+
+@pytest.mark.parametrize('model',_models)
+def test_derivatives_match_differences(model):
+    # Away from the bi-power-law switch every model is smooth
+    rate = np.logspace(-2,4,13)*1.0137
+    h = 1.e-5
+    difference = (model.calc_visc(rate*(1.+h))-model.calc_visc(rate*(1.-h)))/(2.*h*rate)
+    assert np.allclose(model.dvisc_drate(rate),difference,rtol=1.e-6,atol=0.)
+    difference = (model.dvisc_drate(rate*(1.+h))-model.dvisc_drate(rate*(1.-h)))/(2.*h*rate)
+    assert np.allclose(model.d2visc_drate2(rate),difference,rtol=1.e-6,atol=0.)
+    stress = lambda x: np.log(x*model.calc_visc(x))
+    difference = (stress(rate*(1.+h))-stress(rate*(1.-h)))/(np.log1p(h)-np.log1p(-h))
+    assert np.allclose(model.flow_index(rate),difference,rtol=1.e-6,atol=1.e-9)
+    assert model.flow_index(0.) == 1.
+
+
+def test_flow_index_closed_forms():
+    rate = np.logspace(-1,4,6)
+    assert np.all(viscosity.newtonian(mu=.5).flow_index(rate) == 1.)
+    # n for a power law (up to the 1e-9 rate shift) and k n rate**n/(tauy + k rate**n) for Herschel-Bulkley
+    assert np.allclose(viscosity.power_law(k=2.,n=.4).flow_index(rate),.4,rtol=1.e-8)
+    hb = viscosity.herschel_bulkley(tauy=5.,k=1.,n=.5,m_flag=0)
+    assert np.allclose(hb.flow_index(rate),.5*rate**.5/(5.+rate**.5),rtol=1.e-7)
+
+
+def test_module_functions_fall_back_for_plain_functions():
+    model = viscosity.carreau(eta0=10.,etainf=.01,reltime=1.,a=2.,n=.3)
+    function = lambda rate: model.calc_visc(rate)
+    rate = np.logspace(-2,4,7)
+    assert np.array_equal(viscosity.visc_derivative(model.calc_visc,rate),model.dvisc_drate(rate))
+    assert np.allclose(viscosity.visc_derivative(function,rate),model.dvisc_drate(rate),rtol=1.e-8)
+    assert np.allclose(viscosity.visc_second_derivative(function,rate),model.d2visc_drate2(rate),rtol=1.e-4)
+    assert np.allclose(viscosity.flow_index(function,rate),model.flow_index(rate),rtol=1.e-8)